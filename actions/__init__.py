@@ -1,13 +1,41 @@
-from .action import Action
-from .quit_action import QuitAction
-from .next_page_action import NextPageAction
-from .add_record_action import AddRecordAction
-from .edit_record_action import EditRecordAction
-from .save_changes_action import SaveChangesAction
-from .previous_page_action import PreviousPageAction
-from .delete_record_action import DeleteRecordAction
-from .search_records_action import SearchRecordsAction
-from .quit_without_saving_action import QuitWithoutSavingAction
+import importlib
+
+# Action classes by the module they are defined in. The modules are imported on
+# first access, so importing one action does not import the rich prompts and
+# tables every other action needs.
+_action_modules = {
+    "Action": "action",
+    "AddRecordAction": "add_record_action",
+    "DeleteRecordAction": "delete_record_action",
+    "EditRecordAction": "edit_record_action",
+    "ImportRecordsAction": "import_records_action",
+    "NextPageAction": "next_page_action",
+    "PreviousPageAction": "previous_page_action",
+    "QuitAction": "quit_action",
+    "RedoAction": "redo_action",
+    "SaveChangesAction": "save_changes_action",
+    "SearchRecordsAction": "search_records_action",
+    "UndoAction": "undo_action",
+    "QuitWithoutSavingAction": "quit_without_saving_action",
+}
+
+
+def __getattr__(name: str) -> type:
+    """
+    Import an action class from its module on first access.
+
+    Args:
+        name (str): The name of the action class.
+
+    Returns:
+        type: The action class.
+    """
+    if name not in _action_modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{_action_modules[name]}", __name__)
+    globals()[name] = getattr(module, name)
+    return globals()[name]
 
 
 __all__ = [
@@ -15,10 +43,13 @@ __all__ = [
     "AddRecordAction",
     "DeleteRecordAction",
     "EditRecordAction",
+    "ImportRecordsAction",
     "NextPageAction",
     "PreviousPageAction",
     "QuitAction",
+    "RedoAction",
     "SaveChangesAction",
     "SearchRecordsAction",
+    "UndoAction",
     "QuitWithoutSavingAction",
 ]
@@ -1,9 +1,8 @@
 from .action import Action
-from record import Record
 from rich.console import Console
 from errors import NotUniquePersonalNumber
 from utils import get_record_from_keyboard
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 
 
 class AddRecordAction(Action):
@@ -22,18 +21,16 @@ class AddRecordAction(Action):
 
     """
 
-    def run(
-        self, console: Console, directory_manager: DirectoryManager
-    ) -> list[Record]:
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to add a new record.
 
         Args:
             console (Console): The console object for input and output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
-            list[Record]: The updated list of records in the directory.
+            None
         """
         console.clear()
         console.print("Enter new record (some fields can be left with '-'): \n")
@@ -49,5 +46,3 @@ class AddRecordAction(Action):
 
         console.print("\n[green]Record successfully added.[/green]")
         console.input("Press ENTER to get back to the directory...")
-
-        return directory_manager.get_records()
@@ -1,8 +1,7 @@
-from record import Record
 from .action import Action
 from rich.console import Console
 from errors import RecordDoesNotExist
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 
 
 class DeleteRecordAction(Action):
@@ -21,18 +20,16 @@ class DeleteRecordAction(Action):
 
     """
 
-    def run(
-        self, console: Console, directory_manager: DirectoryManager
-    ) -> list[Record]:
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to delete a record.
 
         Args:
             console (Console): The console object for input and output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
-            list[Record]: The updated list of records in the directory.
+            None
         """
         records_personal_number = console.input(
             "\nEnter personal phone number of the record you want to delete: "
@@ -48,5 +45,3 @@ class DeleteRecordAction(Action):
 
         console.print("[green]Record deleted successfully.[/green]")
         console.input("Press ENTER to refresh the table...")
-
-        return directory_manager.get_records()
@@ -1,9 +1,8 @@
 from table import Table
-from record import Record
 from .action import Action
 from rich.console import Console
 from utils import edit_record_from_keyboard
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 from errors import RecordDoesNotExist, NotUniquePersonalNumber
 
 
@@ -13,8 +12,9 @@ class EditRecordAction(Action):
 
     This action prompts the user to enter the personal phone number of the record
     they want to edit. It retrieves the old record, displays it for reference, and
-    prompts the user to edit the record fields. The edited record is then added back
-    to the directory. If the personal number is not unique, the old record's personal
+    prompts the user to edit the record fields. The old record is then replaced with
+    the edited one in a single step, so it stays in the directory until the editing
+    is done. If the personal number is not unique, the old record's personal
     number is retained.
 
     Args:
@@ -24,27 +24,23 @@ class EditRecordAction(Action):
         run(console, directory_manager): Execute the action to edit a record.
     """
 
-    def run(
-        self, console: Console, directory_manager: DirectoryManager
-    ) -> list[Record]:
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to edit a record.
 
         Args:
             console (Console): The console object for input and output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
-            list[Record]: The updated list of records in the directory.
+            None
         """
         records_personal_number = console.input(
             "\nEnter personal phone number of the record you want to edit: "
         )
 
         try:
-            old_record_to_edit = directory_manager.delete_record(
-                records_personal_number
-            )
+            old_record_to_edit = directory_manager.get_record(records_personal_number)
         except RecordDoesNotExist as e:
             error_message = e.args[0]
             console.print(f"[red]{error_message}[/red]")
@@ -65,17 +61,31 @@ class EditRecordAction(Action):
         )
 
         try:
-            directory_manager.add_record(new_edited_record)
+            directory_manager.replace_record(
+                old_record_to_edit.personal_phone, new_edited_record
+            )
         except NotUniquePersonalNumber:
             console.print(
                 "[yellow]\nPersonal phone number already exist in the directory. Saving record with old personal number.[/yellow]"
             )
-            console.input("Press ENTER to get back to the directory...")
             new_edited_record.personal_phone = old_record_to_edit.personal_phone
-            directory_manager.add_record(new_edited_record)
-            return directory_manager.get_records()
+            try:
+                directory_manager.replace_record(
+                    old_record_to_edit.personal_phone, new_edited_record
+                )
+            except (NotUniquePersonalNumber, RecordDoesNotExist) as e:
+                # The old record was changed meanwhile by another session of a
+                # shared directory.
+                error_message = e.args[0]
+                console.print(f"[red]\n{error_message}[/red]")
+            console.input("Press ENTER to get back to the directory...")
+            return
+        except RecordDoesNotExist as e:
+            # Deleted meanwhile by another session of a shared directory.
+            error_message = e.args[0]
+            console.print(f"[red]\n{error_message}[/red]")
+            console.input("Press ENTER to get back to the directory...")
+            return
 
         console.print("\n[green]Record edited successfully.[green]")
         console.input("Press ENTER to get back to the directory...")
-
-        return directory_manager.get_records()
@@ -0,0 +1,57 @@
+from .action import Action
+from rich.prompt import Prompt
+from rich.console import Console
+from directory_storage import DirectoryStorage
+from errors import NotUniquePersonalNumber, RecordValidationError
+
+
+class ImportRecordsAction(Action):
+    """
+    Action to import the records of a CSV file into the directory.
+
+    This action prompts the user for the name of a CSV file and for what to do
+    with records whose personal number is already in the directory, then adds
+    all records of the file. If a record is invalid or conflicts while the
+    'fail' policy is chosen, an error message is displayed and nothing is imported.
+
+    Args:
+        Action: The base class for actions.
+
+    Methods:
+        run(console, directory_manager): Execute the action to import records.
+    """
+
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
+        """
+        Execute the action to import records from a CSV file.
+
+        Args:
+            console (Console): The console object for input and output.
+            directory_manager (DirectoryStorage): The directory manager instance.
+
+        Returns:
+            None
+        """
+        filename = console.input("\nEnter the name of the CSV file to import: ")
+        on_conflict = Prompt.ask(
+            "Existing personal numbers",
+            choices=list(DirectoryStorage.CONFLICT_POLICIES),
+            default=DirectoryStorage.FAIL,
+            console=console,
+        )
+
+        try:
+            with open(filename, "r", newline="", encoding="utf-8") as file:
+                with console.status(f"Importing records from {filename}..."):
+                    summary = directory_manager.import_records(file, on_conflict)
+        except (OSError, NotUniquePersonalNumber, RecordValidationError) as e:
+            console.print(f"[red]{e}[/red]")
+            console.print("Nothing was imported.")
+            console.input("Press ENTER to get back to the directory...")
+            return
+
+        console.print(
+            f"[green]{summary.added} records added, {summary.overwritten} overwritten, "
+            f"{summary.skipped} skipped.[/green]"
+        )
+        console.input("Press ENTER to get back to the directory...")
@@ -1,6 +1,7 @@
 from .action import Action
 from rich.console import Console
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
+from errors import DirectoryLockedError
 
 
 class QuitAction(Action):
@@ -17,19 +18,28 @@ class QuitAction(Action):
         run(console, directory_manager): Execute the action to quit the application.
     """
 
-    def run(self, console: Console, directory_manager: DirectoryManager) -> None:
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to quit the application.
 
         Args:
             console (Console): The console object for output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
             None
         """
         console.print()
-        directory_manager.serialize_directory()
-        console.print("[green]Changes saved successfully.[/green]")
+        try:
+            if directory_manager.serialize_directory():
+                console.print("[green]Changes saved successfully.[/green]")
+            else:
+                console.print("No changes to save.")
+        except DirectoryLockedError as e:
+            # Staying in the directory keeps the unsaved changes.
+            error_message = e.args[0]
+            console.print(f"[red]{error_message}[/red]")
+            console.input("Press ENTER to get back to the directory...")
+            return
         console.print("Exiting...")
         exit()
@@ -1,6 +1,6 @@
 from .action import Action
 from rich.console import Console
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 
 
 class QuitWithoutSavingAction(Action):
@@ -17,13 +17,13 @@ class QuitWithoutSavingAction(Action):
         run(console, directory_manager): Execute the action to quit without saving changes.
     """
 
-    def run(self, console: Console, directory_manager: DirectoryManager) -> None:
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to quit the application without saving changes.
 
         Args:
             console (Console): The console object for output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
             None
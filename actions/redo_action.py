@@ -0,0 +1,35 @@
+from .action import Action
+from rich.console import Console
+from directory_storage import DirectoryStorage
+
+
+class RedoAction(Action):
+    """
+    Action to redo the latest undone change.
+
+    This action applies the latest undone change again and goes straight back to
+    the refreshed table. Once the directory is changed otherwise, the undone
+    changes can no longer be redone and a message is displayed instead.
+
+    Args:
+        Action: The base class for actions.
+
+    Methods:
+        run(console, directory_manager): Execute the action to redo a change.
+    """
+
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
+        """
+        Execute the action to redo the latest undone change.
+
+        Args:
+            console (Console): The console object for output.
+            directory_manager (DirectoryStorage): The directory manager instance.
+
+        Returns:
+            None
+        """
+        if not directory_manager.redo():
+            console.print()
+            console.print("Nothing to redo.")
+            console.input("Press ENTER to continue...")
@@ -1,7 +1,10 @@
 from .action import Action
+from .next_page_action import NextPageAction
+from .previous_page_action import PreviousPageAction
 from rich.console import Console
+from errors import QuerySyntaxError
 from utils import render_search_result_table
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 
 
 class SearchRecordsAction(Action):
@@ -9,28 +12,67 @@ class SearchRecordsAction(Action):
     Action to search for records in the directory.
 
     This action prompts the user for a search string, searches for records matching
-    the search string, and displays the search results in a table.
+    the search string, and displays the search results in a paginated table.
+    The search string is either a plain substring or a query such as
+    'last:Smi* org:"Global Tech" -work:-'. If the query is invalid, an error
+    message is displayed.
 
     Args:
         Action: The base class for actions.
 
+    Attributes:
+        page_actions (dict[str, Action]): The actions to page through the search results.
+
     Methods:
         run(console, directory_manager): Execute the action to search for records.
     """
 
-    def run(self, console: Console, directory_manager: DirectoryManager) -> None:
+    page_actions: dict[str, Action] = {
+        "n": NextPageAction("Next page"),
+        "p": PreviousPageAction("Previous page"),
+    }
+
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
         """
         Execute the action to search for records in the directory.
 
         Args:
             console (Console): The console object for output.
-            directory_manager (DirectoryManager): The directory manager instance.
+            directory_manager (DirectoryStorage): The directory manager instance.
 
         Returns:
             None
         """
         search_string = console.input("\nSearch: ")
-        search_result = directory_manager.search_records(search_string)
-        console.clear()
-        render_search_result_table(console, directory_manager, search_result)
-        console.input("Press ENTER to get back to the directory...")
+        try:
+            search_result = directory_manager.search_records(search_string)
+        except QuerySyntaxError as e:
+            error_message = e.args[0]
+            console.print(f"[red]{error_message}[/red]")
+            console.input("Press ENTER to get back to the directory...")
+            return
+
+        page_actions_legend = "".join(
+            [
+                f"{action.name} '{action_key}', "
+                for action_key, action in self.page_actions.items()
+            ]
+        )
+
+        current_page_number = 1
+        while True:
+            console.clear()
+            total_pages = render_search_result_table(
+                console, directory_manager, search_result, current_page_number
+            )
+
+            action_key = console.input(
+                page_actions_legend + "ENTER to get back to the directory: "
+            ).lower()
+
+            if action_key not in self.page_actions:
+                return
+
+            current_page_number = self.page_actions[action_key].run(
+                current_page_number, total_pages
+            )
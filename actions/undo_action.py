@@ -0,0 +1,35 @@
+from .action import Action
+from rich.console import Console
+from directory_storage import DirectoryStorage
+
+
+class UndoAction(Action):
+    """
+    Action to undo the latest change made to the directory.
+
+    This action reverts the latest add, delete, edit or import that was not undone
+    yet and goes straight back to the refreshed table. A message is only displayed
+    if there is nothing to undo.
+
+    Args:
+        Action: The base class for actions.
+
+    Methods:
+        run(console, directory_manager): Execute the action to undo a change.
+    """
+
+    def run(self, console: Console, directory_manager: DirectoryStorage) -> None:
+        """
+        Execute the action to undo the latest change.
+
+        Args:
+            console (Console): The console object for output.
+            directory_manager (DirectoryStorage): The directory manager instance.
+
+        Returns:
+            None
+        """
+        if not directory_manager.undo():
+            console.print()
+            console.print("Nothing to undo.")
+            console.input("Press ENTER to continue...")
@@ -0,0 +1,139 @@
+import time
+import threading
+from directory_manager import DirectoryManager
+
+
+class Autosaver:
+    """
+    Saves the changes of a directory in a background thread.
+
+    A save is begun once enough operations are pending or the oldest unsaved
+    change waited long enough. Beginning a save only takes the pending operations
+    out of the directory and shares its records with the save, so the directory
+    can be paged through and changed while the save is written.
+
+    Attributes:
+        directory_manager (DirectoryManager): The directory to save.
+        max_changes (int): The number of pending operations that begins a save.
+        interval (float): The seconds an unsaved change may wait for a save.
+        error (Exception | None): The error of the last failed save, or None.
+    """
+
+    def __init__(
+        self, directory_manager: DirectoryManager, max_changes: int, interval: float
+    ) -> None:
+        """
+        Initialize the Autosaver instance.
+
+        Args:
+            directory_manager (DirectoryManager): The directory to save.
+            max_changes (int): The number of pending operations that begins a save.
+            interval (float): The seconds an unsaved change may wait for a save.
+
+        Returns:
+            None
+        """
+        self.directory_manager: DirectoryManager = directory_manager
+        self.max_changes: int = max_changes
+        self.interval: float = interval
+        self.error: Exception | None = None
+        self.__changed_at: float | None = None
+        self.__stopped: bool = False
+        self.__wakeup: threading.Condition = threading.Condition()
+        self.__thread: threading.Thread = threading.Thread(
+            target=self.__run, name="autosave", daemon=True
+        )
+
+    def start(self) -> None:
+        """
+        Start the background thread.
+
+        Returns:
+            None
+        """
+        self.__thread.start()
+
+    def notify_change(self) -> None:
+        """
+        Tell the autosaver that the directory may have been changed.
+
+        Returns:
+            None
+        """
+        with self.__wakeup:
+            if (
+                self.__changed_at is None
+                and self.directory_manager.has_unsaved_changes()
+            ):
+                self.__changed_at = time.monotonic()
+            self.__wakeup.notify()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread, waiting for the save it is writing.
+
+        Returns:
+            None
+        """
+        with self.__wakeup:
+            self.__stopped = True
+            self.__wakeup.notify()
+        self.__thread.join()
+
+    def __run(self) -> None:
+        """
+        Begin and write a save whenever one is due, until stopped.
+
+        Returns:
+            None
+        """
+        while True:
+            with self.__wakeup:
+                while not self.__stopped and not self.__is_due():
+                    self.__wakeup.wait(self.__get_timeout())
+                if self.__stopped:
+                    return
+                self.__changed_at = None
+
+            pending_save = self.directory_manager.begin_save()
+            if pending_save is None:
+                continue
+            try:
+                self.directory_manager.write_save(pending_save, show_progress=False)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                # Retried once the interval passes again.
+                with self.__wakeup:
+                    self.__changed_at = time.monotonic()
+
+    def __is_due(self) -> bool:
+        """
+        Check if the unsaved changes should be saved now.
+
+        Returns:
+            bool: True if enough operations are pending or the oldest unsaved
+            change waited for the interval, False otherwise.
+        """
+        if not self.directory_manager.has_unsaved_changes():
+            # Saved by someone else, so the interval starts again on the next change.
+            self.__changed_at = None
+            return False
+        if len(self.directory_manager.pending_operations) >= self.max_changes:
+            return True
+        return (
+            self.__changed_at is not None
+            and time.monotonic() - self.__changed_at >= self.interval
+        )
+
+    def __get_timeout(self) -> float | None:
+        """
+        Get how long to wait for a change before the interval of the oldest
+        unsaved change runs out.
+
+        Returns:
+            float | None: The seconds to wait, or None to wait for the next change.
+        """
+        if self.__changed_at is None:
+            return None
+        return max(self.__changed_at + self.interval - time.monotonic(), 0.0)
@@ -0,0 +1,114 @@
+import os
+import csv
+import random
+import argparse
+
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson", "Anderson", "Thomas",
+    "Taylor", "Moore", "Jackson", "Martin", "Lee", "Thompson", "White", "Harris",
+    "Clark", "Lewis", "Robinson", "Walker", "Young", "Allen", "King", "Wright",
+    "Scott", "Green", "Baker", "Adams", "Nelson", "Hill", "Campbell", "Mitchell",
+    "Roberts", "Carter", "Phillips", "Evans", "Turner", "Parker", "Collins",
+]  # fmt: skip
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+    "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph",
+    "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel", "Nancy", "Matthew",
+    "Lisa", "Anthony", "Betty", "Mark", "Margaret", "Olivia", "Emma", "Sophia",
+]  # fmt: skip
+ORGANIZATIONS = [
+    "Dynamic Systems", "Global Tech Group", "Star Innovations", "Acme Industries",
+    "XYZ Corporation", "Tech Solutions Inc.", "FutureTech Inc.", "Swift Enterprises",
+    "Innovate Co.", "Blue Sky Ltd.", "Smith & Sons", "-",
+]  # fmt: skip
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE = os.path.join(REPOSITORY_DIRECTORY, "data.csv")
+
+# A multiplier coprime with the number of possible personal phones, used to
+# spread sequential row numbers over the whole phone number space.
+PHONE_SPACE = 10**10
+PHONE_MULTIPLIER = 7_919_838_471
+
+
+def make_personal_phone(row_number: int) -> str:
+    """
+    Build a unique personal phone number for a row number.
+
+    Args:
+        row_number (int): The row number, must be less than 10**10.
+
+    Returns:
+        str: A personal phone number in the '(555) 555-5555' format.
+    """
+    digits = f"{row_number * PHONE_MULTIPLIER % PHONE_SPACE:010d}"
+    return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+
+
+def generate_rows(rows: int, seed: int = 0):
+    """
+    Generate valid directory rows with unique personal phone numbers.
+
+    Args:
+        rows (int): The number of rows to generate.
+        seed (int): The seed of the random generator.
+
+    Yields:
+        list[str]: The field values of a generated row.
+    """
+    rng = random.Random(seed)
+    for row_number in range(rows):
+        work_phone = (
+            "-"
+            if rng.random() < 0.1
+            else f"{rng.randrange(1000):03d}-{rng.randrange(10000):04d}"
+        )
+        yield [
+            rng.choice(LAST_NAMES),
+            rng.choice(FIRST_NAMES),
+            "-" if rng.random() < 0.2 else rng.choice(FIRST_NAMES),
+            rng.choice(ORGANIZATIONS),
+            work_phone,
+            make_personal_phone(row_number),
+        ]
+
+
+def generate_directory(
+    filename: str, rows: int, seed: int = 0, template: str = TEMPLATE
+) -> None:
+    """
+    Write a synthetic directory CSV file.
+
+    The header and regex rows are copied from the template directory,
+    so the generated file is accepted by DirectoryManager.
+
+    Args:
+        filename (str): The name of the CSV file to write.
+        rows (int): The number of records to generate.
+        seed (int): The seed of the random generator.
+        template (str): The directory file to copy the header and regex rows from.
+
+    Returns:
+        None
+    """
+    with open(template, "r", newline="", encoding="utf-8") as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader)
+        regexes = next(csv_reader)
+
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        csv_writer = csv.writer(file)
+        csv_writer.writerow(header)
+        csv_writer.writerow(regexes)
+        csv_writer.writerows(generate_rows(rows, seed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic directory.")
+    parser.add_argument("filename")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--template", default=TEMPLATE)
+    args = parser.parse_args()
+    generate_directory(args.filename, args.rows, args.seed, args.template)
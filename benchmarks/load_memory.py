@@ -0,0 +1,70 @@
+import os
+import sys
+import argparse
+import tempfile
+import tracemalloc
+from directory_manager import DirectoryManager
+from benchmarks.generate_directory import generate_directory
+
+
+def measure_load_memory(filename: str) -> tuple[tuple[int, int], tuple[int, int]]:
+    """
+    Measure the memory used by deserializing a directory and by then building
+    its indexes, which are built on first use rather than on load.
+
+    Args:
+        filename (str): The name of the CSV file to load.
+
+    Returns:
+        tuple[tuple[int, int], tuple[int, int]]: The memory retained and the peak
+        memory reached, in bytes, after loading the directory and after building
+        its indexes.
+    """
+    tracemalloc.start()
+    directory_manager = DirectoryManager(filename)
+    directory_manager.deserialize_directory()
+    load_memory = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    directory_manager.build_indexes()
+    indexes_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return load_memory, indexes_memory
+
+
+def main() -> int:
+    """
+    Check that peak memory grows only with the final record store, while
+    loading and while building the indexes.
+
+    Returns:
+        int: The exit code, non-zero if the peak exceeds the allowed overhead.
+    """
+    parser = argparse.ArgumentParser(description="Directory load memory benchmark.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument(
+        "--max-overhead",
+        type=float,
+        default=0.10,
+        help="Allowed peak memory above the retained memory, as a fraction.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "data.csv")
+        generate_directory(filename, args.rows)
+        measurements = measure_load_memory(filename)
+
+    print(f"rows:      {args.rows}")
+    overheads = []
+    for name, (retained, peak) in zip(("load", "indexes"), measurements):
+        overheads.append((peak - retained) / retained)
+        print(f"{name}:")
+        print(f"  retained:  {retained / 2**20:.1f} MiB")
+        print(f"  peak:      {peak / 2**20:.1f} MiB")
+        print(f"  overhead:  {overheads[-1]:.1%} (allowed {args.max_overhead:.0%})")
+
+    return 0 if max(overheads) <= args.max_overhead else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
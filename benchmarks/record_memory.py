@@ -0,0 +1,90 @@
+import io
+import csv
+import sys
+import argparse
+import tracemalloc
+from record import Record
+from dataclasses import fields, make_dataclass
+from benchmarks.generate_directory import generate_rows
+
+# The record as it was before it was slotted, a dataclass with a __dict__.
+UnslottedRecord = make_dataclass(
+    "UnslottedRecord", [field.name for field in fields(Record)]
+)
+
+
+def measure_record_memory(record_class: type, lines: list[str]) -> tuple[int, int]:
+    """
+    Measure the memory used by records, without their field values and with
+    them parsed from CSV lines, the way the directory file is loaded.
+
+    Args:
+        record_class (type): The class to create the records with.
+        lines (list[str]): The CSV lines of the records.
+
+    Returns:
+        tuple[int, int]: The memory retained by the records and the list holding
+        them, in bytes, without and with their field values.
+    """
+    rows = list(csv.reader(lines))
+    tracemalloc.start()
+    records = [record_class(*row) for row in rows]
+    without_fields, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records, rows
+
+    tracemalloc.start()
+    records = [record_class(*row) for row in csv.reader(lines)]
+    with_fields, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return without_fields, with_fields
+
+
+def main() -> int:
+    """
+    Report the memory used per million records, before and after Record was
+    slotted, for the records alone and with their field values.
+
+    Returns:
+        int: The exit code, non-zero if a record uses more than the allowed memory.
+    """
+    parser = argparse.ArgumentParser(description="Record memory benchmark.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument(
+        "--max-bytes-per-record",
+        type=float,
+        default=100.0,
+        help="Fail if a record, without its field values, uses more memory than this.",
+    )
+    args = parser.parse_args()
+
+    text = io.StringIO()
+    csv.writer(text).writerows(generate_rows(args.rows))
+    lines = text.getvalue().splitlines()
+    del text
+
+    results = {}
+    for name, record_class in (("before", UnslottedRecord), ("after", Record)):
+        results[name] = [
+            retained / args.rows
+            for retained in measure_record_memory(record_class, lines)
+        ]
+
+    print(f"rows:               {args.rows}")
+    print(f"{'bytes per record':<20}{'before':>10}{'after':>10}{'saved':>10}")
+    for index, label in enumerate(("record", "with fields")):
+        before, after = results["before"][index], results["after"][index]
+        print(
+            f"{label:<20}{before:>10.1f}{after:>10.1f}{(before - after) / before:>10.1%}"
+        )
+    print(
+        f"per million:        {results['after'][1] * 10**6 / 2**20:.1f} MiB with fields"
+    )
+    print(f"allowed:            {args.max_bytes_per_record:.1f} bytes per record")
+
+    return 0 if results["after"][0] <= args.max_bytes_per_record else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from record import Record
+from directory_manager import DirectoryManager
+from sharded_directory_manager import ShardedDirectoryManager, migrate_to_shards
+from errors import RecordDoesNotExist
+from benchmarks.generate_directory import LAST_NAMES, generate_directory, generate_rows
+
+
+def get_file_states(folder: str) -> dict[str, tuple[int, int, int]]:
+    """
+    Get the identity, size and modification time of every file in a folder.
+
+    Args:
+        folder (str): The folder.
+
+    Returns:
+        dict[str, tuple[int, int, int]]: The inode, size and modification time
+        in nanoseconds of every file by name.
+    """
+    states = {}
+    for entry in os.scandir(folder):
+        stat = entry.stat()
+        states[entry.name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    return states
+
+
+def check_one_record_save(folder: str, record: Record) -> tuple[list[str], float]:
+    """
+    Add one record to a sharded directory and save it.
+
+    Args:
+        folder (str): The folder of the sharded directory.
+        record (Record): The record to add, with a new personal phone number.
+
+    Returns:
+        tuple[list[str], float]: The files written by the save other than the
+        files of the record's shard and the manifest, and the save time in seconds.
+    """
+    directory_manager = ShardedDirectoryManager(folder, show_progress=False)
+    directory_manager.deserialize_directory()
+    directory_manager.add_record(record)
+    shard_file = directory_manager.shard_files[record.last_name[:1]]
+    shard_prefix = os.path.splitext(shard_file)[0]
+
+    before = get_file_states(folder)
+    start = time.perf_counter()
+    directory_manager.serialize_directory()
+    elapsed = time.perf_counter() - start
+    after = get_file_states(folder)
+
+    unexpected = [
+        name
+        for name, state in after.items()
+        if before.get(name) != state
+        and not name.startswith(shard_prefix)
+        and not name.startswith("manifest.json")
+    ]
+    reloaded = ShardedDirectoryManager(folder, show_progress=False)
+    reloaded.deserialize_directory()
+    if reloaded.get_record(record.personal_phone) != record:
+        unexpected.append(shard_file)
+    return unexpected, elapsed
+
+
+def check_failed_import(folder: str, rows: list[list[str]]) -> list[str]:
+    """
+    Fail an import into a sharded directory after it changed a shard, and check
+    that it left the records and the undo and redo steps as they were.
+
+    The import moves two records to other shards, the second of which another
+    process deleted meanwhile, so its shard fails after the first was changed.
+
+    Args:
+        folder (str): The folder of the sharded directory.
+        rows (list[list[str]]): Two rows of the directory and a new row, whose
+            last names start with the same character as the first one's.
+
+    Returns:
+        list[str]: The descriptions of the failed checks.
+    """
+    moved_record, deleted_record, undone_record = (Record(*row) for row in rows)
+    directory_manager = ShardedDirectoryManager(folder, show_progress=False)
+    directory_manager.deserialize_directory()
+    other_process = ShardedDirectoryManager(folder, show_progress=False)
+    other_process.deserialize_directory()
+    other_process.delete_record(deleted_record.personal_phone)
+    other_process.serialize_directory()
+
+    directory_manager.add_record(undone_record)
+    directory_manager.undo()
+    records = directory_manager.get_records()
+    imported_rows = [
+        [
+            next(name for name in LAST_NAMES if name[0] != record.last_name[0]),
+            *list(record)[1:],
+        ]
+        for record in (moved_record, deleted_record)
+    ]
+
+    failures = []
+    for attempt in ("with a change undone", "with nothing undone"):
+        try:
+            directory_manager.add_numbered_rows(
+                enumerate(imported_rows, 1), directory_manager.OVERWRITE, "Line"
+            )
+            failures.append(f"the import {attempt} did not fail")
+        except RecordDoesNotExist:
+            pass
+        if directory_manager.get_records() != records:
+            failures.append(f"the import {attempt} changed the records")
+        if attempt == "with a change undone" and (
+            not directory_manager.redo()
+            or directory_manager.get_record(undone_record.personal_phone)
+            != undone_record
+        ):
+            failures.append("the change undone before the import was not redone")
+        if attempt == "with nothing undone" and directory_manager.redo():
+            failures.append("the failed import was redone")
+        records = directory_manager.get_records()
+    return failures
+
+
+def main() -> int:
+    """
+    Check that saving a change to a sharded directory only writes the files of
+    the changed shard and the manifest, and that a failed import leaves the
+    directory and its history as they were.
+
+    Returns:
+        int: The exit code, non-zero if a file of another shard was written or
+        a failed import left a trace.
+    """
+    parser = argparse.ArgumentParser(description="Sharded directory save benchmark.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "data.csv")
+        generate_directory(filename, args.rows)
+        directory_manager = DirectoryManager(filename, show_progress=False)
+        directory_manager.deserialize_directory()
+        folder = os.path.join(directory, "data.shards")
+        migrate_to_shards(directory_manager, folder)
+        del directory_manager
+
+        *rows, new_row, undone_row = generate_rows(args.rows + 2)
+        unexpected, elapsed = check_one_record_save(folder, Record(*new_row))
+        undone_row[0] = next(name for name in LAST_NAMES if name[0] == rows[0][0][0])
+        failures = check_failed_import(folder, [rows[0], rows[1], undone_row])
+
+    print(f"rows:              {args.rows}")
+    print(f"one record save:   {elapsed * 1000:.1f} ms")
+    print(f"other files saved: {', '.join(unexpected) or 'none'}")
+    print(f"failed import:     {'; '.join(failures) or 'no trace left'}")
+    return 1 if unexpected or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
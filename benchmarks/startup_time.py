@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from benchmarks.generate_directory import REPOSITORY_DIRECTORY, generate_directory
+
+# Modules the interactive program must not import before showing the first page.
+DEFERRED_MODULES = [
+    "actions.add_record_action",
+    "actions.delete_record_action",
+    "actions.edit_record_action",
+    "actions.import_records_action",
+    "actions.quit_action",
+    "actions.quit_without_saving_action",
+    "actions.save_changes_action",
+    "actions.search_records_action",
+    "concurrent.futures.process",
+    "rich.progress",
+    "sharded_directory_manager",
+    "sqlite_directory_manager",
+]
+
+# Starts the program the way main() does and renders its first page.
+FIRST_TABLE_SCRIPT = """
+import io
+import sys
+import json
+import main
+from rich.console import Console
+directory_manager = main.open_directory(sys.argv[1])
+directory_manager.deserialize_directory(parallel=main.PARALLEL_LOAD)
+Console(file=io.StringIO(), width=120).print(main.build_page_table(directory_manager, 1))
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def run_first_table(filename: str) -> tuple[float, int, list[str]]:
+    """
+    Start a fresh interpreter that renders the first page of a directory.
+
+    Args:
+        filename (str): The name of the CSV file to load.
+
+    Returns:
+        tuple[float, int, list[str]]: The wall time to the first table in seconds,
+        the import time of main in microseconds reported by -X importtime, and
+        the names of the imported modules.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", FIRST_TABLE_SCRIPT, filename],
+        cwd=REPOSITORY_DIRECTORY,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    main_import_time = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        # Top-level imports are indented by a single space.
+        if name == " main":
+            main_import_time = int(cumulative)
+
+    return elapsed, main_import_time, json.loads(completed.stdout)
+
+
+def main() -> int:
+    """
+    Check the time from starting the program to showing its first page.
+
+    Returns:
+        int: The exit code, non-zero if the startup exceeds its budget or
+        imports a module that should be deferred.
+    """
+    parser = argparse.ArgumentParser(description="Startup time benchmark.")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=1.0,
+        help="Allowed median time to the first table, in seconds.",
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=0.25,
+        help="Allowed median import time of main, in seconds.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "data.csv")
+        generate_directory(filename, args.rows)
+        # The first start parses the CSV file and writes the snapshot, which
+        # every later start loads instead.
+        run_first_table(filename)
+        runs = [run_first_table(filename) for _ in range(args.runs)]
+
+    first_table_time = statistics.median(elapsed for elapsed, _, _ in runs)
+    import_time = statistics.median(imported for _, imported, _ in runs) / 1e6
+    deferred_imports = [module for module in DEFERRED_MODULES if module in runs[-1][2]]
+
+    print(f"rows:         {args.rows}")
+    print(f"first table:  {first_table_time:.3f} s (allowed {args.budget:.3f} s)")
+    print(f"import main:  {import_time:.3f} s (allowed {args.import_budget:.3f} s)")
+    print(f"deferred:     {', '.join(deferred_imports) or 'none'} imported early")
+
+    return (
+        0
+        if first_table_time <= args.budget
+        and import_time <= args.import_budget
+        and not deferred_imports
+        else 1
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from typing import Callable
+from record import Record
+from rich.console import Console
+from main import build_page_table
+from config import RECORDS_PER_PAGE
+from directory_manager import DirectoryManager
+from benchmarks.generate_directory import (
+    REPOSITORY_DIRECTORY,
+    generate_directory,
+    make_personal_phone,
+)
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 5_000_000]
+
+# One query of every kind search_records answers differently.
+SEARCH_QUERIES = {
+    "substring": "Smith Jo",
+    "short_substring": "Sm",
+    "fielded": "last:Smith first:J*",
+    "phone_digits": "5558",
+    "fuzzy": "Smtih~",
+}
+
+
+def measure(operation: Callable[[], object], repeat: int) -> dict:
+    """
+    Time repeated calls of an operation.
+
+    The first call is reported on its own, since it also pays for building the
+    indexes and the sort order the operation uses.
+
+    Args:
+        operation (Callable[[], object]): The operation to time.
+        repeat (int): The number of calls.
+
+    Returns:
+        dict: The time of the first call and the minimum and median of all calls, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "first": timings[0],
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "runs": repeat,
+    }
+
+
+def render_page(directory_manager: DirectoryManager, page_number: int) -> None:
+    """
+    Build and render the table of a directory page, the way the main loop shows it.
+
+    Args:
+        directory_manager (DirectoryManager): The directory manager instance.
+        page_number (int): The page number.
+
+    Returns:
+        None
+    """
+    console = Console(file=io.StringIO(), width=120)
+    console.print(build_page_table(directory_manager, page_number))
+
+
+def benchmark_directory(filename: str, rows: int, repeat: int) -> dict:
+    """
+    Time the directory operations on one generated directory.
+
+    Args:
+        filename (str): The name of the generated CSV file.
+        rows (int): The number of records in the file.
+        repeat (int): The number of calls of every repeatable operation.
+
+    Returns:
+        dict: The timings of every operation by name.
+    """
+    results = {}
+
+    directory_manager = DirectoryManager(filename, show_progress=False)
+    results["deserialize_directory"] = measure(
+        directory_manager.deserialize_directory, 1
+    )
+    directory_manager = DirectoryManager(filename, show_progress=False)
+    results["deserialize_directory_snapshot"] = measure(
+        directory_manager.deserialize_directory, 1
+    )
+
+    results["get_records"] = measure(directory_manager.get_records, repeat)
+
+    last_page = max((rows + RECORDS_PER_PAGE - 1) // RECORDS_PER_PAGE, 1)
+    for name, page_number in [
+        ("first", 1),
+        ("middle", (last_page + 1) // 2),
+        ("last", last_page),
+    ]:
+        results[f"render_page[{name}]"] = measure(
+            lambda: render_page(directory_manager, page_number), repeat
+        )
+
+    for name, query in SEARCH_QUERIES.items():
+        results[f"search_records[{name}]"] = measure(
+            lambda: directory_manager.search_records(query).get_records(
+                0, RECORDS_PER_PAGE
+            ),
+            repeat,
+        )
+
+    # Personal phones past the generated rows are not in the directory yet.
+    new_records = [
+        Record("Benchmark", "Added", "-", "-", "-", make_personal_phone(rows + index))
+        for index in range(repeat)
+    ]
+    added_records = iter(new_records)
+    results["add_record"] = measure(
+        lambda: directory_manager.add_record(next(added_records)), repeat
+    )
+    deleted_records = iter(new_records)
+    results["delete_record"] = measure(
+        lambda: directory_manager.delete_record(next(deleted_records).personal_phone),
+        repeat,
+    )
+
+    results["serialize_directory"] = measure(directory_manager.serialize_directory, 1)
+    results["compact_directory"] = measure(directory_manager.compact_directory, 1)
+    return results
+
+
+def get_commit() -> str | None:
+    """
+    Get the commit of the benchmarked code.
+
+    Returns:
+        str | None: The hash of the checked out commit, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPOSITORY_DIRECTORY,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_filename: str, current_filename: str) -> None:
+    """
+    Print the median time of every operation in two result files side by side.
+
+    Args:
+        baseline_filename (str): The results of the baseline commit.
+        current_filename (str): The results of the compared commit.
+
+    Returns:
+        None
+    """
+    with open(baseline_filename, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(current_filename, "r", encoding="utf-8") as file:
+        current = json.load(file)
+
+    print(f"baseline: {baseline['commit']}")
+    print(f"current:  {current['commit']}")
+    for rows, operations in current["results"].items():
+        for name, timing in operations.items():
+            baseline_timing = baseline["results"].get(rows, {}).get(name)
+            if baseline_timing is None:
+                continue
+            ratio = timing["median"] / max(baseline_timing["median"], 1e-9)
+            print(
+                f"{rows:>9} {name:<36} {baseline_timing['median']:>10.6f} s "
+                f"{timing['median']:>10.6f} s {ratio:>7.2f}x"
+            )
+
+
+def main() -> int:
+    """
+    Run the benchmark suite on generated directories of every size.
+
+    Returns:
+        int: The exit code.
+    """
+    parser = argparse.ArgumentParser(description="Directory benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two result files instead of running the suite.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": {},
+    }
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "data.csv")
+            generate_directory(filename, rows, args.seed)
+            report["results"][str(rows)] = benchmark_directory(
+                filename, rows, args.repeat
+            )
+        print(f"{rows} rows done", file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from record import Record
+from dataclasses import fields
+from typing import Iterable, TextIO
+from config import PARALLEL_LOAD
+from directory_storage import DirectoryStorage, SHARDED_EXTENSION, open_directory
+from errors import (
+    DirectoryLockedError,
+    NotUniquePersonalNumber,
+    QuerySyntaxError,
+    RecordDoesNotExist,
+    RecordValidationError,
+)
+
+RECORD_FIELDS = [field.name for field in fields(Record)]
+OUTPUT_FORMATS = ["plain", "json"]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the parser of the command line arguments.
+
+    Returns:
+        argparse.ArgumentParser: The argument parser with a subparser for every command.
+    """
+    parser = argparse.ArgumentParser(
+        description="Query and modify the phone directory without the interactive UI."
+    )
+    parser.add_argument(
+        "--file", default="data.csv", help="The directory file (default: data.csv)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="plain",
+        help="Print records as CSV rows (plain) or as JSON lines (json).",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="Print the matching records.")
+    search_parser.add_argument(
+        "query",
+        help="A search string or query. A leading '-' negates a term, so '-Acme' "
+        "matches the records not containing Acme; pass it after '--'.",
+    )
+    search_parser.add_argument(
+        "--limit", type=int, default=None, help="Print at most this many records."
+    )
+
+    get_parser = subparsers.add_parser(
+        "get", help="Print records by personal phone number."
+    )
+    get_parser.add_argument("personal_phones", nargs="+", metavar="personal_phone")
+
+    add_parser = subparsers.add_parser("add", help="Add a record.")
+    add_parser.add_argument(
+        "values", nargs="+", metavar="value", help="The field values in file order."
+    )
+
+    delete_parser = subparsers.add_parser(
+        "delete", help="Delete records by personal phone number."
+    )
+    delete_parser.add_argument("personal_phones", nargs="+", metavar="personal_phone")
+
+    import_parser = subparsers.add_parser(
+        "import", help="Add the records of a CSV file."
+    )
+    import_parser.add_argument("source", help="The CSV file to import, or - for stdin.")
+    import_parser.add_argument(
+        "--on-conflict",
+        choices=DirectoryStorage.CONFLICT_POLICIES,
+        default=DirectoryStorage.FAIL,
+        help="What to do with records whose personal phone is already in the directory.",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="Print all records in directory order."
+    )
+    export_parser.add_argument(
+        "--output", default="-", help="The file to write to (default: stdout)."
+    )
+
+    migrate_parser = subparsers.add_parser(
+        "migrate",
+        help=f"Copy the directory into a new SQLite database, or a sharded directory if the target ends in {SHARDED_EXTENSION}.",
+    )
+    migrate_parser.add_argument(
+        "target", help="The database file or sharded directory folder to create."
+    )
+
+    return parser
+
+
+def write_records(
+    records: Iterable[Record], output_format: str, file: TextIO = sys.stdout
+) -> None:
+    """
+    Write records one per line.
+
+    Args:
+        records (Iterable[Record]): The records to write.
+        output_format (str): 'plain' for CSV rows or 'json' for JSON objects.
+        file (TextIO): The file to write to.
+
+    Returns:
+        None
+    """
+    if output_format == "json":
+        for record in records:
+            file.write(json.dumps(dict(zip(RECORD_FIELDS, record))) + "\n")
+    else:
+        csv.writer(file, lineterminator="\n").writerows(records)
+
+
+def search_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Print the records matching a search string.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: False, the directory is not changed.
+    """
+    search_result = directory_manager.search_records(arguments.query)
+    matches = iter(search_result)
+    if arguments.limit is not None:
+        matches = search_result.get_records(0, arguments.limit)
+    write_records(matches, arguments.format)
+    return False
+
+
+def get_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Print records by their personal phone numbers.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: False, the directory is not changed.
+    """
+    records = [
+        directory_manager.get_record(personal_phone)
+        for personal_phone in arguments.personal_phones
+    ]
+    write_records(records, arguments.format)
+    return False
+
+
+def add_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Add a record given by its field values.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: True, the directory is changed.
+    """
+    field_names = directory_manager.get_directory_field_names()
+    if len(arguments.values) != len(field_names):
+        raise RecordValidationError(
+            f"Expected {len(field_names)} field values: {', '.join(field_names)}."
+        )
+
+    record = Record(*arguments.values)
+    for field_name, field_value in zip(field_names, record):
+        if not directory_manager.is_field_valid(field_name, field_value):
+            raise RecordValidationError(
+                f"Invalid {field_name} (Example: {directory_manager.get_field_example(field_name)})."
+            )
+
+    directory_manager.add_record(record)
+    return True
+
+
+def delete_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Delete records by their personal phone numbers and print them.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: True, the directory is changed.
+    """
+    deleted_records = [
+        directory_manager.delete_record(personal_phone)
+        for personal_phone in arguments.personal_phones
+    ]
+    write_records(deleted_records, arguments.format)
+    return True
+
+
+def import_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Add all records of a CSV file and print how many were imported.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: True if any record was added or overwritten, False otherwise.
+    """
+    if arguments.source == "-":
+        summary = directory_manager.import_records(sys.stdin, arguments.on_conflict)
+    else:
+        with open(arguments.source, "r", newline="", encoding="utf-8") as file:
+            summary = directory_manager.import_records(file, arguments.on_conflict)
+
+    print(
+        f"{summary.added} added, {summary.overwritten} overwritten, {summary.skipped} skipped"
+    )
+    return bool(summary.added or summary.overwritten)
+
+
+def export_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Print all records in directory order.
+
+    Plain output starts with the header row, so it can be imported again.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: False, the directory is not changed.
+    """
+    records = directory_manager.get_records()
+    header = [directory_manager.get_directory_field_names()]
+    if arguments.format == "json":
+        header = []
+
+    if arguments.output == "-":
+        write_records(header + records, arguments.format)
+    else:
+        with open(arguments.output, "w", newline="", encoding="utf-8") as file:
+            write_records(header + records, arguments.format, file)
+    return False
+
+
+def migrate_command(
+    directory_manager: DirectoryStorage, arguments: argparse.Namespace
+) -> bool:
+    """
+    Copy the directory into a new SQLite database or sharded directory and print
+    how many records it has.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        arguments (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        bool: False, the directory is not changed.
+    """
+    # Imported here, as every other command runs without the other storages.
+    if arguments.target.rstrip(os.sep).endswith(SHARDED_EXTENSION):
+        from sharded_directory_manager import migrate_to_shards
+
+        count = migrate_to_shards(directory_manager, arguments.target.rstrip(os.sep))
+    else:
+        from sqlite_directory_manager import migrate_directory
+
+        count = migrate_directory(directory_manager, arguments.target)
+    print(f"{count} records migrated to {arguments.target}")
+    return False
+
+
+commands = {
+    "search": search_command,
+    "get": get_command,
+    "add": add_command,
+    "delete": delete_command,
+    "import": import_command,
+    "export": export_command,
+    "migrate": migrate_command,
+}
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point for the non-interactive phone directory commands.
+
+    Only the directory manager is loaded, none of the interactive UI. A command
+    that changes the directory saves the changes before exiting, and a command
+    that fails saves nothing.
+
+    Args:
+        argv (list[str] | None): The command line arguments, defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status: 0 on success, 1 if the command failed.
+    """
+    arguments = build_parser().parse_args(argv)
+    directory_manager = open_directory(
+        arguments.file, show_progress=False, use_search_index=False
+    )
+
+    try:
+        directory_manager.deserialize_directory(parallel=PARALLEL_LOAD)
+        if commands[arguments.command](directory_manager, arguments):
+            directory_manager.serialize_directory()
+    except BrokenPipeError:
+        # The reader of the output went away, e.g. a pipe into head.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except (
+        DirectoryLockedError,
+        NotUniquePersonalNumber,
+        RecordDoesNotExist,
+        RecordValidationError,
+        QuerySyntaxError,
+        OSError,
+    ) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
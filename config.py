@@ -1 +1,9 @@
 RECORDS_PER_PAGE = 10
+VALIDATION_BATCH_SIZE = 10_000
+PARALLEL_LOAD = False
+JOURNAL_COMPACTION_THRESHOLD = 1000
+AUTOSAVE_CHANGES = 100
+AUTOSAVE_INTERVAL = 30.0
+DAEMON_RELOAD_INTERVAL = 1.0
+HISTORY_STEPS = 10_000
+BATCH_INDEX_THRESHOLD = 64
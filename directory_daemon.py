@@ -0,0 +1,729 @@
+import os
+import sys
+import json
+import signal
+import socket
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from collections import OrderedDict, deque
+from typing import Any, Callable
+from record import Record
+from search_result import SearchResult
+from config import DAEMON_RELOAD_INTERVAL
+from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage, open_directory
+from errors import DaemonError, NotUniquePersonalNumber, RecordValidationError
+
+SEARCHES_KEPT = 64
+IMPORTS_KEPT = 8
+CHANGES_KEPT = 1000
+MAX_REQUEST_SIZE = 1 << 24
+
+
+@dataclass
+class PendingImport:
+    """
+    The rows of an import received so far, see RemoteDirectory.add_numbered_rows.
+
+    Attributes:
+        on_conflict (str): One of DirectoryStorage.CONFLICT_POLICIES.
+        row_label (str): What the row numbers count in error messages.
+        numbered_rows (list[tuple[int, list[str]]]): The validated rows with the
+            numbers they are reported by.
+    """
+
+    on_conflict: str
+    row_label: str
+    numbered_rows: list[tuple[int, list[str]]] = field(default_factory=list)
+
+
+class DirectoryDaemon:
+    """
+    Serves one in-memory directory to many clients over a Unix socket.
+
+    Every request is a line of JSON naming a method and its parameters, and is
+    answered by a line of JSON holding either the result or the type and message
+    of the raised error, see remote_directory.RemoteDirectory for the client.
+
+    Requests are answered one at a time on the event loop. Lookups and changes
+    only touch the records in memory, so they take microseconds, and a reader
+    never waits for the disk or the file lock: a save of a CSV directory only
+    takes the pending operations out of it on the loop and is written in a
+    worker thread, while the directory is read and changed from copies shared
+    with the save. Likewise the changes of a reload are read and the indexes
+    built in a worker thread, and only the results are merged into the
+    directory on the loop.
+
+    An import is streamed in chunks of rows, each validated in a worker thread
+    as it arrives. A CSV directory then adds all of them in a worker thread too,
+    while the loop keeps answering lookups; the other changes wait for it on
+    the writing lock, which every change holds, so the loop never waits for the
+    lock of the directory itself.
+
+    Attributes:
+        directory_manager (DirectoryStorage): The directory served.
+        socket_path (str): The path of the Unix socket listened on.
+        version (int): The number of changes that moved records in the sort order.
+        changes (deque[tuple[int, int]]): The version and lowest changed sorted
+            position of the latest changes, for clients to invalidate their pages.
+        searches (OrderedDict[int, SearchResult]): The latest search cursors by id.
+        imports (OrderedDict[int, PendingImport]): The latest unfinished imports by id.
+        writing (asyncio.Lock): Held by every change, so one is made at a time.
+        saves_in_flight (int): The number of saves being written.
+        ready (asyncio.Event): Set once the indexes are built and requests are answered.
+    """
+
+    def __init__(self, directory_manager: DirectoryStorage, socket_path: str) -> None:
+        """
+        Initialize the DirectoryDaemon instance.
+
+        Args:
+            directory_manager (DirectoryStorage): The deserialized directory to serve.
+            socket_path (str): The path of the Unix socket to listen on.
+
+        Returns:
+            None
+        """
+        self.directory_manager: DirectoryStorage = directory_manager
+        self.socket_path: str = socket_path
+        self.version: int = 0
+        self.changes: deque[tuple[int, int]] = deque(maxlen=CHANGES_KEPT)
+        self.searches: OrderedDict[int, SearchResult] = OrderedDict()
+        self.imports: OrderedDict[int, PendingImport] = OrderedDict()
+        self.saves_in_flight: int = 0
+        self.ready: asyncio.Event = asyncio.Event()
+        self.writing: asyncio.Lock = asyncio.Lock()
+        self.__next_search_id: int = 0
+        self.__next_import_id: int = 0
+        self.__handlers: dict[str, Callable[..., Any]] = {
+            "get_fields": self.__get_fields,
+            "get_changes": self.__get_changes,
+            "get_records_count": self.__get_records_count,
+            "get_records_page": self.__get_records_page,
+            "get_record": self.__get_record,
+            "add_record": self.__add_record,
+            "begin_import": self.__begin_import,
+            "import_rows": self.__import_rows,
+            "finish_import": self.__finish_import,
+            "delete_record": self.__delete_record,
+            "replace_record": self.__replace_record,
+            "undo": self.__undo,
+            "redo": self.__redo,
+            "search": self.__search,
+            "fetch_search": self.__fetch_search,
+            "find_similar_names": self.__find_similar_names,
+            "is_number_already_in_directory": self.__is_number_already_in_directory,
+            "has_unsaved_changes": self.__has_unsaved_changes,
+            "save": self.__save,
+        }
+
+    async def serve(self) -> None:
+        """
+        Answer requests until the process is interrupted or terminated.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stopped.set)
+
+        self.__remove_stale_socket()
+        server = await asyncio.start_unix_server(
+            self.__serve_client, self.socket_path, limit=MAX_REQUEST_SIZE
+        )
+        building = asyncio.create_task(self.__build_indexes())
+        reloading = asyncio.create_task(self.__reload_periodically())
+        try:
+            await stopped.wait()
+        finally:
+            building.cancel()
+            reloading.cancel()
+            server.close()
+            await server.wait_closed()
+            os.unlink(self.socket_path)
+
+        if isinstance(self.directory_manager, DirectoryManager):
+            await loop.run_in_executor(None, self.directory_manager.wait_for_saves)
+
+    async def __build_indexes(self) -> None:
+        """
+        Build the sort order and the search indexes of a CSV directory in a
+        worker thread, before any request is answered, so the first page or
+        search does not hold up every client. Clients can connect meanwhile.
+
+        Returns:
+            None
+        """
+        try:
+            if isinstance(self.directory_manager, DirectoryManager):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.directory_manager.build_indexes
+                )
+        finally:
+            self.ready.set()
+
+    def __remove_stale_socket(self) -> None:
+        """
+        Remove the socket file left behind by a daemon that did not exit cleanly.
+
+        Returns:
+            None
+
+        Raises:
+            DaemonError: If another daemon is listening on the socket.
+        """
+        if not os.path.exists(self.socket_path):
+            return
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+                return
+        raise DaemonError(f"A daemon is already listening on {self.socket_path}.")
+
+    async def __serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Answer the requests of one client until it disconnects.
+
+        Args:
+            reader (asyncio.StreamReader): The stream of requests.
+            writer (asyncio.StreamWriter): The stream of responses.
+
+        Returns:
+            None
+        """
+        try:
+            while line := await reader.readline():
+                response = await self.__handle_request(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def __handle_request(self, line: bytes) -> dict:
+        """
+        Run the method a request names.
+
+        Args:
+            line (bytes): The request, a JSON object with a method name and a
+                list of parameters.
+
+        Returns:
+            dict: The response, with the result of the method or the type and
+            message of the error it raised.
+        """
+        await self.ready.wait()
+        try:
+            request = json.loads(line)
+            method = request["method"]
+            if method not in self.__handlers:
+                raise DaemonError(f"Unknown method '{method}'.")
+            result = self.__handlers[method](*request.get("params", []))
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            return {"error": [type(e).__name__, str(e)]}
+        return {"result": result}
+
+    async def __reload_periodically(self) -> None:
+        """
+        Merge the changes other processes saved to the directory files, every
+        DAEMON_RELOAD_INTERVAL seconds.
+
+        The changes of a CSV directory are read in a worker thread, waiting for
+        the file lock there, and merged on the loop. A reload waits for the
+        saves in flight, so it is skipped while one is written.
+
+        Returns:
+            None
+        """
+        await self.ready.wait()
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(DAEMON_RELOAD_INTERVAL)
+            if self.saves_in_flight:
+                continue
+            try:
+                if isinstance(self.directory_manager, DirectoryManager):
+                    pending_reload = await loop.run_in_executor(
+                        None, self.directory_manager.read_reload
+                    )
+                    if pending_reload is not None:
+                        async with self.writing:
+                            self.directory_manager.merge_reload(pending_reload)
+                else:
+                    async with self.writing:
+                        self.directory_manager.reload_directory()
+            except (OSError, NotUniquePersonalNumber, RecordValidationError) as e:
+                print(f"Reload failed: {e}", file=sys.stderr)
+            self.__record_change()
+
+    def __record_change(self) -> None:
+        """
+        Start a new version if the last request moved records in the sort order.
+
+        Returns:
+            None
+        """
+        position = self.directory_manager.pop_first_changed_position()
+        if position is not None:
+            self.version += 1
+            self.changes.append((self.version, position))
+
+    def __get_fields(self) -> dict:
+        """
+        Get the field names, regexes and examples of the directory.
+
+        Returns:
+            dict: The header, regexes and example of the directory, and its version.
+        """
+        return {
+            "header": self.directory_manager.header,
+            "regexes": self.directory_manager.regexes,
+            "example": self.directory_manager.example,
+            "version": self.version,
+        }
+
+    def __get_changes(self, since_version: int) -> list:
+        """
+        Get the lowest sorted position changed since a version.
+
+        Args:
+            since_version (int): The version the client last saw.
+
+        Returns:
+            list: The current version, and the lowest changed position, or None
+            if nothing changed, or 0 if the changes are no longer kept.
+        """
+        if since_version == self.version:
+            return [self.version, None]
+        if not self.changes or self.changes[0][0] > since_version + 1:
+            return [self.version, 0]
+        return [
+            self.version,
+            min(
+                (
+                    position
+                    for version, position in self.changes
+                    if version > since_version
+                ),
+                default=0,
+            ),
+        ]
+
+    def __get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+        return self.directory_manager.get_records_count()
+
+    def __get_records_page(self, start_index: int, end_index: int) -> list:
+        """
+        Get a sorted slice of the records in the directory.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list: The field values of the records in the requested range.
+        """
+        return [
+            list(record)
+            for record in self.directory_manager.get_records_page(
+                start_index, end_index
+            )
+        ]
+
+    def __get_record(self, records_personal_number: str) -> list:
+        """
+        Get a record by its personal phone number.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record.
+
+        Returns:
+            list: The field values of the record.
+        """
+        return list(self.directory_manager.get_record(records_personal_number))
+
+    async def __add_record(self, values: list[str]) -> None:
+        """
+        Add a new record to the directory.
+
+        Args:
+            values (list[str]): The field values of the record.
+
+        Returns:
+            None
+        """
+        record = self.__make_record(values)
+        async with self.writing:
+            self.directory_manager.add_record(record)
+            self.__record_change()
+
+    def __make_record(self, values: list[str]) -> Record:
+        """
+        Create a record sent by a client, validating it first, as clients only
+        validate the fields as they are entered.
+
+        Args:
+            values (list[str]): The field values of the record.
+
+        Returns:
+            Record: The valid record.
+        """
+        record = Record(*values)
+        if not self.directory_manager.is_record_valid(record):
+            raise RecordValidationError(
+                "The record does not match the field formats of the directory."
+            )
+        return record
+
+    def __begin_import(self, on_conflict: str, row_label: str) -> int:
+        """
+        Start an import, whose rows are sent with import_rows.
+
+        Args:
+            on_conflict (str): One of DirectoryStorage.CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+
+        Returns:
+            int: The id of the import.
+
+        Raises:
+            ValueError: If the conflict policy is unknown.
+        """
+        if on_conflict not in DirectoryStorage.CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {on_conflict!r}.")
+
+        import_id = self.__next_import_id
+        self.__next_import_id += 1
+        self.imports[import_id] = PendingImport(on_conflict, row_label)
+        if len(self.imports) > IMPORTS_KEPT:
+            self.imports.popitem(last=False)
+        return import_id
+
+    async def __import_rows(self, import_id: int, numbered_rows: list) -> None:
+        """
+        Validate a chunk of the rows of an import in a worker thread and keep them
+        for finish_import. An invalid chunk discards the whole import.
+
+        Args:
+            import_id (int): The id returned by begin_import.
+            numbered_rows (list): The rows with the numbers they are reported by.
+
+        Returns:
+            None
+        """
+        pending_import = self.__get_import(import_id)
+        try:
+            validated_rows = await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.directory_manager.validate_numbered_rows,
+                numbered_rows,
+                pending_import.row_label,
+            )
+        except Exception:
+            self.imports.pop(import_id, None)
+            raise
+        pending_import.numbered_rows.extend(validated_rows)
+
+    async def __finish_import(self, import_id: int) -> list:
+        """
+        Add the rows of an import to the directory, all of them or none.
+
+        A CSV directory adds them in a worker thread under its lock, so lookups
+        are answered meanwhile. Other storages add them on the loop, as a SQLite
+        connection can only be used by the thread that opened it.
+
+        Args:
+            import_id (int): The id returned by begin_import.
+
+        Returns:
+            list: The number of added, overwritten and skipped records.
+        """
+        pending_import = self.__get_import(import_id)
+        del self.imports[import_id]
+        arguments = (
+            pending_import.numbered_rows,
+            pending_import.on_conflict,
+            pending_import.row_label,
+            True,
+        )
+        async with self.writing:
+            if isinstance(self.directory_manager, DirectoryManager):
+                summary = await asyncio.get_running_loop().run_in_executor(
+                    None, self.directory_manager.add_numbered_rows, *arguments
+                )
+            else:
+                summary = self.directory_manager.add_numbered_rows(*arguments)
+            self.__record_change()
+        return [summary.added, summary.overwritten, summary.skipped]
+
+    def __get_import(self, import_id: int) -> PendingImport:
+        """
+        Get an unfinished import by its id.
+
+        Args:
+            import_id (int): The id returned by begin_import.
+
+        Returns:
+            PendingImport: The rows of the import received so far.
+
+        Raises:
+            DaemonError: If the import is not kept any more.
+        """
+        pending_import = self.imports.get(import_id)
+        if pending_import is None:
+            raise DaemonError("The import expired, please import again.")
+        return pending_import
+
+    async def __delete_record(self, records_personal_number: str) -> list:
+        """
+        Delete a record from the directory.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to delete.
+
+        Returns:
+            list: The field values of the deleted record.
+        """
+        async with self.writing:
+            deleted_record = self.directory_manager.delete_record(
+                records_personal_number
+            )
+            self.__record_change()
+        return list(deleted_record)
+
+    async def __replace_record(
+        self, records_personal_number: str, values: list[str]
+    ) -> list:
+        """
+        Replace a record with an edited one in a single step.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace.
+            values (list[str]): The field values of the edited record.
+
+        Returns:
+            list: The field values of the replaced record.
+        """
+        record = self.__make_record(values)
+        async with self.writing:
+            replaced_record = self.directory_manager.replace_record(
+                records_personal_number, record
+            )
+            self.__record_change()
+        return list(replaced_record)
+
+    async def __undo(self) -> bool:
+        """
+        Revert the latest change made by any client and not undone yet.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+        async with self.writing:
+            undone = self.directory_manager.undo()
+            self.__record_change()
+        return undone
+
+    async def __redo(self) -> bool:
+        """
+        Apply the latest undone change again.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+        async with self.writing:
+            redone = self.directory_manager.redo()
+            self.__record_change()
+        return redone
+
+    def __search(self, search_string: str) -> int:
+        """
+        Start a search and keep its cursor for fetch_search.
+
+        The first match is fetched right away, which collects the candidates of
+        an indexed search, so records changed before the next fetch cannot
+        break the cursor.
+
+        Args:
+            search_string (str): The search string.
+
+        Returns:
+            int: The id of the search.
+        """
+        search_result = self.directory_manager.search_records(search_string)
+        search_result.fetch(1)
+
+        search_id = self.__next_search_id
+        self.__next_search_id += 1
+        self.searches[search_id] = search_result
+        if len(self.searches) > SEARCHES_KEPT:
+            self.searches.popitem(last=False)
+        return search_id
+
+    def __fetch_search(self, search_id: int, start_index: int, end_index: int) -> list:
+        """
+        Get a slice of the matched records of a search.
+
+        Args:
+            search_id (int): The id returned by search.
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list: The matched records in the requested range, and whether they
+            are the last ones.
+        """
+        search_result = self.searches.get(search_id)
+        if search_result is None:
+            raise DaemonError("The search expired, please search again.")
+        self.searches.move_to_end(search_id)
+
+        search_result.fetch(end_index + 1)
+        records = search_result.get_records(start_index, end_index)
+        is_last = search_result.exhausted and end_index >= len(
+            search_result.matched_records
+        )
+        return [[list(record) for record in records], is_last]
+
+    def __find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None
+    ) -> list:
+        """
+        Find the last or first names in the directory within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list: The found names with their distances, nearest first.
+        """
+        return self.directory_manager.find_similar_names(name, max_distance, field_name)
+
+    def __is_number_already_in_directory(self, personal_phone_number: str) -> bool:
+        """
+        Check if a personal phone number already exists in the directory.
+
+        Args:
+            personal_phone_number (str): The personal phone number to check.
+
+        Returns:
+            bool: True if the number already exists, False otherwise.
+        """
+        return self.directory_manager.is_number_already_in_directory(
+            personal_phone_number
+        )
+
+    def __has_unsaved_changes(self) -> bool:
+        """
+        Check if any client changed the directory since the last save.
+
+        Returns:
+            bool: True if there are unsaved changes, False otherwise.
+        """
+        return self.directory_manager.has_unsaved_changes()
+
+    async def __save(self) -> bool:
+        """
+        Save the directory changes made since the last save.
+
+        A CSV directory is written in a worker thread, so requests are answered
+        while it is saved.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+        """
+        if not isinstance(self.directory_manager, DirectoryManager):
+            async with self.writing:
+                return self.directory_manager.serialize_directory()
+
+        async with self.writing:
+            pending_save = self.directory_manager.begin_save()
+        if pending_save is None:
+            return False
+
+        self.saves_in_flight += 1
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.directory_manager.write_save, pending_save, False
+            )
+        finally:
+            self.saves_in_flight -= 1
+        return True
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments of the directory daemon.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve a phone directory to many terminal sessions."
+    )
+    parser.add_argument(
+        "--file",
+        default="data.csv",
+        help="The directory file, a SQLite database if it ends in .db, .sqlite "
+        "or .sqlite3 and a CSV file otherwise (default: data.csv).",
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="The Unix socket to listen on (default: the directory file name "
+        "followed by .sock).",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """
+    Entry point for the directory daemon.
+
+    Returns:
+        None
+    """
+    arguments = parse_arguments()
+    socket_path = arguments.socket or f"{arguments.file}.sock"
+
+    directory_manager = open_directory(arguments.file, show_progress=False)
+    try:
+        directory_manager.deserialize_directory()
+    except (NotUniquePersonalNumber, RecordValidationError) as e:
+        sys.exit(f"Deserialization ERROR:\n{e}")
+
+    daemon = DirectoryDaemon(directory_manager, socket_path)
+    print(f"Serving {arguments.file} on {socket_path}", file=sys.stderr)
+    try:
+        asyncio.run(daemon.serve())
+    except DaemonError as e:
+        sys.exit(str(e))
+
+    if directory_manager.has_unsaved_changes():
+        print(
+            "Unsaved changes were discarded, as no client saved them.",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,472 @@
-import re
+import os
 import csv
+import heapq
+import shutil
+import tempfile
+import threading
+from collections import deque
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+from itertools import chain, islice
 from record import Record
+from journal import Journal
+from snapshot import DirectorySnapshot
+from file_lock import FileLock
+from validator import RecordValidator
+from directory_storage import DirectoryStorage, ImportSummary
+from history import Change, History
+from config import (
+    VALIDATION_BATCH_SIZE,
+    JOURNAL_COMPACTION_THRESHOLD,
+    HISTORY_STEPS,
+    BATCH_INDEX_THRESHOLD,
+)
 from errors import NotUniquePersonalNumber, RecordDoesNotExist, RecordValidationError
+from search_index import TrigramIndex, FieldIndex, PhoneDigitIndex, NameIndex
+from query import (
+    PHONE_DIGITS_FIELD,
+    Term,
+    Not,
+    And,
+    Or,
+    is_structured_query,
+    parse_query,
+)
 from search_result import SearchResult
-from rich.progress import track
+from sorted_records import SortedRecords
 
 
-class DirectoryManager:
+@dataclass
+class PendingSave:
     """
-    A class to manage a directory of records.
+    Represents the changes taken out of a directory to be written to its files.
+
+    Attributes:
+        number (int): The position of the save in the order saves are written in.
+        operations (list[list[str]]): The operations to append to the journal.
+        records (dict[str, Record] | None): The records to rewrite the CSV file
+            with, or None if the journal is only appended to.
+    """
+
+    number: int
+    operations: list[list[str]]
+    records: dict[str, Record] | None = None
+
+
+@dataclass
+class PendingReload:
+    """
+    Represents the changes other processes saved, read from the directory files
+    to be merged into the directory.
+
+    Attributes:
+        saves_count (int): The number of saves begun when the files were read.
+        file_state (tuple[int, int, int]): The state of the CSV file when it was read.
+        journal_offset (int): The size of the journal when it was read.
+        journaled_operations_count (int): The number of operations in the journal.
+        changes (dict[str, Record | None] | None): The saved state of the records
+            changed in the journal, None for deleted ones, or None if the CSV
+            file was rewritten.
+        records (dict[str, Record] | None): All saved records, if the CSV file
+            was rewritten.
     """
 
-    def __init__(self, filename: str) -> None:
+    saves_count: int
+    file_state: tuple[int, int, int]
+    journal_offset: int
+    journaled_operations_count: int
+    changes: dict[str, Record | None] | None = None
+    records: dict[str, Record] | None = None
+
+
+class DirectoryManager(DirectoryStorage):
+    """
+    A class to manage a directory of records stored in a CSV file.
+
+    The records are held in memory. The search indexes and the sort order are
+    built on first use, so loading a directory to look up, add or delete a few
+    records does not pay for them.
+
+    Changes are made under the lock attribute, so another thread can begin and
+    write saves while the directory is changed, see begin_save and write_save.
+    Processes sharing the directory files take turns writing them under an
+    advisory file lock, and merge each other's saved changes with reload_directory.
+
+    Every add, delete, edit and import is recorded in the history attribute with
+    the records it replaced, so it can be undone and redone.
+
+    A headerless CSV file holds only records, and the header, regexes and example
+    are set on the instance before it is deserialized. The shards of a sharded
+    directory are stored this way, and are read and written under the lock of
+    the directory instead of their own, see sharded_directory_manager.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        show_progress: bool = True,
+        use_search_index: bool = True,
+        headerless: bool = False,
+        file_lock: FileLock | None = None,
+    ) -> None:
         """
         Initialize the DirectoryManager instance.
 
         Args:
             filename (str): The name of the CSV file to manage.
+            show_progress (bool): Show a progress bar while the CSV file is rewritten.
+            use_search_index (bool): Answer substring searches from a trigram index.
+                Without it every substring search scans all records, which is
+                cheaper when only one search is made.
+            headerless (bool): The CSV file has no header and regex rows.
+            file_lock (FileLock | None): The lock shared with other processes,
+                defaults to a lock on the file name with a .lock suffix.
 
         Returns:
             None
         """
-        self.filename: str = filename
+        super().__init__(filename)
+        self.show_progress: bool = show_progress
+        self.use_search_index: bool = use_search_index
+        self.headerless: bool = headerless
         self.data: dict[str, Record] = {}
-        self.header: list[str] = []
-        self.regexes: dict[str, str] = {}
-        self.example: dict[str, str] = {}
+        self.search_index: TrigramIndex | None = None
+        self.field_indexes: dict[str, FieldIndex] = {}
+        self.phone_digit_index: PhoneDigitIndex | None = None
+        self.name_index: NameIndex | None = None
+        self.sorted_records: SortedRecords | None = None
+        self.journal: Journal = Journal(f"{filename}.journal")
+        self.snapshot: DirectorySnapshot = DirectorySnapshot(f"{filename}.snapshot")
+        self.file_lock: FileLock = file_lock or FileLock(f"{filename}.lock")
+        self.file_state: tuple[int, int, int] | None = None
+        self.journal_offset: int = 0
+        self.pending_operations: list[list[str]] = []
+        self.dirty_personal_phones: set[str] = set()
+        self.journaled_operations_count: int = 0
+        self.compaction_required: bool = False
+        self.compaction_deferred: bool = False
+        self.data_shared: bool = False
+        self.lock: threading.Lock = threading.Lock()
+        self.save_turn: threading.Condition = threading.Condition()
+        self.begun_saves_count: int = 0
+        self.written_saves_count: int = 0
+        self.history: History = History(HISTORY_STEPS)
 
-    def deserialize_directory(self) -> None:
+    def deserialize_directory(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> None:
         """
         Deserialize the directory data from the CSV file.
 
+        If the CSV file did not change since it was last loaded, its validated
+        contents are read from the snapshot file instead of being parsed again.
+
+        Args:
+            parallel (bool): Validate the data rows in a pool of worker processes.
+            workers (int | None): The number of worker processes, defaults to the number of CPUs.
+
         Returns:
             None
         """
+        with self.file_lock.acquire(shared=True):
+            self.file_state = self.__get_file_state()
+            self.data = self.__load_directory_file(parallel, workers)
+            self.__apply_changes(self.data, self.__collect_changes(self.journal.read()))
+            self.journal_offset = self.journal.get_size()
+
+        self.pending_operations = []
+        self.dirty_personal_phones = set()
+        self.data_shared = False
+        self.journaled_operations_count = self.journal.length
+        self.search_index = None
+        self.field_indexes = {}
+        self.phone_digit_index = None
+        self.name_index = None
+        self.sorted_records = None
+
+    def __load_directory_file(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> dict[str, Record]:
+        """
+        Load the records stored in the CSV file, without the journaled operations.
+
+        If the CSV file did not change since it was last loaded, its validated
+        contents are read from the snapshot file instead of being parsed again.
+
+        Args:
+            parallel (bool): Validate the data rows in a pool of worker processes.
+            workers (int | None): The number of worker processes.
+
+        Returns:
+            dict[str, Record]: The records of the CSV file.
+        """
+        fingerprint = DirectorySnapshot.get_fingerprint(self.filename)
+        snapshot_contents = self.snapshot.load(fingerprint)
+        if snapshot_contents is None:
+            records = self.__parse_directory(parallel, workers)
+            self.__write_snapshot(fingerprint, records)
+            return records
+
+        self.header = snapshot_contents.header
+        self.regexes = snapshot_contents.regexes
+        self.example = snapshot_contents.example
+        self.validator = RecordValidator(self.header, self.regexes)
+        return snapshot_contents.records
+
+    def __parse_directory(
+        self, parallel: bool, workers: int | None
+    ) -> dict[str, Record]:
+        """
+        Parse and validate the directory data from the CSV file.
+
+        Args:
+            parallel (bool): Validate the data rows in a pool of worker processes.
+            workers (int | None): The number of worker processes.
+
+        Returns:
+            dict[str, Record]: The records of the CSV file.
+        """
         with open(self.filename, "r", newline="", encoding="utf-8") as file:
             csv_reader = csv.reader(file)
-            raw_data = [row for row in csv_reader]
+            if self.headerless:
+                return self.__wrap_data_in_records(csv_reader, parallel, workers)
 
-        self.header = raw_data.pop(0)
-        self.regexes = {
-            field_name: regex for field_name, regex in zip(self.header, raw_data.pop(0))
-        }
-        self.example = {
-            field_name: regex for field_name, regex in zip(self.header, raw_data[0])
-        }
+            self.header = next(csv_reader)
+            self.regexes = {
+                field_name: regex
+                for field_name, regex in zip(self.header, next(csv_reader))
+            }
+
+            self.validator = RecordValidator(self.header, self.regexes)
+
+            example_row = next(csv_reader)
+            self.example = {
+                field_name: example
+                for field_name, example in zip(self.header, example_row)
+            }
 
-        self.data = self.__wrap_data_in_records(raw_data)
+            return self.__wrap_data_in_records(
+                chain([example_row], csv_reader), parallel, workers
+            )
 
-    def serialize_directory(self) -> None:
+    def __write_snapshot(self, fingerprint: dict, records: dict[str, Record]) -> None:
         """
-        Serialize the directory data to the CSV file.
+        Write the snapshot of the records currently stored in the CSV file.
+
+        Args:
+            fingerprint (dict): The fingerprint of the CSV file.
+            records (dict[str, Record]): The records stored in the CSV file.
 
         Returns:
             None
         """
-        with open(self.filename, mode="w", newline="", encoding="utf-8") as file:
-            csv_writer = csv.writer(file)
-            csv_writer.writerow(self.header)
-            csv_writer.writerow(self.regexes.values())
-            for record in track(
-                self.data.values(),
-                description=f"Saving changes to {self.filename}...",
+        self.snapshot.write(
+            fingerprint,
+            self.header,
+            self.regexes,
+            self.example,
+            list(records.values()),
+        )
+
+    def serialize_directory(self) -> bool:
+        """
+        Save the directory changes made since the last save.
+
+        The pending operations are appended to the journal, so a save costs time
+        proportional to the number of changes. Once the journal grows past
+        JOURNAL_COMPACTION_THRESHOLD operations it is folded back into the CSV file.
+        Saving a directory without changes does nothing.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+        """
+        pending_save = self.begin_save()
+        if pending_save is None:
+            return False
+
+        self.write_save(pending_save)
+        return True
+
+    def begin_save(self, compact: bool = False) -> PendingSave | None:
+        """
+        Take the changes made since the last save out of the directory.
+
+        Only the list of pending operations changes hands, so a save can be begun
+        while the directory is in use and written by write_save in another thread.
+        A save that rewrites the CSV file shares the records with the directory
+        instead of copying them; the next change of the directory copies them first.
+
+        Args:
+            compact (bool): Rewrite the CSV file even if the journal is short
+                or nothing changed.
+
+        Returns:
+            PendingSave | None: The save to write, or None if there is nothing to save.
+        """
+        with self.lock:
+            if not compact and not self.has_unsaved_changes():
+                return None
+
+            pending_save = PendingSave(self.begun_saves_count, self.pending_operations)
+            self.begun_saves_count += 1
+            self.pending_operations = []
+            self.dirty_personal_phones = set()
+
+            self.journaled_operations_count += len(pending_save.operations)
+            if (
+                compact
+                or self.compaction_required
+                or self.compaction_deferred
+                or self.journaled_operations_count > JOURNAL_COMPACTION_THRESHOLD
             ):
-                csv_writer.writerow(record)
+                pending_save.records = self.data
+                self.data_shared = True
+                self.compaction_required = False
+                self.compaction_deferred = False
+                self.journaled_operations_count = 0
+            return pending_save
 
-    def is_field_valid(self, field_name, field_value) -> bool:
+    def write_save(
+        self, pending_save: PendingSave, show_progress: bool | None = None
+    ) -> None:
         """
-        Check if a given field value is valid according to its regex pattern.
+        Write a save begun by begin_save to the journal and, if it holds records,
+        to the CSV file.
+
+        Saves are written one at a time in the order they were begun, so this
+        first waits for the saves begun earlier, and under the file lock, so
+        other processes wait for it too. The CSV file is not rewritten while
+        other processes' changes are not merged, as that would drop them; the
+        next save after reload_directory rewrites it instead. If writing fails,
+        the next save rewrites the whole CSV file from the records in memory.
 
         Args:
-            field_name (str): The name of the field.
-            field_value (str): The value of the field.
+            pending_save (PendingSave): The save to write.
+            show_progress (bool | None): Show a progress bar while the CSV file is
+                rewritten, defaults to the show_progress attribute.
+
+        Returns:
+            None
+        """
+        with self.save_turn:
+            self.save_turn.wait_for(
+                lambda: self.written_saves_count == pending_save.number
+            )
+
+        try:
+            with self.file_lock.acquire():
+                modified_externally = self.__is_modified_externally()
+                if pending_save.operations:
+                    self.journal.append(pending_save.operations)
+                if not modified_externally:
+                    self.journal_offset = self.journal.get_size()
+
+                if pending_save.records is not None and modified_externally:
+                    with self.lock:
+                        self.compaction_deferred = True
+                elif pending_save.records is not None:
+                    self.__write_directory(
+                        pending_save.records,
+                        self.show_progress if show_progress is None else show_progress,
+                    )
+        except BaseException:
+            with self.lock:
+                self.compaction_required = True
+            raise
+        finally:
+            with self.lock:
+                if pending_save.records is self.data:
+                    self.data_shared = False
+            with self.save_turn:
+                self.written_saves_count += 1
+                self.save_turn.notify_all()
+
+    def wait_for_saves(self) -> None:
+        """
+        Wait until every save begun so far is written.
+
+        Returns:
+            None
+        """
+        with self.save_turn:
+            self.save_turn.wait_for(
+                lambda: self.written_saves_count == self.begun_saves_count
+            )
+
+    def has_unsaved_changes(self) -> bool:
+        """
+        Check if the directory was changed since the last save.
+
+        Returns:
+            bool: True if some records were added, edited or deleted, or a save
+            failed, False otherwise.
+        """
+        return bool(self.dirty_personal_phones) or self.compaction_required
+
+    def compact_directory(self) -> None:
+        """
+        Serialize the whole directory to the CSV file and clear the journal.
 
         Returns:
-            bool: True if the field value is valid, False otherwise.
+            None
         """
-        field_regex = self.regexes.get(field_name)
-        return re.match(field_regex, field_value)
+        self.write_save(self.begin_save(compact=True))
 
-    def get_field_example(self, field_name: str) -> str:
+    def __write_directory(
+        self, records: dict[str, Record], show_progress: bool
+    ) -> None:
         """
-        Get an example value for a specific field.
+        Write records to the CSV file and clear the journal.
+
+        The directory is written to a temporary file next to the CSV file, which
+        then replaces it, so a crash in the middle of a write leaves the old file intact.
 
         Args:
-            field_name (str): The name of the field.
+            records (dict[str, Record]): The records to write.
+            show_progress (bool): Show a progress bar while the records are written.
 
         Returns:
-            str: An example value for the field.
+            None
         """
-        return self.example.get(field_name)
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        with tempfile.NamedTemporaryFile(
+            mode="w",
+            newline="",
+            encoding="utf-8",
+            dir=directory,
+            prefix=f".{os.path.basename(self.filename)}.",
+            suffix=".tmp",
+            delete=False,
+        ) as file:
+            try:
+                csv_writer = csv.writer(file)
+                if not self.headerless:
+                    csv_writer.writerow(self.header)
+                    csv_writer.writerow(self.regexes.values())
+                rows = records.values()
+                if show_progress:
+                    from rich.progress import track
+
+                    rows = track(
+                        rows, description=f"Saving changes to {self.filename}..."
+                    )
+                csv_writer.writerows(rows)
+                file.flush()
+                os.fsync(file.fileno())
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+
+        if os.path.exists(self.filename):
+            shutil.copymode(self.filename, file.name)
+        os.replace(file.name, self.filename)
+
+        self.journal.clear()
+        self.file_state = self.__get_file_state()
+        self.journal_offset = 0
+        self.__write_snapshot(DirectorySnapshot.get_fingerprint(self.filename), records)
 
     def get_records(self) -> list[Record]:
         """
@@ -98,16 +475,49 @@ class DirectoryManager:
         Returns:
             list[Record]: A list of all records.
         """
-        return sorted(self.data.values())
+        return list(self.__get_sorted_records())
+
+    def get_records_page(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a sorted slice of the records in the directory without copying all of them.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+        return self.__get_sorted_records().get_slice(start_index, end_index)
+
+    def get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+        return len(self.data)
 
-    def get_directory_field_names(self) -> list[str]:
+    def get_record(self, records_personal_number: str) -> Record:
         """
-        Get the field names of the directory.
+        Get a record by its personal phone number.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record,
+                either formatted or as ten digits with any punctuation.
 
         Returns:
-            list[str]: A list of field names.
+            Record: The record with that personal phone number.
         """
-        return self.header
+        records_personal_number = self.format_personal_phone(records_personal_number)
+        record = self.data.get(records_personal_number)
+        if record is None:
+            raise RecordDoesNotExist(
+                f"Record with that personal number does not exist."
+            )
+
+        return record
 
     def add_record(self, record: Record) -> None:
         """
@@ -124,85 +534,964 @@ class DirectoryManager:
                 f"Record with that personal number already exist in the directory."
             )
 
-        self.data[record.personal_phone] = record
+        with self.lock:
+            self.__unshare_data()
+            self.data[record.personal_phone] = record
+            self.__index_record(record)
+            self.pending_operations.append([Journal.ADD, *record])
+            self.dirty_personal_phones.add(record.personal_phone)
+            self.history.record([Change(record.personal_phone, None, record)])
 
     def delete_record(self, records_personal_number: str) -> Record:
         """
         Delete a record from the directory.
 
         Args:
-            records_personal_number (str): The personal phone number of the record to delete.
+            records_personal_number (str): The personal phone number of the record to delete,
+                either formatted or as ten digits with any punctuation.
 
         Returns:
             Record: The deleted record.
         """
+        records_personal_number = self.format_personal_phone(records_personal_number)
         if records_personal_number not in self.data:
             raise RecordDoesNotExist(
                 f"Record with that personal number does not exist."
             )
 
-        return self.data.pop(records_personal_number)
+        with self.lock:
+            self.__unshare_data()
+            deleted_record = self.data.pop(records_personal_number)
+            self.__unindex_record(deleted_record)
+            self.pending_operations.append([Journal.DELETE, records_personal_number])
+            self.dirty_personal_phones.add(records_personal_number)
+            self.history.record([Change(records_personal_number, deleted_record, None)])
+        return deleted_record
+
+    def replace_record(self, records_personal_number: str, record: Record) -> Record:
+        """
+        Replace a record with an edited one in a single step.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace,
+                either formatted or as ten digits with any punctuation.
+            record (Record): The edited record, possibly with another personal phone number.
+
+        Returns:
+            Record: The replaced record.
+
+        Raises:
+            RecordDoesNotExist: If no record has that personal phone number.
+            NotUniquePersonalNumber: If another record has the edited personal
+                phone number. The directory is then left unchanged.
+        """
+        replaced_record = self.get_record(records_personal_number)
+        if (
+            record.personal_phone != replaced_record.personal_phone
+            and record.personal_phone in self.data
+        ):
+            raise NotUniquePersonalNumber(
+                f"Record with that personal number already exist in the directory."
+            )
+
+        changes = {replaced_record.personal_phone: None, record.personal_phone: record}
+        with self.lock:
+            self.history.record(
+                [
+                    Change(key, self.data.get(key), after)
+                    for key, after in changes.items()
+                    if self.data.get(key) != after
+                ]
+            )
+            self.__restore_records(changes)
+        return replaced_record
+
+    def undo(self) -> bool:
+        """
+        Revert the latest add, delete, edit or import not undone yet.
+
+        The records the change replaced are restored, which is saved like any
+        other change.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+        with self.lock:
+            changes = self.history.undo()
+            if changes is None:
+                return False
+            self.__restore_records(changes)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Apply the latest undone change again, unless something was changed since.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+        with self.lock:
+            changes = self.history.redo()
+            if changes is None:
+                return False
+            self.__restore_records(changes)
+        return True
+
+    def revert(self) -> bool:
+        """
+        Revert the latest change without keeping it for redo, to roll back a
+        change that is part of a failed operation, see sharded_directory_manager.
+
+        Returns:
+            bool: True if a change was reverted, False if there is nothing to revert.
+        """
+        with self.lock:
+            if not self.history.undo_steps:
+                return False
+            changes = self.history.undo_steps.pop()
+            self.__restore_records(
+                {change.personal_phone: change.before for change in changes}
+            )
+        return True
+
+    def __restore_records(self, changes: dict[str, Record | None]) -> None:
+        """
+        Store records under their personal phone numbers and journal the changes.
+
+        Must be called under the lock attribute.
+
+        Args:
+            changes (dict[str, Record | None]): The records to store by personal
+                phone number, None for the ones to delete.
+
+        Returns:
+            None
+        """
+        changes = {
+            key: record
+            for key, record in changes.items()
+            if self.data.get(key) != record
+        }
+        for key, record in changes.items():
+            if key in self.data:
+                self.pending_operations.append([Journal.DELETE, key])
+            if record is not None:
+                self.pending_operations.append([Journal.ADD, *record])
+            self.dirty_personal_phones.add(key)
+        self.__replace_records(changes)
 
     def search_records(self, search_string: str) -> SearchResult:
         """
         Search for records based on a search string.
 
+        A plain search string matches records containing it as a substring, and a
+        string of digits also matches phone numbers containing those digits. Search
+        strings using the query syntax of query.parse_query are evaluated on sets of
+        candidate records, looking up fielded terms in sorted per-field indexes.
+        Matches are produced lazily in directory order: short plain search strings
+        walk the sorted records, unbroken by later changes, other searches pop
+        their candidates from a heap.
+
         Args:
             search_string (str): The search string.
 
         Returns:
-            SearchResult: The search result containing matched records and a search string.
+            SearchResult: The search result cursor over the matched records.
+
+        Raises:
+            QuerySyntaxError: If the search string is an invalid query.
         """
-        matched_records = [
+        if is_structured_query(search_string):
+            matched_keys = self.__evaluate_query(parse_query(search_string), None)
+            matches = self.__iter_in_sort_order(
+                self.__get_existing_records(matched_keys)
+            )
+            return SearchResult(search_string, matches)
+
+        if search_string.isdigit():
+            matched_keys = self.__evaluate_query(
+                Or(
+                    [Term(None, search_string), Term(PHONE_DIGITS_FIELD, search_string)]
+                ),
+                None,
+            )
+            matches = self.__iter_in_sort_order(
+                self.__get_existing_records(matched_keys)
+            )
+            return SearchResult(search_string, matches)
+
+        if not self.use_search_index:
+            matches = self.__iter_in_sort_order(
+                record
+                for record in list(self.data.values())
+                if search_string in TrigramIndex.get_record_text(record)
+            )
+            return SearchResult(search_string, matches)
+
+        candidate_keys = self.__get_search_index().get_candidates(search_string)
+        candidates = (
+            self.__get_sorted_records().iter_stable()
+            if candidate_keys is None
+            else self.__iter_in_sort_order(self.__get_existing_records(candidate_keys))
+        )
+
+        matches = (
             record
-            for record in self.data.values()
-            if search_string in " ".join(str(value) for value in vars(record).values())
-        ]
+            for record in candidates
+            if search_string in TrigramIndex.get_record_text(record)
+        )
 
-        return SearchResult(search_string, sorted(matched_records))
+        return SearchResult(search_string, matches)
 
-    def is_record_valid(self, record: Record) -> bool:
+    def __evaluate_query(
+        self, node: Term | Not | And | Or, candidates: set[str] | None
+    ) -> set[str]:
         """
-        Check if a record is valid according to its regex patterns.
+        Get the keys of the records matching a query node.
 
         Args:
-            record (Record): The record to check.
+            node (Term | Not | And | Or): The query node to evaluate.
+            candidates (set[str] | None): The keys to restrict the result to,
+                or None to consider the whole directory.
 
         Returns:
-            bool: True if the record is valid, False otherwise.
+            set[str]: The personal phone numbers of the matching records.
         """
-        for field_name, field_value in zip(self.header, record.__dict__.values()):
-            if not re.match(self.regexes[field_name], field_value):
-                return False
-        return True
+        if isinstance(node, Term) and node.fuzzy is not None:
+            matched_keys = self.__get_name_index().lookup(
+                node.value, node.fuzzy, node.field
+            )
+            return matched_keys if candidates is None else matched_keys & candidates
+
+        if isinstance(node, Term) and node.field == PHONE_DIGITS_FIELD:
+            matched_keys = self.__get_phone_digit_index().lookup(node.value)
+            return matched_keys if candidates is None else matched_keys & candidates
+
+        if isinstance(node, Term) and node.field is not None:
+            matched_keys = self.__get_field_index(node.field).lookup(
+                node.value, node.prefix
+            )
+            return matched_keys if candidates is None else matched_keys & candidates
+
+        if isinstance(node, Term):
+            index_keys = (
+                self.__get_search_index().get_candidates(node.value)
+                if self.use_search_index
+                else None
+            )
+            if index_keys is None:
+                pool = list(self.data) if candidates is None else candidates
+            else:
+                pool = index_keys if candidates is None else index_keys & candidates
+            return {
+                record.personal_phone
+                for record in self.__get_existing_records(pool)
+                if node.value in TrigramIndex.get_record_text(record)
+            }
+
+        if isinstance(node, Not):
+            pool = list(self.data) if candidates is None else candidates
+            return set(pool) - self.__evaluate_query(node.operand, candidates)
+
+        if isinstance(node, Or):
+            matched_keys = set()
+            for operand in node.operands:
+                matched_keys |= self.__evaluate_query(operand, candidates)
+            return matched_keys
+
+        # Evaluate the cheapest and most selective operands first, so every later
+        # operand only has to check the records matched so far.
+        for operand in sorted(node.operands, key=self.__get_query_cost):
+            candidates = self.__evaluate_query(operand, candidates)
+            if not candidates:
+                break
+        return candidates
+
+    @staticmethod
+    def __get_query_cost(node: Term | Not | And | Or) -> int:
+        """
+        Rank a query node by how expensive it is to evaluate on its own.
+
+        Args:
+            node (Term | Not | And | Or): The query node.
+
+        Returns:
+            int: The rank of the node, lower ranks are evaluated first.
+        """
+        if isinstance(node, Term) and node.fuzzy is not None:
+            return 1
+        if isinstance(node, Term):
+            return 0 if node.field is not None else 2
+        if isinstance(node, Not):
+            return 3
+        return 1
+
+    def build_indexes(self) -> None:
+        """
+        Build the sort order and the search indexes now instead of on first use.
+
+        Returns:
+            None
+        """
+        self.__get_sorted_records()
+        self.__get_phone_digit_index()
+        self.__get_name_index()
+        if self.use_search_index:
+            self.__get_search_index()
+
+    def __get_search_index(self) -> TrigramIndex:
+        """
+        Get the trigram index, building it on first use.
+
+        Returns:
+            TrigramIndex: The substring index over the records' text.
+        """
+        if self.search_index is None:
+            self.search_index = TrigramIndex()
+            for record in self.data.values():
+                self.search_index.add(record)
+        return self.search_index
 
-    def __wrap_data_in_records(self, data: list[list[str]]) -> dict[str, Record]:
+    def __get_sorted_records(self) -> SortedRecords:
+        """
+        Get the records in directory order, sorting them on first use.
+
+        Returns:
+            SortedRecords: The sorted container of all records.
+        """
+        if self.sorted_records is None:
+            self.sorted_records = SortedRecords(self.data.values())
+        return self.sorted_records
+
+    def __get_field_index(self, field_name: str) -> FieldIndex:
+        """
+        Get the sorted index of a field, building it on first use.
+
+        While another thread changes the directory, e.g. an import in a daemon's
+        worker thread, the index is built for this lookup only, over a copy of the
+        records, instead of waiting for the change to finish.
+
+        Args:
+            field_name (str): The Record attribute of the field.
+
+        Returns:
+            FieldIndex: The index of the field.
+        """
+        if field_name in self.field_indexes:
+            return self.field_indexes[field_name]
+        if not self.lock.acquire(blocking=False):
+            return FieldIndex(field_name, list(self.data.values()))
+        try:
+            field_index = FieldIndex(field_name, self.data.values())
+            self.field_indexes[field_name] = field_index
+        finally:
+            self.lock.release()
+        return field_index
+
+    def __get_name_index(self) -> NameIndex:
+        """
+        Get the fuzzy name index, building it on first use.
+
+        Returns:
+            NameIndex: The index over the last and first names.
+        """
+        if self.name_index is None:
+            self.name_index = NameIndex(self.data.values())
+        return self.name_index
+
+    def __get_phone_digit_index(self) -> PhoneDigitIndex:
+        """
+        Get the phone digit index, building it on first use.
+
+        Returns:
+            PhoneDigitIndex: The suffix index over the phone number digits.
+        """
+        if self.phone_digit_index is None:
+            self.phone_digit_index = PhoneDigitIndex(self.data.values())
+        return self.phone_digit_index
+
+    def __get_existing_records(self, keys: Iterable[str]) -> Iterator[Record]:
+        """
+        Get the records of personal phone numbers, skipping the ones removed since
+        the numbers were looked up, e.g. by an import in a daemon's worker thread.
+
+        Args:
+            keys (Iterable[str]): The personal phone numbers.
+
+        Returns:
+            Iterator[Record]: An iterator over the records that still exist.
+        """
+        for key in keys:
+            record = self.data.get(key)
+            if record is not None:
+                yield record
+
+    @staticmethod
+    def __iter_in_sort_order(records: Iterable[Record]) -> Iterator[Record]:
+        """
+        Iterate over records in directory order, sorting only as far as consumed.
+
+        Args:
+            records (Iterable[Record]): The records to iterate over.
+
+        Returns:
+            Iterator[Record]: An iterator over the records in directory order.
+        """
+        heap = [(record.sort_key(), record) for record in records]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[1]
+
+    def find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the last or first names in the directory within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+        return self.__get_name_index().find_names(name, max_distance, field_name)
+
+    def __wrap_data_in_records(
+        self,
+        data: Iterable[list[str]],
+        parallel: bool = False,
+        workers: int | None = None,
+    ) -> dict[str, Record]:
         """
         Wrap raw data in Record objects and perform validation.
 
+        Rows are consumed in fixed-size batches that are validated column by column,
+        so the raw data never has to be held in memory next to the records built from it.
+        In parallel mode the batches are validated in worker processes, while the
+        duplicate check is still done here in row order, so the reported error is
+        the same as in serial mode.
+
         Args:
-            data (list[list[str]]): The raw data from the CSV file.
+            data (Iterable[list[str]]): The raw data rows from the CSV file.
+            parallel (bool): Validate the batches in a pool of worker processes.
+            workers (int | None): The number of worker processes.
 
         Returns:
             dict[str, Record]: A dictionary of records.
         """
+        batches = self.__split_into_batches(data)
+        if parallel:
+            validated_batches = self.__validate_batches_in_processes(batches, workers)
+        else:
+            validated_batches = (
+                (batch, self.validator.validate_many(batch)) for batch in batches
+            )
+
         wrapped_data: dict[str, Record] = {}
-        for row in data:
-            record = Record(*row)
-            if not self.is_record_valid(record):
-                raise RecordValidationError(
-                    f"Fields in some records are not valid. Modify record fields in {self.filename} to match the regexes located in the file and restart the application."
+        with closing(validated_batches):
+            for batch, invalid_row_index in validated_batches:
+                valid_rows = (
+                    batch if invalid_row_index is None else batch[:invalid_row_index]
                 )
 
-            if record.personal_phone in wrapped_data:
-                raise NotUniquePersonalNumber(
-                    f"Identical personal phone numbers found in {self.filename}. Remove identical numbers and restart the application."
-                )
+                for row in valid_rows:
+                    record = Record(*row)
+                    if record.personal_phone in wrapped_data:
+                        raise NotUniquePersonalNumber(
+                            f"Identical personal phone numbers found in {self.filename}. Remove identical numbers and restart the application."
+                        )
 
-            wrapped_data[record.personal_phone] = record
+                    wrapped_data[record.personal_phone] = record
+
+                if invalid_row_index is not None:
+                    raise RecordValidationError(
+                        f"Fields in some records are not valid. Modify record fields in {self.filename} to match the regexes located in the file and restart the application."
+                    )
 
         return wrapped_data
 
+    @staticmethod
+    def __split_into_batches(data: Iterable[list[str]]) -> Iterator[list[list[str]]]:
+        """
+        Split raw data rows into validation batches.
+
+        Args:
+            data (Iterable[list[str]]): The raw data rows.
+
+        Returns:
+            Iterator[list[list[str]]]: An iterator over batches of rows.
+        """
+        rows = iter(data)
+        while batch := list(islice(rows, VALIDATION_BATCH_SIZE)):
+            yield batch
+
+    def __validate_batches_in_processes(
+        self, batches: Iterator[list[list[str]]], workers: int | None
+    ) -> Iterator[tuple[list[list[str]], int | None]]:
+        """
+        Validate batches of rows in a pool of worker processes.
+
+        Only a bounded number of batches is in flight at a time, and results are
+        yielded in the original batch order.
+
+        Args:
+            batches (Iterator[list[list[str]]]): The batches to validate.
+            workers (int | None): The number of worker processes.
+
+        Returns:
+            Iterator[tuple[list[list[str]], int | None]]: Each batch together with
+            the index of its first invalid row, or None if all its rows are valid.
+        """
+        # Imported here, as starting worker processes pulls in multiprocessing,
+        # which a serial load does not need.
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = workers or os.cpu_count() or 1
+        max_in_flight = 2 * workers
+        in_flight = deque()
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            for batch in batches:
+                in_flight.append(
+                    (batch, executor.submit(self.validator.validate_many, batch))
+                )
+                if len(in_flight) >= max_in_flight:
+                    batch, future = in_flight.popleft()
+                    yield batch, future.result()
+
+            while in_flight:
+                batch, future = in_flight.popleft()
+                yield batch, future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def __index_record(self, record: Record) -> None:
+        """
+        Add a record to the sort order and to every index built so far.
+
+        Args:
+            record (Record): The added record.
+
+        Returns:
+            None
+        """
+        if self.search_index is not None:
+            self.search_index.add(record)
+        for field_index in self.field_indexes.values():
+            field_index.add(record)
+        if self.phone_digit_index is not None:
+            self.phone_digit_index.add(record)
+        if self.name_index is not None:
+            self.name_index.add(record)
+        if self.sorted_records is not None:
+            self.mark_changed_position(self.sorted_records.add(record))
+
+    def __unindex_record(self, record: Record) -> None:
+        """
+        Remove a record from the sort order and from every index built so far.
+
+        Args:
+            record (Record): The deleted record.
+
+        Returns:
+            None
+        """
+        if self.search_index is not None:
+            self.search_index.remove(record)
+        for field_index in self.field_indexes.values():
+            field_index.remove(record)
+        if self.phone_digit_index is not None:
+            self.phone_digit_index.remove(record)
+        if self.name_index is not None:
+            self.name_index.remove(record)
+        if self.sorted_records is not None:
+            self.mark_changed_position(self.sorted_records.remove(record))
+
+    def add_numbered_rows(
+        self,
+        numbered_rows: Iterable[tuple[int, Iterable[str]]],
+        on_conflict: str,
+        row_label: str,
+        validated: bool = False,
+    ) -> ImportSummary:
+        """
+        Add rows of field values to the directory batch by batch.
+
+        A batch is only applied once all its rows are valid and its conflicts are
+        resolved, and batches applied before a failing one are rolled back.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            on_conflict (str): One of CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+            validated (bool): The rows were already checked by validate_numbered_rows.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        if on_conflict not in self.CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {on_conflict!r}.")
+
+        with self.lock:
+            self.__unshare_data()
+            summary = ImportSummary()
+            applied: list[tuple[Record, Record | None]] = []
+            pending_operations_count = len(self.pending_operations)
+            dirty_personal_phones = set(self.dirty_personal_phones)
+
+            try:
+                for batch in self.__split_into_batches(numbered_rows):
+                    rows = [list(row) for _, row in batch]
+                    invalid_row_index = (
+                        None if validated else self.validator.validate_many(rows)
+                    )
+                    if invalid_row_index is not None:
+                        raise RecordValidationError(
+                            f"{row_label} {batch[invalid_row_index][0]} does not match the regexes of the directory."
+                        )
+
+                    batch_records: dict[str, Record] = {}
+                    for (row_number, _), row in zip(batch, rows):
+                        record = Record(*row)
+                        key = record.personal_phone
+                        if key in batch_records or key in self.data:
+                            if on_conflict == self.FAIL:
+                                raise NotUniquePersonalNumber(
+                                    f"{row_label} {row_number}: record with that personal number already exist in the directory."
+                                )
+                            if on_conflict == self.SKIP:
+                                summary.skipped += 1
+                                continue
+                            summary.overwritten += 1
+                        else:
+                            summary.added += 1
+                        batch_records[key] = record
+
+                    replaced_records = [
+                        self.data[key] for key in batch_records if key in self.data
+                    ]
+                    self.__unindex_records(replaced_records)
+                    for record in batch_records.values():
+                        replaced_record = self.data.get(record.personal_phone)
+                        if replaced_record is not None:
+                            self.pending_operations.append(
+                                [Journal.DELETE, record.personal_phone]
+                            )
+                        self.data[record.personal_phone] = record
+                        self.pending_operations.append([Journal.ADD, *record])
+                        self.dirty_personal_phones.add(record.personal_phone)
+                        applied.append((record, replaced_record))
+                    self.__index_records(list(batch_records.values()))
+            except Exception:
+                # The first record replaced under a personal phone number is the one
+                # the directory had before the import.
+                original_records: dict[str, Record | None] = {}
+                for record, replaced_record in applied:
+                    original_records.setdefault(record.personal_phone, replaced_record)
+
+                self.__replace_records(original_records)
+                del self.pending_operations[pending_operations_count:]
+                self.dirty_personal_phones = dirty_personal_phones
+                raise
+
+            original_records = {}
+            for record, replaced_record in applied:
+                original_records.setdefault(record.personal_phone, replaced_record)
+            self.history.record(
+                [
+                    Change(key, original_record, self.data[key])
+                    for key, original_record in original_records.items()
+                ]
+            )
+            return summary
+
+    def __index_records(self, records: list[Record]) -> None:
+        """
+        Add a batch of records to the sort order and to every index built so far.
+
+        The sorted indexes merge the whole batch in one pass, instead of shifting
+        their entries once for every record.
+
+        Args:
+            records (list[Record]): The added records.
+
+        Returns:
+            None
+        """
+        if not records:
+            return
+        if self.search_index is not None:
+            for record in records:
+                self.search_index.add(record)
+        for field_index in self.field_indexes.values():
+            field_index.update(records)
+        if self.phone_digit_index is not None:
+            self.phone_digit_index.update(records)
+        if self.name_index is not None:
+            for record in records:
+                self.name_index.add(record)
+        if self.sorted_records is not None:
+            self.mark_changed_position(self.sorted_records.update(records))
+
+    def __unindex_records(self, records: list[Record]) -> None:
+        """
+        Remove a batch of records from the sort order and from every index built so far.
+
+        Args:
+            records (list[Record]): The replaced records.
+
+        Returns:
+            None
+        """
+        if not records:
+            return
+        if self.search_index is not None:
+            for record in records:
+                self.search_index.remove(record)
+        for field_index in self.field_indexes.values():
+            field_index.remove_many(records)
+        if self.phone_digit_index is not None:
+            self.phone_digit_index.remove_many(records)
+        if self.name_index is not None:
+            for record in records:
+                self.name_index.remove(record)
+        if self.sorted_records is not None:
+            self.mark_changed_position(self.sorted_records.remove_many(records))
+
+    def __unshare_data(self) -> None:
+        """
+        Copy the records before they are changed, if a save still shares them.
+
+        Returns:
+            None
+        """
+        if self.data_shared:
+            self.data = dict(self.data)
+            self.data_shared = False
+
+    def __collect_changes(
+        self, operations: Iterable[list[str]]
+    ) -> dict[str, Record | None]:
+        """
+        Fold journaled operations into the final state of every record they touch.
+
+        Incomplete operations, for example a line cut short by a crash, are skipped.
+
+        Args:
+            operations (Iterable[list[str]]): The operations in journal order.
+
+        Returns:
+            dict[str, Record | None]: The last added record of every touched
+            personal phone number, or None if it was deleted last.
+        """
+        changes: dict[str, Record | None] = {}
+        for operation in operations:
+            if (
+                operation[:1] == [Journal.ADD]
+                and len(operation) == len(self.header) + 1
+            ):
+                record = Record(*operation[1:])
+                changes[record.personal_phone] = record
+            elif operation[:1] == [Journal.DELETE] and len(operation) == 2:
+                changes[operation[1]] = None
+        return changes
+
+    @staticmethod
+    def __apply_changes(
+        records: dict[str, Record], changes: dict[str, Record | None]
+    ) -> None:
+        """
+        Apply folded changes to records that are not indexed yet.
+
+        Args:
+            records (dict[str, Record]): The records to change.
+            changes (dict[str, Record | None]): The changes from __collect_changes.
+
+        Returns:
+            None
+        """
+        for key, record in changes.items():
+            if record is None:
+                records.pop(key, None)
+            else:
+                records[key] = record
+
+    def reload_directory(self) -> bool:
+        """
+        Merge the changes other processes saved to the directory files.
+
+        Operations appended to the journal since it was last read are merged by
+        personal phone number. If the CSV file was rewritten, its records are
+        compared with the loaded ones instead. Either way only the changed
+        records are updated in the sort order and the indexes. Records with
+        unsaved changes keep them, as those are saved after the merged ones.
+
+        Returns:
+            bool: True if any record changed, False otherwise.
+        """
+        pending_reload = self.read_reload()
+        if pending_reload is None:
+            return False
+        return self.merge_reload(pending_reload)
+
+    def read_reload(self) -> PendingReload | None:
+        """
+        Read the changes other processes saved to the directory files, without
+        changing the directory.
+
+        Only the files are read, under the file lock, so a reload can be read in
+        another thread while the directory is in use and merged by merge_reload.
+
+        Returns:
+            PendingReload | None: The changes to merge, or None if the files did
+            not change.
+        """
+        if not self.__is_modified_externally():
+            return None
+
+        # A save in flight carries changes no longer marked as unsaved, which
+        # merged operations must not overwrite.
+        self.wait_for_saves()
+        with self.file_lock.acquire(shared=True):
+            file_state = self.__get_file_state()
+            saves_count = self.begun_saves_count
+            if file_state == self.file_state:
+                operations, journal_offset = self.journal.read_from(self.journal_offset)
+                return PendingReload(
+                    saves_count,
+                    file_state,
+                    journal_offset,
+                    self.journaled_operations_count + len(operations),
+                    changes=self.__collect_changes(operations),
+                )
+
+            records = self.__load_directory_file()
+            self.__apply_changes(records, self.__collect_changes(self.journal.read()))
+            return PendingReload(
+                saves_count,
+                file_state,
+                self.journal.get_size(),
+                self.journal.length,
+                records=records,
+            )
+
+    def merge_reload(self, pending_reload: PendingReload) -> bool:
+        """
+        Merge changes read by read_reload into the records and their indexes.
+
+        Args:
+            pending_reload (PendingReload): The changes to merge.
+
+        Returns:
+            bool: True if any record changed, False otherwise.
+        """
+        with self.lock:
+            if (
+                self.written_saves_count != self.begun_saves_count
+                or self.begun_saves_count != pending_reload.saves_count
+            ):
+                # Begun after the files were read, merged on the next reload.
+                return False
+
+            changes = pending_reload.changes
+            if changes is None:
+                records = pending_reload.records
+                changes = {
+                    key: record
+                    for key, record in records.items()
+                    if self.data.get(key) != record
+                }
+                changes.update((key, None) for key in self.data if key not in records)
+
+            merged = self.__merge_changes(changes)
+            self.file_state = pending_reload.file_state
+            self.journal_offset = pending_reload.journal_offset
+            self.journaled_operations_count = pending_reload.journaled_operations_count
+        return merged
+
+    def __merge_changes(self, changes: dict[str, Record | None]) -> bool:
+        """
+        Apply changes saved by other processes to the records and their indexes.
+
+        Args:
+            changes (dict[str, Record | None]): The saved state of the changed records,
+                None for deleted ones.
+
+        Returns:
+            bool: True if any record changed, False otherwise.
+        """
+        changes = {
+            key: record
+            for key, record in changes.items()
+            if key not in self.dirty_personal_phones and self.data.get(key) != record
+        }
+        if not changes:
+            return False
+
+        self.__replace_records(changes)
+        return True
+
+    def __replace_records(self, changes: dict[str, Record | None]) -> None:
+        """
+        Store records under their personal phone numbers and update the indexes.
+
+        Args:
+            changes (dict[str, Record | None]): The records to store by personal
+                phone number, None for the ones to delete.
+
+        Returns:
+            None
+        """
+        self.__unshare_data()
+        replaced_records = [self.data[key] for key in changes if key in self.data]
+        stored_records = [record for record in changes.values() if record is not None]
+        # The batch updates rebuild the sorted indexes, which only pays off for many records.
+        batched = len(replaced_records) + len(stored_records) > BATCH_INDEX_THRESHOLD
+
+        if batched:
+            self.__unindex_records(replaced_records)
+        else:
+            for record in replaced_records:
+                self.__unindex_record(record)
+        for key, record in changes.items():
+            if record is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = record
+        if batched:
+            self.__index_records(stored_records)
+        else:
+            for record in stored_records:
+                self.__index_record(record)
+
+    def __is_modified_externally(self) -> bool:
+        """
+        Check if the directory files changed since they were last read or written.
+
+        Returns:
+            bool: True if the CSV file was replaced or touched, or the journal
+            grew, False otherwise.
+        """
+        return (
+            self.__get_file_state() != self.file_state
+            or self.journal.get_size() != self.journal_offset
+        )
+
+    def __get_file_state(self) -> tuple[int, int, int]:
+        """
+        Get the inode, size and modification time of the CSV file.
+
+        Returns:
+            tuple[int, int, int]: The state of the CSV file, which changes whenever
+            the file is replaced or written.
+        """
+        stat = os.stat(self.filename)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
     def is_number_already_in_directory(self, personal_phone_number: str) -> bool:
         """
         Check if a personal phone number already exists in the directory.
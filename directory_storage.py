@@ -0,0 +1,497 @@
+import os
+import csv
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+from record import Record
+from config import VALIDATION_BATCH_SIZE
+from errors import RecordValidationError
+from validator import RecordValidator
+from search_result import SearchResult
+from search_index import PhoneDigitIndex
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+SHARDED_EXTENSION = ".shards"
+
+
+@dataclass
+class ImportSummary:
+    """
+    Represents the outcome of adding a batch of records to the directory.
+
+    Attributes:
+        added (int): The number of records with a new personal phone number.
+        overwritten (int): The number of existing records replaced by imported ones.
+        skipped (int): The number of imported records dropped because of a conflict.
+    """
+
+    added: int = 0
+    overwritten: int = 0
+    skipped: int = 0
+
+
+class DirectoryStorage(ABC):
+    """
+    The interface of a directory of records, whatever it is stored in.
+
+    The field names, regexes and examples of a directory and the validation of
+    records against them are the same for every storage. Subclasses store and
+    look up the records.
+
+    Attributes:
+        CONFLICT_POLICIES (tuple[str, str, str]): The ways add_records can resolve
+            a record whose personal phone number is already in the directory:
+            SKIP keeps the existing record, OVERWRITE replaces it and FAIL
+            raises NotUniquePersonalNumber.
+    """
+
+    SKIP = "skip"
+    OVERWRITE = "overwrite"
+    FAIL = "fail"
+    CONFLICT_POLICIES = (SKIP, OVERWRITE, FAIL)
+
+    def __init__(self, filename: str) -> None:
+        """
+        Initialize the DirectoryStorage instance.
+
+        Args:
+            filename (str): The name of the file the directory is stored in.
+
+        Returns:
+            None
+        """
+        self.filename: str = filename
+        self.header: list[str] = []
+        self.regexes: dict[str, str] = {}
+        self.example: dict[str, str] = {}
+        self.validator: RecordValidator = RecordValidator([], {})
+        self.first_changed_position: int | None = None
+
+    @abstractmethod
+    def deserialize_directory(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> None:
+        """
+        Load the directory from its file.
+
+        Args:
+            parallel (bool): Validate the loaded records in a pool of worker processes,
+                if the storage validates them on load.
+            workers (int | None): The number of worker processes.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def serialize_directory(self) -> bool:
+        """
+        Save the directory changes made since the last save.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+        """
+
+    @abstractmethod
+    def reload_directory(self) -> bool:
+        """
+        Merge the changes other processes saved to the directory since it was
+        loaded or last reloaded.
+
+        Returns:
+            bool: True if the directory changed, False otherwise.
+        """
+
+    @abstractmethod
+    def has_unsaved_changes(self) -> bool:
+        """
+        Check if the directory was changed since the last save.
+
+        Returns:
+            bool: True if some records were added, edited or deleted, False otherwise.
+        """
+
+    @abstractmethod
+    def get_records(self) -> list[Record]:
+        """
+        Get a sorted list of all records in the directory.
+
+        Returns:
+            list[Record]: A list of all records.
+        """
+
+    @abstractmethod
+    def get_records_page(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a sorted slice of the records in the directory without copying all of them.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+
+    @abstractmethod
+    def get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+
+    @abstractmethod
+    def get_record(self, records_personal_number: str) -> Record:
+        """
+        Get a record by its personal phone number.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The record with that personal phone number.
+        """
+
+    @abstractmethod
+    def add_record(self, record: Record) -> None:
+        """
+        Add a new record to the directory.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def add_numbered_rows(
+        self,
+        numbered_rows: Iterable[tuple[int, Iterable[str]]],
+        on_conflict: str,
+        row_label: str,
+        validated: bool = False,
+    ) -> ImportSummary:
+        """
+        Add rows of field values to the directory, all of them or none.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            on_conflict (str): One of CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+            validated (bool): The rows were already checked by validate_numbered_rows.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+
+    @abstractmethod
+    def delete_record(self, records_personal_number: str) -> Record:
+        """
+        Delete a record from the directory.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to delete,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The deleted record.
+        """
+
+    @abstractmethod
+    def replace_record(self, records_personal_number: str, record: Record) -> Record:
+        """
+        Replace a record with an edited one in a single step.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace,
+                either formatted or as ten digits with any punctuation.
+            record (Record): The edited record, possibly with another personal phone number.
+
+        Returns:
+            Record: The replaced record.
+
+        Raises:
+            RecordDoesNotExist: If no record has that personal phone number.
+            NotUniquePersonalNumber: If another record has the edited personal
+                phone number. The directory is then left unchanged.
+        """
+
+    @abstractmethod
+    def undo(self) -> bool:
+        """
+        Revert the latest add, delete, edit or import not undone yet.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+
+    @abstractmethod
+    def redo(self) -> bool:
+        """
+        Apply the latest undone change again, unless something was changed since.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+
+    @abstractmethod
+    def search_records(self, search_string: str) -> SearchResult:
+        """
+        Search for records based on a search string.
+
+        Args:
+            search_string (str): A plain search string or a query in the syntax
+                of query.parse_query.
+
+        Returns:
+            SearchResult: The search result cursor over the matched records.
+
+        Raises:
+            QuerySyntaxError: If the search string is an invalid query.
+        """
+
+    @abstractmethod
+    def find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the last or first names in the directory within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+
+    @abstractmethod
+    def is_number_already_in_directory(self, personal_phone_number: str) -> bool:
+        """
+        Check if a personal phone number already exists in the directory.
+
+        Args:
+            personal_phone_number (str): The personal phone number to check.
+
+        Returns:
+            bool: True if the number already exists, False otherwise.
+        """
+
+    def add_records(
+        self, records: Iterable[Iterable[str]], on_conflict: str = FAIL
+    ) -> ImportSummary:
+        """
+        Add many records to the directory.
+
+        The records are consumed in batches that are validated against the regexes
+        of the directory column by column. Either all records are added or, if one
+        of them is invalid or conflicts under the FAIL policy, none of them.
+
+        Args:
+            records (Iterable[Iterable[str]]): The records to add, as Record objects
+                or as rows of field values.
+            on_conflict (str): One of CONFLICT_POLICIES, applied to records whose
+                personal phone number is already in the directory or earlier in records.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        return self.add_numbered_rows(
+            enumerate(records, start=1), on_conflict, "Record"
+        )
+
+    def import_records(self, file: TextIO, on_conflict: str = FAIL) -> ImportSummary:
+        """
+        Add the records of a CSV file to the directory.
+
+        The header and regex rows of a file in the directory format are skipped,
+        so another directory file can be imported as is. See add_records.
+
+        Args:
+            file (TextIO): The CSV file to import, opened with newline=''.
+            on_conflict (str): One of CONFLICT_POLICIES.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        csv_reader = csv.reader(file)
+        regex_row = list(self.regexes.values())
+
+        def numbered_rows() -> Iterator[tuple[int, list[str]]]:
+            for row in csv_reader:
+                if csv_reader.line_num <= 2 and row in (self.header, regex_row):
+                    continue
+                yield csv_reader.line_num, row
+
+        return self.add_numbered_rows(numbered_rows(), on_conflict, "Line")
+
+    def validate_numbered_rows(
+        self, numbered_rows: Iterable[tuple[int, Iterable[str]]], row_label: str
+    ) -> list[tuple[int, list[str]]]:
+        """
+        Check rows of field values against the regexes of the directory, batch by batch.
+
+        Only the validator is used, so rows can be checked in another thread
+        while the directory is in use and then added with add_numbered_rows.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            row_label (str): What the row numbers count in error messages.
+
+        Returns:
+            list[tuple[int, list[str]]]: The numbered rows, with the field values as lists.
+
+        Raises:
+            RecordValidationError: If a row does not match the regexes.
+        """
+        validated_rows = []
+        rows_iterator = iter(numbered_rows)
+        while batch := list(islice(rows_iterator, VALIDATION_BATCH_SIZE)):
+            rows = [list(row) for _, row in batch]
+            invalid_row_index = self.validator.validate_many(rows)
+            if invalid_row_index is not None:
+                raise RecordValidationError(
+                    f"{row_label} {batch[invalid_row_index][0]} does not match the regexes of the directory."
+                )
+            validated_rows.extend(zip((row_number for row_number, _ in batch), rows))
+        return validated_rows
+
+    def is_field_valid(self, field_name: str, field_value: str) -> bool:
+        """
+        Check if a given field value is valid according to its regex pattern.
+
+        Args:
+            field_name (str): The name of the field.
+            field_value (str): The value of the field.
+
+        Returns:
+            bool: True if the field value is valid, False otherwise.
+        """
+        return self.validator.is_field_valid(field_name, field_value)
+
+    def get_field_example(self, field_name: str) -> str:
+        """
+        Get an example value for a specific field.
+
+        Args:
+            field_name (str): The name of the field.
+
+        Returns:
+            str: An example value for the field.
+        """
+        return self.example.get(field_name)
+
+    def get_directory_field_names(self) -> list[str]:
+        """
+        Get the field names of the directory.
+
+        Returns:
+            list[str]: A list of field names.
+        """
+        return self.header
+
+    def is_record_valid(self, record: Record) -> bool:
+        """
+        Check if a record is valid according to its regex patterns.
+
+        Args:
+            record (Record): The record to check.
+
+        Returns:
+            bool: True if the record is valid, False otherwise.
+        """
+        return self.validator.is_row_valid(record)
+
+    def pop_first_changed_position(self) -> int | None:
+        """
+        Get and reset the lowest sorted position changed since the last call.
+
+        Records after an added or deleted record shift by one position, so every
+        position from the returned one on may hold a different record.
+
+        Returns:
+            int | None: The lowest changed position, or None if nothing changed.
+        """
+        first_changed_position = self.first_changed_position
+        self.first_changed_position = None
+        return first_changed_position
+
+    def format_personal_phone(self, personal_phone_number: str) -> str:
+        """
+        Bring a personal phone number entered with other punctuation into the
+        '(555) 555-5555' format the directory is keyed by.
+
+        Args:
+            personal_phone_number (str): The entered personal phone number.
+
+        Returns:
+            str: The formatted number, or the entered one if it has no ten digits.
+        """
+        if self.is_number_already_in_directory(personal_phone_number):
+            return personal_phone_number
+
+        digits = PhoneDigitIndex.normalize(personal_phone_number)
+        if len(digits) != 10:
+            return personal_phone_number
+        return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+
+    def mark_changed_position(self, position: int) -> None:
+        """
+        Remember the lowest sorted position changed by an add or delete.
+
+        Args:
+            position (int): The sorted position of the added or deleted record.
+
+        Returns:
+            None
+        """
+        if (
+            self.first_changed_position is None
+            or position < self.first_changed_position
+        ):
+            self.first_changed_position = position
+
+
+def open_directory(
+    filename: str, show_progress: bool = True, use_search_index: bool = True
+) -> DirectoryStorage:
+    """
+    Create the storage of a directory file by its extension.
+
+    Files ending in one of SQLITE_EXTENSIONS are SQLite databases, folders
+    ending in SHARDED_EXTENSION hold a CSV file per last name initial, and any
+    other file is a CSV file.
+
+    Args:
+        filename (str): The name of the directory file.
+        show_progress (bool): Show a progress bar while a CSV file is rewritten.
+        use_search_index (bool): Answer substring searches in a CSV directory
+            from a trigram index.
+
+    Returns:
+        DirectoryStorage: The not yet deserialized directory.
+    """
+    # Imported here, as every storage module imports this one.
+    if filename.endswith(SQLITE_EXTENSIONS):
+        from sqlite_directory_manager import SqliteDirectoryManager
+
+        return SqliteDirectoryManager(filename)
+
+    if filename.rstrip(os.sep).endswith(SHARDED_EXTENSION):
+        from sharded_directory_manager import ShardedDirectoryManager
+
+        return ShardedDirectoryManager(
+            filename.rstrip(os.sep), show_progress, use_search_index
+        )
+
+    from directory_manager import DirectoryManager
+
+    return DirectoryManager(filename, show_progress, use_search_index)
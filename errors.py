@@ -20,3 +20,27 @@ class RecordValidationError(Exception):
     """
 
     pass
+
+
+class QuerySyntaxError(Exception):
+    """
+    Exception raised when a search query cannot be parsed.
+    """
+
+    pass
+
+
+class DaemonError(Exception):
+    """
+    Exception raised when the directory daemon cannot serve a request.
+    """
+
+    pass
+
+
+class DirectoryLockedError(Exception):
+    """
+    Exception raised when another process keeps the directory locked too long to save.
+    """
+
+    pass
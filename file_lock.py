@@ -0,0 +1,75 @@
+import errno
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock, so processes are not kept apart there.
+    fcntl = None
+
+
+class FileLock:
+    """
+    An advisory lock shared by every process using the same directory file.
+
+    The lock is taken on a separate lock file, as the directory file itself is
+    replaced whenever it is rewritten. Readers of the directory files share the
+    lock, and a writer holds it alone.
+
+    A reader that can neither create nor open the lock file, as the directory
+    is in a read-only location, reads without the lock, since no process can
+    write there either.
+
+    Attributes:
+        filename (str | None): The name of the lock file, or None if the files
+            are only used while their owner holds another lock.
+    """
+
+    READ_ONLY_ERRORS = (errno.EACCES, errno.EPERM, errno.EROFS)
+
+    def __init__(self, filename: str | None) -> None:
+        """
+        Initialize the FileLock instance.
+
+        Args:
+            filename (str | None): The name of the lock file, created on first use,
+                or None to never lock.
+
+        Returns:
+            None
+        """
+        self.filename: str | None = filename
+
+    @contextmanager
+    def acquire(self, shared: bool = False) -> Iterator[None]:
+        """
+        Hold the lock for the duration of a with block, waiting for it if needed.
+
+        Args:
+            shared (bool): Share the lock with other readers instead of holding it alone.
+
+        Returns:
+            Iterator[None]: The context manager holding the lock.
+        """
+        if fcntl is None or self.filename is None:
+            yield
+            return
+
+        try:
+            file = open(self.filename, "a")
+        except OSError as e:
+            if not shared or e.errno not in self.READ_ONLY_ERRORS:
+                raise
+            try:
+                file = open(self.filename, "r")
+            except OSError:
+                yield
+                return
+
+        with file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,96 @@
+from collections import deque
+from dataclasses import dataclass
+from record import Record
+
+
+@dataclass(slots=True)
+class Change:
+    """
+    Represents the change of the record stored under a personal phone number.
+
+    Attributes:
+        personal_phone (str): The personal phone number the record is stored under.
+        before (Record | None): The record before the change, None if it was added.
+        after (Record | None): The record after the change, None if it was deleted.
+    """
+
+    personal_phone: str
+    before: Record | None
+    after: Record | None
+
+
+class History:
+    """
+    The undo and redo stacks of a directory.
+
+    A step is the list of records one operation changed, with their states before
+    and after it. The states are the Record objects the directory holds, never
+    copies of them, so the history costs memory in proportion to the changed
+    records however many steps it keeps. Undoing a step restores its before
+    states and redoing it its after states.
+
+    Attributes:
+        undo_steps (deque[list[Change]]): The steps that can be undone, the latest last.
+        redo_steps (list[list[Change]]): The undone steps that can be redone,
+            the latest undone last.
+    """
+
+    def __init__(self, max_steps: int) -> None:
+        """
+        Initialize the History instance.
+
+        Args:
+            max_steps (int): The number of steps kept for undo, the oldest
+                are forgotten first.
+
+        Returns:
+            None
+        """
+        self.undo_steps: deque[list[Change]] = deque(maxlen=max_steps)
+        self.redo_steps: list[list[Change]] = []
+
+    def record(self, changes: list[Change]) -> None:
+        """
+        Add the changes of an operation as a new step.
+
+        A new step cannot follow the undone ones, so they can no longer be redone.
+
+        Args:
+            changes (list[Change]): The changed records, one change per personal
+                phone number.
+
+        Returns:
+            None
+        """
+        if not changes:
+            return
+        self.undo_steps.append(changes)
+        self.redo_steps.clear()
+
+    def undo(self) -> dict[str, Record | None] | None:
+        """
+        Move the latest step to the redo stack.
+
+        Returns:
+            dict[str, Record | None] | None: The records of the step before it,
+            by personal phone number, or None if there is nothing to undo.
+        """
+        if not self.undo_steps:
+            return None
+        changes = self.undo_steps.pop()
+        self.redo_steps.append(changes)
+        return {change.personal_phone: change.before for change in changes}
+
+    def redo(self) -> dict[str, Record | None] | None:
+        """
+        Move the latest undone step back to the undo stack.
+
+        Returns:
+            dict[str, Record | None] | None: The records of the step after it,
+            by personal phone number, or None if there is nothing to redo.
+        """
+        if not self.redo_steps:
+            return None
+        changes = self.redo_steps.pop()
+        self.undo_steps.append(changes)
+        return {change.personal_phone: change.after for change in changes}
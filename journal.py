@@ -0,0 +1,107 @@
+import io
+import os
+import csv
+from typing import Iterator
+
+
+class Journal:
+    """
+    An append-only log of directory operations stored next to the directory file.
+
+    Every line is a CSV row starting with the operation name: an 'add' row is
+    followed by all field values of the added record and a 'delete' row by the
+    personal phone number of the deleted record. Edits are journaled as a
+    delete followed by an add, the same way they are applied to the directory.
+    """
+
+    ADD = "add"
+    DELETE = "delete"
+
+    def __init__(self, filename: str) -> None:
+        """
+        Initialize the Journal instance.
+
+        Args:
+            filename (str): The name of the journal file.
+
+        Returns:
+            None
+        """
+        self.filename: str = filename
+        self.length: int = 0
+
+    def read(self) -> Iterator[list[str]]:
+        """
+        Read the operations stored in the journal file.
+
+        Returns:
+            Iterator[list[str]]: An iterator over the journaled operations.
+        """
+        self.length = 0
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, "r", newline="", encoding="utf-8") as file:
+            for operation in csv.reader(file):
+                self.length += 1
+                yield operation
+
+    def read_from(self, offset: int) -> tuple[list[list[str]], int]:
+        """
+        Read the operations appended to the journal file after a byte offset.
+
+        Args:
+            offset (int): The size the journal file had when it was last read.
+
+        Returns:
+            tuple[list[list[str]], int]: The appended operations and the size of
+            the journal file after them.
+        """
+        if not os.path.exists(self.filename):
+            return [], 0
+        with open(self.filename, "rb") as file:
+            file.seek(offset)
+            appended = file.read()
+
+        operations = list(csv.reader(io.StringIO(appended.decode("utf-8"), newline="")))
+        self.length += len(operations)
+        return operations, offset + len(appended)
+
+    def get_size(self) -> int:
+        """
+        Get the size of the journal file.
+
+        Returns:
+            int: The size in bytes, 0 if there is no journal file.
+        """
+        try:
+            return os.path.getsize(self.filename)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, operations: list[list[str]]) -> None:
+        """
+        Append operations to the journal file and flush them to disk.
+
+        Args:
+            operations (list[list[str]]): The operations to append.
+
+        Returns:
+            None
+        """
+        with open(self.filename, "a", newline="", encoding="utf-8") as file:
+            csv.writer(file).writerows(operations)
+            file.flush()
+            os.fsync(file.fileno())
+        self.length += len(operations)
+
+    def clear(self) -> None:
+        """
+        Remove the journal file once its operations are folded into the directory file.
+
+        Returns:
+            None
+        """
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+        self.length = 0
@@ -1,25 +1,106 @@
-from actions import *
-
-
-# Creating a dictionary of user actions
-directory_actions: dict[str, Action] = {
-    "n": NextPageAction("Next page"),
-    "p": PreviousPageAction("Previous page"),
-    "a": AddRecordAction("Add record"),
-    "d": DeleteRecordAction("Delete record"),
-    "e": EditRecordAction("Edit record"),
-    "f": SearchRecordsAction("Search for record"),
-    "s": SaveChangesAction("Save changes"),
-    "x": QuitAction("Quit"),
-    "q": QuitWithoutSavingAction("Quit without saving"),
-}
+import actions
+from typing import Iterator
+from collections.abc import Mapping
+from actions import Action
+
+
+class ActionRegistry(Mapping):
+    """
+    A mapping of action keys to actions.
+
+    An action is created, and its module imported, only when its key is first
+    looked up, so starting the program does not import every action.
+
+    Attributes:
+        bindings (dict[str, tuple[str, str]]): The action class name and the
+            action name bound to every action key.
+        actions (dict[str, Action]): The actions created so far by action key.
+    """
+
+    def __init__(self, bindings: dict[str, tuple[str, str]]) -> None:
+        """
+        Initialize the ActionRegistry instance.
+
+        Args:
+            bindings (dict[str, tuple[str, str]]): The action class name and the
+                action name bound to every action key.
+
+        Returns:
+            None
+        """
+        self.bindings: dict[str, tuple[str, str]] = bindings
+        self.actions: dict[str, Action] = {}
+
+    def __getitem__(self, action_key: str) -> Action:
+        """
+        Get the action bound to a key, creating it on first use.
+
+        Args:
+            action_key (str): The action key.
+
+        Returns:
+            Action: The action bound to the key.
+        """
+        if action_key not in self.actions:
+            class_name, name = self.bindings[action_key]
+            self.actions[action_key] = getattr(actions, class_name)(name)
+        return self.actions[action_key]
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterate over the action keys.
+
+        Returns:
+            Iterator[str]: An iterator over the action keys.
+        """
+        return iter(self.bindings)
+
+    def __len__(self) -> int:
+        """
+        Get the number of action keys.
+
+        Returns:
+            int: The number of action keys.
+        """
+        return len(self.bindings)
+
+    def get_name(self, action_key: str) -> str:
+        """
+        Get the name of the action bound to a key without creating the action.
+
+        Args:
+            action_key (str): The action key.
+
+        Returns:
+            str: The name of the action.
+        """
+        return self.bindings[action_key][1]
+
+
+# Creating a registry of user actions
+directory_actions = ActionRegistry(
+    {
+        "n": ("NextPageAction", "Next page"),
+        "p": ("PreviousPageAction", "Previous page"),
+        "a": ("AddRecordAction", "Add record"),
+        "d": ("DeleteRecordAction", "Delete record"),
+        "e": ("EditRecordAction", "Edit record"),
+        "f": ("SearchRecordsAction", "Search for record"),
+        "i": ("ImportRecordsAction", "Import records"),
+        "z": ("UndoAction", "Undo"),
+        "y": ("RedoAction", "Redo"),
+        "s": ("SaveChangesAction", "Save changes"),
+        "x": ("QuitAction", "Quit"),
+        "q": ("QuitWithoutSavingAction", "Quit without saving"),
+    }
+)
 
 # Creating a legend to display available actions
 directory_actions_legend = (
     "".join(
         [
-            f"{action.name} '{action_key}', "
-            for action_key, action in directory_actions.items()
+            f"{directory_actions.get_name(action_key)} '{action_key}', "
+            for action_key in directory_actions
         ]
     )
 )[:-2]
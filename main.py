@@ -1,12 +1,228 @@
+import sys
+import atexit
+import argparse
 from table import Table
-from rich.console import Console
-from config import RECORDS_PER_PAGE
+from rich.live import Live
+from rich.text import Text
+from rich.control import Control
+from rich.console import Console, Group
+from config import (
+    RECORDS_PER_PAGE,
+    PARALLEL_LOAD,
+    AUTOSAVE_CHANGES,
+    AUTOSAVE_INTERVAL,
+)
+from profiler import Profiler
+from autosave import Autosaver
+from render_cache import PageRenderCache
 from utils import calculate_index_range
 from directory_manager import DirectoryManager
+from remote_directory import RemoteDirectory
+from directory_storage import DirectoryStorage, open_directory
 from actions import NextPageAction, PreviousPageAction
 from errors import NotUniquePersonalNumber, RecordValidationError
 from key_binding import directory_actions, directory_actions_legend
 
+PROFILE_REPORT_KEY = "r"
+
+
+def build_page_table(directory_manager: DirectoryStorage, page_number: int) -> Table:
+    """
+    Build the table showing a page of the directory.
+
+    Args:
+        directory_manager (DirectoryStorage): The directory manager instance.
+        page_number (int): The page number.
+
+    Returns:
+        Table: The table with the records of the page.
+    """
+    start_index, end_index = calculate_index_range(page_number, RECORDS_PER_PAGE)
+
+    table = Table(title="PHONE DIRECTORY")
+    table.add_columns(directory_manager.get_directory_field_names())
+    table.add_rows(directory_manager.get_records_page(start_index, end_index))
+    return table
+
+
+def read_action_key(
+    console: Console,
+    live: Live | None,
+    page: Group,
+    legend: str = directory_actions_legend,
+) -> str:
+    """
+    Show a page of the directory and read the key of the next action.
+
+    On a terminal the page is redrawn in place inside a live region, with the
+    prompt as its last line, instead of clearing the screen and printing it again.
+
+    Args:
+        console (Console): The console object for input and output.
+        live (Live | None): The live region, or None if the console is not a terminal.
+        page (Group): The page table and its footer.
+        legend (str): The legend of the available action keys.
+
+    Returns:
+        str: The entered action key.
+    """
+    prompt = legend + ": "
+
+    if live is None:
+        console.clear()
+        console.print(page)
+        return console.input(prompt).lower()
+
+    live.update(Group(page, Text(prompt, end="")), refresh=True)
+    console.show_cursor(True)
+    action_key = console.input().lower()
+    # Move back to the prompt line, where the live region expects the cursor.
+    console.control(Control.move(0, -1))
+    return action_key
+
+
+def parse_arguments() -> argparse.Namespace:
+    """
+    Parse the command line arguments of the phone directory program.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Phone directory in terminal.")
+    parser.add_argument(
+        "--file",
+        default="data.csv",
+        help="The directory file, a SQLite database if it ends in .db, .sqlite "
+        "or .sqlite3 and a CSV file otherwise (default: data.csv).",
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="SOCKET",
+        help="Use the directory served by directory_daemon.py on the Unix socket "
+        "SOCKET instead of loading --file.",
+    )
+    parser.add_argument(
+        "--autosave",
+        action="store_true",
+        help="Save the changes of a CSV directory in the background.",
+    )
+    parser.add_argument(
+        "--autosave-changes",
+        type=int,
+        default=AUTOSAVE_CHANGES,
+        metavar="N",
+        help=f"Autosave once N operations are unsaved (default: {AUTOSAVE_CHANGES}).",
+    )
+    parser.add_argument(
+        "--autosave-interval",
+        type=float,
+        default=AUTOSAVE_INTERVAL,
+        metavar="SECONDS",
+        help="Autosave once a change is unsaved for SECONDS "
+        f"(default: {AUTOSAVE_INTERVAL:g}).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time the actions and directory operations and print a report on exit "
+        f"or when '{PROFILE_REPORT_KEY}' is pressed.",
+    )
+    parser.add_argument(
+        "--profile-action",
+        metavar="KEY",
+        choices=list(directory_actions),
+        help="Run the action bound to KEY under cProfile and print its profile on exit.",
+    )
+    return parser.parse_args()
+
+
+def start_profiler(
+    arguments: argparse.Namespace, directory_manager: DirectoryStorage
+) -> Profiler | None:
+    """
+    Instrument the hot paths of the program if profiling was requested.
+
+    Directory operations cover parsing and validation on load, the sort order
+    and the searches are timed where they are computed lazily, and rendering is
+    timed where rich draws to the terminal. Actions are instrumented when they
+    are first run. Nothing is instrumented without --profile or --profile-action,
+    so the program then runs unchanged.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+        directory_manager (DirectoryStorage): The directory manager instance.
+
+    Returns:
+        Profiler | None: The profiler, or None if profiling was not requested.
+    """
+    if not arguments.profile and arguments.profile_action is None:
+        return None
+
+    # Imported here, as they are only needed to find the methods to instrument.
+    from snapshot import DirectorySnapshot
+    from validator import RecordValidator
+    from search_result import SearchResult
+    from sorted_records import SortedRecords
+
+    profiler = Profiler()
+    if arguments.profile:
+        profiler.instrument(DirectoryStorage)
+        profiler.instrument(type(directory_manager))
+        profiler.instrument(DirectorySnapshot, ["load", "write"])
+        profiler.instrument(RecordValidator, ["validate_many"])
+        profiler.instrument(SortedRecords, ["update"])
+        profiler.instrument(SearchResult, ["fetch"])
+        profiler.instrument(Live, ["refresh"])
+        profiler.instrument(Console, ["print"])
+    if arguments.profile_action is not None:
+        profiler.trace(type(directory_actions[arguments.profile_action]), "run")
+
+    atexit.register(print_profile, profiler)
+    return profiler
+
+
+def start_autosaver(
+    arguments: argparse.Namespace, directory_manager: DirectoryStorage
+) -> Autosaver | None:
+    """
+    Start saving the directory in the background if autosave was requested.
+
+    Only CSV directories are autosaved, since saving a SQLite directory commits
+    its changes without rewriting it.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments.
+        directory_manager (DirectoryStorage): The directory manager instance.
+
+    Returns:
+        Autosaver | None: The started autosaver, or None if autosave is off.
+    """
+    if not arguments.autosave or not isinstance(directory_manager, DirectoryManager):
+        return None
+
+    autosaver = Autosaver(
+        directory_manager, arguments.autosave_changes, arguments.autosave_interval
+    )
+    autosaver.start()
+    return autosaver
+
+
+def print_profile(profiler: Profiler) -> None:
+    """
+    Print the profiling report to the standard error stream.
+
+    Args:
+        profiler (Profiler): The profiler.
+
+    Returns:
+        None
+    """
+    if profiler.timings:
+        print(profiler.format_report(), file=sys.stderr)
+    call_profile = profiler.format_call_profile()
+    if call_profile:
+        print(call_profile, file=sys.stderr)
+
 
 def main() -> None:
     """
@@ -15,49 +231,97 @@ def main() -> None:
     Returns:
         None
     """
+    arguments = parse_arguments()
+    if arguments.connect is not None:
+        directory_manager = RemoteDirectory(arguments.connect)
+    else:
+        directory_manager = open_directory(arguments.file)
+    profiler = start_profiler(arguments, directory_manager)
+    legend = directory_actions_legend
+    if arguments.profile:
+        legend += f", Profile report '{PROFILE_REPORT_KEY}'"
+
     console = Console()
-    directory_manager = DirectoryManager("data.csv")
 
     try:
-        directory_manager.deserialize_directory()
+        directory_manager.deserialize_directory(parallel=PARALLEL_LOAD)
     except (NotUniquePersonalNumber, RecordValidationError) as e:
         error_message = e.args[0]
         console.print(f"[red]Deserialization ERROR:[/red]\n{error_message}\nExiting...")
         return
 
-    records = directory_manager.get_records()
-
+    autosaver = start_autosaver(arguments, directory_manager)
+    render_cache = PageRenderCache(RECORDS_PER_PAGE)
+    live = None
     current_page_number = 1
-    total_pages = (len(records) + RECORDS_PER_PAGE - 1) // RECORDS_PER_PAGE
 
-    while True:
-        console.clear()
+    try:
+        while True:
+            try:
+                directory_manager.reload_directory()
+                reload_error = None
+            except Exception as e:
+                # A malformed save of another process, or a lock held too long,
+                # is shown in the footer and the reload retried on the next page.
+                reload_error = e
+            first_changed_position = directory_manager.pop_first_changed_position()
+            if first_changed_position is not None:
+                render_cache.invalidate_from_position(first_changed_position)
+
+            total_pages = (
+                directory_manager.get_records_count() + RECORDS_PER_PAGE - 1
+            ) // RECORDS_PER_PAGE
+            current_page_number = max(min(current_page_number, total_pages), 1)
+
+            table = render_cache.get(current_page_number)
+            if table is None:
+                table = build_page_table(directory_manager, current_page_number)
+                render_cache.put(current_page_number, table)
+
+            if live is None and console.is_terminal:
+                console.clear()
+                live = Live(console=console, auto_refresh=False)
+                live.start()
+
+            footer = Text(f"Page {current_page_number} of {total_pages}")
+            if autosaver is not None and autosaver.error is not None:
+                footer.append(f"  Autosave failed: {autosaver.error}", style="red")
+            if reload_error is not None:
+                footer.append(f"  Reload failed: {reload_error}", style="red")
+            page = Group(table, footer)
+            action_key = read_action_key(console, live, page, legend)
+
+            if arguments.profile and action_key == PROFILE_REPORT_KEY:
+                if live is not None:
+                    live.stop()
+                    live = None
+                console.clear()
+                console.print(profiler.format_report(), markup=False, highlight=False)
+                console.input("Press ENTER to get back to the directory...")
+
+            elif action_key in directory_actions:
+                requested_action = directory_actions[action_key]
+                if arguments.profile:
+                    profiler.instrument(type(requested_action), ["run"])
+                if isinstance(requested_action, NextPageAction) or isinstance(
+                    requested_action, PreviousPageAction
+                ):
+                    current_page_number = requested_action.run(
+                        current_page_number, total_pages
+                    )
+                else:
+                    if live is not None:
+                        live.stop()
+                        live = None
+                    requested_action.run(console, directory_manager)
+                    if autosaver is not None:
+                        autosaver.notify_change()
 
-        start_index, end_index = calculate_index_range(
-            current_page_number, RECORDS_PER_PAGE
-        )
-        current_page_records = records[start_index:end_index]
-
-        table = Table(title="PHONE DIRECTORY")
-        table.add_columns(directory_manager.get_directory_field_names())
-        table.add_rows(current_page_records)
-
-        console.print(table)
-        console.print(f"Page {current_page_number} of {total_pages}")
-
-        action_key = console.input(directory_actions_legend + ": ").lower()
-
-        if action_key in directory_actions:
-            requested_action = directory_actions[action_key]
-            if isinstance(requested_action, NextPageAction) or isinstance(
-                requested_action, PreviousPageAction
-            ):
-                current_page_number = requested_action.run(
-                    current_page_number, total_pages
-                )
-            else:
-                updated_records = requested_action.run(console, directory_manager)
-                records = updated_records if updated_records is not None else records
+    finally:
+        # Quitting exits from inside an action, so a save in progress is
+        # finished here before the interpreter shuts down.
+        if autosaver is not None:
+            autosaver.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+import io
+import time
+import types
+import math
+import functools
+from typing import Callable
+
+
+class Profiler:
+    """
+    Collects call counts and times of instrumented methods.
+
+    Instrumenting a class replaces its methods with timing wrappers, so nothing
+    is measured, and nothing is slowed down, until a class is instrumented.
+    A single method can additionally be traced with cProfile.
+
+    Attributes:
+        timings (dict[str, list[float]]): The call times of every instrumented method, in seconds.
+        call_profile (cProfile.Profile | None): The cProfile data of the traced
+            method, or None if no method is traced.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize the Profiler instance.
+
+        Returns:
+            None
+        """
+        self.timings: dict[str, list[float]] = {}
+        self.call_profile = None
+        self.__wrapped: set[tuple[type, str, str]] = set()
+
+    def instrument(self, cls: type, method_names: list[str] | None = None) -> None:
+        """
+        Time every call of methods of a class.
+
+        Instrumenting a method again does nothing.
+
+        Args:
+            cls (type): The class to instrument.
+            method_names (list[str] | None): The methods to time, defaults to the
+                public methods defined by the class itself.
+
+        Returns:
+            None
+        """
+        if method_names is None:
+            method_names = [
+                name
+                for name, value in vars(cls).items()
+                if not name.startswith("_") and isinstance(value, types.FunctionType)
+            ]
+
+        for method_name in method_names:
+            self.__replace(cls, method_name, "timed", self.__time)
+
+    def trace(self, cls: type, method_name: str) -> None:
+        """
+        Run every call of a method under cProfile.
+
+        Args:
+            cls (type): The class of the method.
+            method_name (str): The method to trace.
+
+        Returns:
+            None
+        """
+        # Imported here, as only tracing needs cProfile.
+        import cProfile
+
+        if self.call_profile is None:
+            self.call_profile = cProfile.Profile()
+        self.__replace(cls, method_name, "traced", self.__trace)
+
+    def get_stats(self) -> list[tuple[str, int, float, float, float]]:
+        """
+        Summarize the call times of the instrumented methods.
+
+        Returns:
+            list[tuple[str, int, float, float, float]]: The name, call count, total,
+            median and 99th percentile time of every called method, in seconds,
+            with the largest total first.
+        """
+        stats = []
+        for name, timings in self.timings.items():
+            if not timings:
+                continue
+            ordered = sorted(timings)
+            stats.append(
+                (
+                    name,
+                    len(ordered),
+                    sum(ordered),
+                    self.__get_percentile(ordered, 0.50),
+                    self.__get_percentile(ordered, 0.99),
+                )
+            )
+        return sorted(stats, key=lambda stat: stat[2], reverse=True)
+
+    def format_report(self) -> str:
+        """
+        Format the call times of the instrumented methods as a text table.
+
+        Returns:
+            str: The report, one method per line.
+        """
+        lines = [
+            f"{'method':<40} {'calls':>6} {'total ms':>10} {'p50 ms':>9} {'p99 ms':>9}"
+        ]
+        for name, count, total, p50, p99 in self.get_stats():
+            lines.append(
+                f"{name:<40} {count:>6} {total * 1e3:>10.2f} {p50 * 1e3:>9.3f} {p99 * 1e3:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    def format_call_profile(self, limit: int = 25) -> str:
+        """
+        Format the cProfile data of the traced method.
+
+        Args:
+            limit (int): The number of functions to list.
+
+        Returns:
+            str: The functions with the largest cumulative time, or an empty
+            string if the traced method was never called.
+        """
+        import pstats
+
+        if self.call_profile is None:
+            return ""
+
+        stream = io.StringIO()
+        try:
+            stats = pstats.Stats(self.call_profile, stream=stream)
+        except TypeError:
+            return ""
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def __replace(
+        self,
+        cls: type,
+        method_name: str,
+        kind: str,
+        make_wrapper: Callable[[str, Callable], Callable],
+    ) -> None:
+        """
+        Replace a method of a class with a wrapper, once per kind of wrapper.
+
+        Args:
+            cls (type): The class of the method.
+            method_name (str): The name of the method.
+            kind (str): The kind of the wrapper.
+            make_wrapper (Callable[[str, Callable], Callable]): Builds the wrapper
+                from the qualified method name and the method.
+
+        Returns:
+            None
+        """
+        if (cls, method_name, kind) in self.__wrapped:
+            return
+        self.__wrapped.add((cls, method_name, kind))
+
+        method = getattr(cls, method_name)
+        setattr(cls, method_name, make_wrapper(f"{cls.__name__}.{method_name}", method))
+
+    def __time(self, name: str, method: Callable) -> Callable:
+        """
+        Build a wrapper recording the time of every call of a method.
+
+        Args:
+            name (str): The name the times are recorded under.
+            method (Callable): The method to wrap.
+
+        Returns:
+            Callable: The wrapped method.
+        """
+        timings = self.timings.setdefault(name, [])
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timings.append(time.perf_counter() - start)
+
+        return timed
+
+    def __trace(self, name: str, method: Callable) -> Callable:
+        """
+        Build a wrapper running every call of a method under cProfile.
+
+        Args:
+            name (str): The name of the method.
+            method (Callable): The method to wrap.
+
+        Returns:
+            Callable: The wrapped method.
+        """
+        call_profile = self.call_profile
+
+        @functools.wraps(method)
+        def traced(*args, **kwargs):
+            call_profile.enable()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                call_profile.disable()
+
+        return traced
+
+    @staticmethod
+    def __get_percentile(ordered: list[float], fraction: float) -> float:
+        """
+        Get a percentile of sorted values by the nearest-rank method.
+
+        Args:
+            ordered (list[float]): The values in ascending order.
+            fraction (float): The percentile as a fraction between 0 and 1.
+
+        Returns:
+            float: The smallest value not below the given fraction of the values.
+        """
+        rank = max(math.ceil(fraction * len(ordered)), 1)
+        return ordered[rank - 1]
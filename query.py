@@ -0,0 +1,354 @@
+import re
+from dataclasses import dataclass
+from errors import QuerySyntaxError
+
+# Pseudo field matching a run of digits in the personal or work phone number
+PHONE_DIGITS_FIELD = "phone"
+
+# Query field names and the Record attributes they refer to
+FIELD_ALIASES: dict[str, str] = {
+    "phone": PHONE_DIGITS_FIELD,
+    "last": "last_name",
+    "first": "first_name",
+    "middle": "middle_name",
+    "org": "organization",
+    "work": "work_phone",
+    "personal": "personal_phone",
+    "last_name": "last_name",
+    "first_name": "first_name",
+    "middle_name": "middle_name",
+    "organization": "organization",
+    "work_phone": "work_phone",
+    "personal_phone": "personal_phone",
+}
+
+KEYWORDS = {"AND", "OR", "NOT"}
+
+# Fields that support fuzzy terms, a fuzzy term without a field matches any of them
+FUZZY_FIELDS = ("last_name", "first_name")
+DEFAULT_FUZZY_DISTANCE = 2
+
+FUZZY_SUFFIX_PATTERN = re.compile(r"~(\d*)$")
+
+TOKEN_PATTERN = re.compile(
+    r'\s*(?:(?P<paren>[()])|(?P<negation>-)?(?:(?P<field>[A-Za-z_]+):)?(?P<value>"[^"]*"(?:\*|~\d*)?|[^\s()"]+))'
+)
+
+
+@dataclass
+class Term:
+    """
+    A query term matching a single value.
+
+    Attributes:
+        field (str | None): The Record attribute to match, PHONE_DIGITS_FIELD to
+            match digits of the phone numbers, or None to match a substring of all
+            fields joined together.
+        value (str): The value to match.
+        prefix (bool): True if the field value only has to start with the value.
+        fuzzy (int | None): The maximum edit distance between the value and a
+            matching name, or None for an exact match.
+    """
+
+    field: str | None
+    value: str
+    prefix: bool = False
+    fuzzy: int | None = None
+
+
+@dataclass
+class Not:
+    """
+    A query node matching records that do not match its operand.
+
+    Attributes:
+        operand: The negated query node.
+    """
+
+    operand: "Term | Not | And | Or"
+
+
+@dataclass
+class And:
+    """
+    A query node matching records that match all of its operands.
+
+    Attributes:
+        operands (list): The query nodes to intersect.
+    """
+
+    operands: list["Term | Not | And | Or"]
+
+
+@dataclass
+class Or:
+    """
+    A query node matching records that match any of its operands.
+
+    Attributes:
+        operands (list): The query nodes to unite.
+    """
+
+    operands: list["Term | Not | And | Or"]
+
+
+def tokenize(query: str) -> list[tuple[str, ...]]:
+    """
+    Split a query into tokens.
+
+    Args:
+        query (str): The query string.
+
+    Returns:
+        list[tuple[str, ...]]: The tokens, either ("paren", parenthesis),
+        ("keyword", keyword) or ("term", negation, field, value).
+
+    Raises:
+        QuerySyntaxError: If the query contains an unbalanced quote.
+    """
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match is None:
+            raise QuerySyntaxError("Unbalanced quote in the search query.")
+        position = match.end()
+
+        if match["paren"]:
+            tokens.append(("paren", match["paren"]))
+        elif (
+            not match["negation"] and not match["field"] and match["value"] in KEYWORDS
+        ):
+            tokens.append(("keyword", match["value"]))
+        else:
+            tokens.append(
+                ("term", match["negation"] or "", match["field"] or "", match["value"])
+            )
+    return tokens
+
+
+def is_structured_query(query: str) -> bool:
+    """
+    Check if a search string uses the query syntax rather than being a plain substring.
+
+    A search string is a query if it contains a term scoped to a known field,
+    a negated or fuzzy term or one of the AND, OR and NOT keywords.
+
+    Args:
+        query (str): The search string.
+
+    Returns:
+        bool: True if the search string should be parsed as a query, False otherwise.
+    """
+    try:
+        tokens = tokenize(query)
+    except QuerySyntaxError:
+        return False
+
+    for token in tokens:
+        if token[0] == "keyword":
+            return True
+        if token[0] == "term" and (token[1] or token[2] in FIELD_ALIASES):
+            return True
+        if token[0] == "term" and FUZZY_SUFFIX_PATTERN.search(token[3]):
+            return True
+    return False
+
+
+def parse_query(query: str) -> "Term | Not | And | Or":
+    """
+    Parse a search query.
+
+    Terms are combined with AND by default, OR binds weaker than AND, and
+    parentheses group terms. A term is either a bare value matched as a substring
+    of the whole record or a 'field:value' pair matched against one field, where
+    a trailing '*' makes the value a prefix. A trailing '~' or '~k' makes a last or
+    first name term fuzzy, matching names within edit distance k (2 by default);
+    a fuzzy term without a field matches both names. The 'phone' field matches a run of
+    digits anywhere in the personal or work phone number, ignoring punctuation. Values with spaces can be quoted,
+    and a term is negated with a leading '-' or the NOT keyword.
+
+    Args:
+        query (str): The query string, e.g. 'last:Smi* org:"Global Tech" -work:-'.
+
+    Returns:
+        Term | Not | And | Or: The root node of the parsed query.
+
+    Raises:
+        QuerySyntaxError: If the query cannot be parsed.
+    """
+    parser = _QueryParser(tokenize(query))
+    node = parser.parse_or()
+    if parser.position != len(parser.tokens):
+        raise QuerySyntaxError("Unexpected ')' in the search query.")
+    return node
+
+
+class _QueryParser:
+    """
+    A recursive descent parser over the tokens of a query.
+
+    Attributes:
+        tokens (list[tuple[str, ...]]): The tokens of the query, see tokenize.
+        position (int): The index of the next token to parse.
+    """
+
+    def __init__(self, tokens: list[tuple[str, ...]]) -> None:
+        """
+        Initialize the _QueryParser instance.
+
+        Args:
+            tokens (list[tuple[str, ...]]): The tokens of the query.
+
+        Returns:
+            None
+        """
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> tuple[str, ...] | None:
+        """
+        Get the next token without consuming it.
+
+        Returns:
+            tuple[str, ...] | None: The next token, or None at the end of the query.
+        """
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def parse_or(self) -> "Term | Not | And | Or":
+        """
+        Parse operands separated by the OR keyword.
+
+        Returns:
+            Term | Not | And | Or: The single operand, or an Or node of all of them.
+        """
+        operands = [self.parse_and()]
+        while self.peek() == ("keyword", "OR"):
+            self.position += 1
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def parse_and(self) -> "Term | Not | And | Or":
+        """
+        Parse operands joined by the AND keyword or by juxtaposition, up to an
+        OR keyword or a closing parenthesis.
+
+        Returns:
+            Term | Not | And | Or: The single operand, or an And node of all of them.
+        """
+        operands = [self.parse_unary()]
+        while (token := self.peek()) is not None and token not in (
+            ("keyword", "OR"),
+            ("paren", ")"),
+        ):
+            if token == ("keyword", "AND"):
+                self.position += 1
+            operands.append(self.parse_unary())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def parse_unary(self) -> "Term | Not | And | Or":
+        """
+        Parse a term, a term negated with NOT or '-', or a parenthesized query.
+
+        Returns:
+            Term | Not | And | Or: The parsed node.
+
+        Raises:
+            QuerySyntaxError: If the query ends early, a keyword is misplaced or
+                a parenthesis is unbalanced.
+        """
+        token = self.peek()
+        if token is None or token[0] == "keyword" and token[1] != "NOT":
+            raise QuerySyntaxError("Incomplete search query.")
+        self.position += 1
+
+        if token == ("keyword", "NOT"):
+            return Not(self.parse_unary())
+
+        if token == ("paren", "("):
+            node = self.parse_or()
+            if self.peek() != ("paren", ")"):
+                raise QuerySyntaxError("Missing ')' in the search query.")
+            self.position += 1
+            return node
+
+        if token == ("paren", ")"):
+            raise QuerySyntaxError("Unexpected ')' in the search query.")
+
+        _, negation, field, value = token
+        term = self.__build_term(field, value)
+        return Not(term) if negation else term
+
+    @staticmethod
+    def __build_term(field: str, value: str) -> Term:
+        """
+        Build the term of a token's field and value.
+
+        A bare value keeps its trailing '*' and its quotes are removed; a fielded
+        value ending in '*' becomes a prefix term.
+
+        Args:
+            field (str): The field name as typed, or '' for none.
+            value (str): The value as typed, possibly quoted and with a '*' or '~' suffix.
+
+        Returns:
+            Term: The term.
+
+        Raises:
+            QuerySyntaxError: If the field name is unknown.
+        """
+        fuzzy_suffix = FUZZY_SUFFIX_PATTERN.search(value)
+        if fuzzy_suffix:
+            return _QueryParser.__build_fuzzy_term(
+                field, value[: fuzzy_suffix.start()], fuzzy_suffix[1]
+            )
+
+        prefix = value.endswith("*")
+        if prefix:
+            value = value[:-1]
+        if value.startswith('"'):
+            value = value[1:-1]
+
+        if not field:
+            if prefix:
+                value += "*"
+            return Term(None, value)
+
+        if field not in FIELD_ALIASES:
+            raise QuerySyntaxError(
+                f"Unknown field '{field}'. Use one of: {', '.join(list(FIELD_ALIASES)[:7])}."
+            )
+        return Term(FIELD_ALIASES[field], value, prefix)
+
+    @staticmethod
+    def __build_fuzzy_term(field: str, value: str, distance: str) -> Term:
+        """
+        Build a fuzzy name term.
+
+        Args:
+            field (str): The field name as typed, or '' to match both names.
+            value (str): The value without its '~' suffix, possibly quoted.
+            distance (str): The digits after the '~', or '' for DEFAULT_FUZZY_DISTANCE.
+
+        Returns:
+            Term: The fuzzy term.
+
+        Raises:
+            QuerySyntaxError: If the field is not a last or first name field.
+        """
+        if value.startswith('"'):
+            value = value[1:-1]
+
+        field_name = FIELD_ALIASES.get(field) if field else None
+        if field and field_name not in FUZZY_FIELDS:
+            raise QuerySyntaxError(
+                "Fuzzy search is only supported for last and first names."
+            )
+        return Term(
+            field_name,
+            value,
+            fuzzy=int(distance) if distance else DEFAULT_FUZZY_DISTANCE,
+        )
@@ -1,11 +1,13 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class Record:
     """
     Represents a record with contact information.
 
+    Records are slotted, so they carry no per-instance __dict__.
+
     Attributes:
         last_name (str): Last name of the individual.
         first_name (str): First name of the individual.
@@ -18,6 +20,9 @@ class Record:
         __lt__(self, other): Compare two records based on last name, first name, middle name, and organization.
         __iter__(self): Allow iteration over the values of the record.
 
+    Methods:
+        sort_key(self): Get the key the record is ordered by in the directory.
+
     """
 
     last_name: str
@@ -34,7 +39,34 @@ class Record:
         Returns:
             iterator: An iterator over the attribute values.
         """
-        return iter([value for value in self.__dict__.values()])
+        return iter(
+            (
+                self.last_name,
+                self.first_name,
+                self.middle_name,
+                self.organization,
+                self.work_phone,
+                self.personal_phone,
+            )
+        )
+
+    def sort_key(self) -> tuple[str, str, str, str, str]:
+        """
+        Get the key the record is ordered by in the directory.
+
+        The personal phone number is appended to the compared fields as a tie-breaker,
+        so that every record in the directory has a unique position.
+
+        Returns:
+            tuple[str, str, str, str, str]: The sort key of the record.
+        """
+        return (
+            self.last_name,
+            self.first_name,
+            self.middle_name,
+            self.organization,
+            self.personal_phone,
+        )
 
     def __lt__(self, other):
         """
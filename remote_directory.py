@@ -0,0 +1,364 @@
+import json
+import socket
+from itertools import islice
+from typing import Any, Iterable, Iterator
+from record import Record
+from validator import RecordValidator
+from search_result import SearchResult
+from directory_storage import DirectoryStorage, ImportSummary
+from errors import (
+    DaemonError,
+    DirectoryLockedError,
+    NotUniquePersonalNumber,
+    RecordDoesNotExist,
+    RecordValidationError,
+    QuerySyntaxError,
+)
+
+REMOTE_ERRORS: dict[str, type[Exception]] = {
+    error.__name__: error
+    for error in (
+        DaemonError,
+        DirectoryLockedError,
+        NotUniquePersonalNumber,
+        RecordDoesNotExist,
+        RecordValidationError,
+        QuerySyntaxError,
+        ValueError,
+    )
+}
+SEARCH_CHUNK_SIZE = 100
+RECORDS_CHUNK_SIZE = 10_000
+IMPORT_CHUNK_SIZE = 10_000
+
+
+class RemoteDirectory(DirectoryStorage):
+    """
+    A directory served by a directory_daemon.DirectoryDaemon over a Unix socket.
+
+    Only the field names, regexes and examples are held locally, so fields are
+    validated as they are entered without asking the daemon. Records are fetched
+    a page or a chunk of search matches at a time, and every change is sent to
+    the daemon, where it is seen by all of its clients at once.
+
+    Attributes:
+        connection (socket.socket | None): The connection to the daemon, or None
+            before deserialize_directory.
+        version (int): The version of the directory last seen by reload_directory.
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        """
+        Initialize the RemoteDirectory instance.
+
+        Args:
+            socket_path (str): The path of the Unix socket the daemon listens on.
+
+        Returns:
+            None
+        """
+        super().__init__(socket_path)
+        self.connection: socket.socket | None = None
+        self.version: int = 0
+        self.__stream = None
+
+    def deserialize_directory(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> None:
+        """
+        Connect to the daemon and get the fields of the directory it serves.
+
+        Args:
+            parallel (bool): Unused, as the daemon has already loaded the directory.
+            workers (int | None): Unused.
+
+        Returns:
+            None
+        """
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.filename)
+        self.__stream = self.connection.makefile("rwb")
+
+        fields = self.__request("get_fields")
+        self.header = fields["header"]
+        self.regexes = fields["regexes"]
+        self.example = fields["example"]
+        self.validator = RecordValidator(self.header, self.regexes)
+        self.version = fields["version"]
+
+    def __request(self, method: str, *params: Any) -> Any:
+        """
+        Send a request to the daemon and wait for its response.
+
+        Args:
+            method (str): The name of the method the daemon runs.
+            *params (Any): The parameters of the method, encodable as JSON.
+
+        Returns:
+            Any: The result of the method.
+
+        Raises:
+            DaemonError: If the daemon closed the connection or failed unexpectedly.
+        """
+        request = json.dumps({"method": method, "params": params})
+        self.__stream.write(request.encode() + b"\n")
+        self.__stream.flush()
+        line = self.__stream.readline()
+        if not line:
+            raise DaemonError("The directory daemon closed the connection.")
+
+        response = json.loads(line)
+        if "error" in response:
+            error_type, message = response["error"]
+            raise REMOTE_ERRORS.get(error_type, DaemonError)(message)
+        return response["result"]
+
+    def serialize_directory(self) -> bool:
+        """
+        Save the changes all clients made to the directory since the last save.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+        """
+        return self.__request("save")
+
+    def reload_directory(self) -> bool:
+        """
+        Get the lowest sorted position changed by any client since the last reload.
+
+        Returns:
+            bool: True if the directory changed, False otherwise.
+        """
+        self.version, position = self.__request("get_changes", self.version)
+        if position is None:
+            return False
+        self.mark_changed_position(position)
+        return True
+
+    def has_unsaved_changes(self) -> bool:
+        """
+        Check if any client changed the directory since the last save.
+
+        Returns:
+            bool: True if some records were added, edited or deleted, False otherwise.
+        """
+        return self.__request("has_unsaved_changes")
+
+    def get_records(self) -> list[Record]:
+        """
+        Get a sorted list of all records in the directory.
+
+        Returns:
+            list[Record]: A list of all records.
+        """
+        records = []
+        while True:
+            page = self.get_records_page(
+                len(records), len(records) + RECORDS_CHUNK_SIZE
+            )
+            records.extend(page)
+            if len(page) < RECORDS_CHUNK_SIZE:
+                return records
+
+    def get_records_page(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a sorted slice of the records in the directory.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+        rows = self.__request("get_records_page", start_index, end_index)
+        return [Record(*row) for row in rows]
+
+    def get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+        return self.__request("get_records_count")
+
+    def get_record(self, records_personal_number: str) -> Record:
+        """
+        Get a record by its personal phone number.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The record with that personal phone number.
+        """
+        return Record(*self.__request("get_record", records_personal_number))
+
+    def add_record(self, record: Record) -> None:
+        """
+        Add a new record to the directory.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        self.__request("add_record", list(record))
+
+    def add_numbered_rows(
+        self,
+        numbered_rows: Iterable[tuple[int, Iterable[str]]],
+        on_conflict: str,
+        row_label: str,
+        validated: bool = False,
+    ) -> ImportSummary:
+        """
+        Add rows of field values to the directory, all of them or none.
+
+        The rows are sent IMPORT_CHUNK_SIZE at a time, and the daemon validates
+        every chunk as it arrives and adds all of them once the last one is sent.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            on_conflict (str): One of CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+            validated (bool): Ignored, the daemon validates every row it is sent.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        import_id = self.__request("begin_import", on_conflict, row_label)
+        numbered_rows = iter(numbered_rows)
+        while rows := [
+            [number, list(row)]
+            for number, row in islice(numbered_rows, IMPORT_CHUNK_SIZE)
+        ]:
+            self.__request("import_rows", import_id, rows)
+        return ImportSummary(*self.__request("finish_import", import_id))
+
+    def delete_record(self, records_personal_number: str) -> Record:
+        """
+        Delete a record from the directory.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to delete,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The deleted record.
+        """
+        return Record(*self.__request("delete_record", records_personal_number))
+
+    def replace_record(self, records_personal_number: str, record: Record) -> Record:
+        """
+        Replace a record with an edited one in a single step.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace,
+                either formatted or as ten digits with any punctuation.
+            record (Record): The edited record, possibly with another personal phone number.
+
+        Returns:
+            Record: The replaced record.
+
+        Raises:
+            RecordDoesNotExist: If no record has that personal phone number.
+            NotUniquePersonalNumber: If another record has the edited personal
+                phone number. The directory is then left unchanged.
+        """
+        return Record(
+            *self.__request("replace_record", records_personal_number, list(record))
+        )
+
+    def undo(self) -> bool:
+        """
+        Revert the latest change not undone yet. The daemon keeps one history for
+        all clients, so this may be a change another client made.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+        return self.__request("undo")
+
+    def redo(self) -> bool:
+        """
+        Apply the latest undone change again, unless something was changed since.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+        return self.__request("redo")
+
+    def search_records(self, search_string: str) -> SearchResult:
+        """
+        Search for records based on a search string.
+
+        The daemon keeps the search cursor, and the matches are fetched from it
+        SEARCH_CHUNK_SIZE at a time as the pages of the result are shown.
+
+        Args:
+            search_string (str): A plain search string or a query in the syntax
+                of query.parse_query.
+
+        Returns:
+            SearchResult: The search result cursor over the matched records.
+
+        Raises:
+            QuerySyntaxError: If the search string is an invalid query.
+        """
+        search_id = self.__request("search", search_string)
+        return SearchResult(search_string, self.__iter_search(search_id))
+
+    def __iter_search(self, search_id: int) -> Iterator[Record]:
+        """
+        Iterate over the matched records of a search kept by the daemon.
+
+        Args:
+            search_id (int): The id of the search.
+
+        Returns:
+            Iterator[Record]: An iterator over the matched records in directory order.
+        """
+        start_index = 0
+        while True:
+            rows, is_last = self.__request(
+                "fetch_search", search_id, start_index, start_index + SEARCH_CHUNK_SIZE
+            )
+            for row in rows:
+                yield Record(*row)
+            if is_last:
+                return
+            start_index += len(rows)
+
+    def find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the last or first names in the directory within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+        names = self.__request("find_similar_names", name, max_distance, field_name)
+        return [(distance, name) for distance, name in names]
+
+    def is_number_already_in_directory(self, personal_phone_number: str) -> bool:
+        """
+        Check if a personal phone number already exists in the directory.
+
+        Args:
+            personal_phone_number (str): The personal phone number to check.
+
+        Returns:
+            bool: True if the number already exists, False otherwise.
+        """
+        return self.__request("is_number_already_in_directory", personal_phone_number)
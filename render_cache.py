@@ -0,0 +1,67 @@
+from table import Table
+
+
+class PageRenderCache:
+    """
+    A cache of the rendered tables of directory pages.
+
+    Pages stay cached until an add, edit or delete changes the records they show.
+    Since records after a changed position shift by one, every page from the
+    first changed one on is invalidated.
+    """
+
+    def __init__(self, records_per_page: int) -> None:
+        """
+        Initialize the PageRenderCache instance.
+
+        Args:
+            records_per_page (int): The number of records shown on a page.
+
+        Returns:
+            None
+        """
+        self.records_per_page: int = records_per_page
+        self.pages: dict[int, Table] = {}
+
+    def get(self, page_number: int) -> Table | None:
+        """
+        Get the cached table of a page.
+
+        Args:
+            page_number (int): The page number.
+
+        Returns:
+            Table | None: The cached table, or None if the page is not cached.
+        """
+        return self.pages.get(page_number)
+
+    def put(self, page_number: int, table: Table) -> None:
+        """
+        Cache the table of a page.
+
+        Args:
+            page_number (int): The page number.
+            table (Table): The rendered table of the page.
+
+        Returns:
+            None
+        """
+        self.pages[page_number] = table
+
+    def invalidate_from_position(self, position: int) -> None:
+        """
+        Drop the cached pages showing records at or after a sorted position.
+
+        Args:
+            position (int): The first changed sorted position.
+
+        Returns:
+            None
+        """
+        first_changed_page = position // self.records_per_page + 1
+        for page_number in [
+            page_number
+            for page_number in self.pages
+            if page_number >= first_changed_page
+        ]:
+            del self.pages[page_number]
@@ -0,0 +1,694 @@
+import re
+from record import Record
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+
+class TrigramIndex:
+    """
+    An inverted index mapping every trigram of a record's searchable text
+    to the records containing it.
+
+    Every record gets a numeric id, and the posting list of a trigram is a
+    sorted array of the ids of the records containing it, so an entry takes
+    four bytes instead of a reference in a set. Ids are handed out in
+    increasing order, which keeps the arrays sorted as records are added.
+    Substring queries of three or more characters are answered by
+    intersecting the posting lists of the query's trigrams, shortest first,
+    which yields a small candidate set that only has to be checked for
+    actual containment.
+    """
+
+    N = 3
+    SEARCH_RATIO = 32
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty TrigramIndex.
+
+        Returns:
+            None
+        """
+        self.postings: dict[str, array] = {}
+        self.ids: dict[str, int] = {}
+        self.keys: list[str | None] = []
+
+    @staticmethod
+    def get_record_text(record: Record) -> str:
+        """
+        Build the searchable text of a record.
+
+        Args:
+            record (Record): The record to build the text for.
+
+        Returns:
+            str: All field values of the record joined with spaces.
+        """
+        return " ".join(str(value) for value in record)
+
+    @classmethod
+    def get_trigrams(cls, text: str) -> set[str]:
+        """
+        Split a text into its set of trigrams.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            set[str]: A set of all trigrams contained in the text.
+        """
+        return {text[i : i + cls.N] for i in range(len(text) - cls.N + 1)}
+
+    def add(self, record: Record) -> None:
+        """
+        Add a record to the index.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        record_id = len(self.keys)
+        self.ids[record.personal_phone] = record_id
+        self.keys.append(record.personal_phone)
+        for trigram in self.get_trigrams(self.get_record_text(record)):
+            posting = self.postings.get(trigram)
+            if posting is None:
+                posting = self.postings[trigram] = array("I")
+            posting.append(record_id)
+
+    def remove(self, record: Record) -> None:
+        """
+        Remove a record from the index.
+
+        Args:
+            record (Record): The record to remove.
+
+        Returns:
+            None
+        """
+        record_id = self.ids.pop(record.personal_phone, None)
+        if record_id is None:
+            return
+        self.keys[record_id] = None
+
+        for trigram in self.get_trigrams(self.get_record_text(record)):
+            posting = self.postings.get(trigram)
+            if posting is None:
+                continue
+            index = bisect_left(posting, record_id)
+            if index < len(posting) and posting[index] == record_id:
+                del posting[index]
+            if not posting:
+                del self.postings[trigram]
+
+    def get_candidates(self, search_string: str) -> set[str] | None:
+        """
+        Get the personal phone numbers of records that may contain the search string.
+
+        Args:
+            search_string (str): The search string.
+
+        Returns:
+            set[str] | None: A set of candidate keys, or None if the search string
+            is too short to be answered from the index.
+        """
+        trigrams = self.get_trigrams(search_string)
+        if not trigrams:
+            return None
+
+        postings = []
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+
+        postings.sort(key=len)
+        record_ids = set(postings[0])
+        for posting in postings[1:]:
+            if not record_ids:
+                break
+            if len(posting) > self.SEARCH_RATIO * len(record_ids):
+                # Looking the few remaining ids up beats scanning a long posting list.
+                record_ids = {
+                    record_id
+                    for record_id in record_ids
+                    if self.__contains(posting, record_id)
+                }
+            else:
+                record_ids.intersection_update(posting)
+        candidates = {self.keys[record_id] for record_id in record_ids}
+        # A record removed by another thread meanwhile has no key any more.
+        candidates.discard(None)
+        return candidates
+
+    @staticmethod
+    def __contains(posting: array, record_id: int) -> bool:
+        """
+        Check if a sorted posting list holds a record id.
+
+        Args:
+            posting (array): The sorted ids of a trigram's records.
+            record_id (int): The id to look for.
+
+        Returns:
+            bool: True if the id is in the posting list, False otherwise.
+        """
+        index = bisect_left(posting, record_id)
+        return index < len(posting) and posting[index] == record_id
+
+
+class FieldIndex:
+    """
+    A sorted index of the values of one record field.
+
+    The index is a sorted list of (value, personal phone number) pairs, so exact
+    and prefix lookups are answered with two binary searches.
+    """
+
+    # Sorts after every character that can appear in a field value
+    MAX_CHARACTER = chr(0x10FFFF)
+
+    def __init__(self, field_name: str, records) -> None:
+        """
+        Initialize the FieldIndex instance.
+
+        Args:
+            field_name (str): The Record attribute to index.
+            records (Iterable[Record]): The records to populate the index with.
+
+        Returns:
+            None
+        """
+        self.field_name: str = field_name
+        self.entries: list[tuple[str, str]] = sorted(
+            (getattr(record, field_name), record.personal_phone) for record in records
+        )
+
+    def add(self, record: Record) -> None:
+        """
+        Add a record to the index.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        insort(self.entries, (getattr(record, self.field_name), record.personal_phone))
+
+    def update(self, records) -> None:
+        """
+        Add a batch of records to the index with a single sort.
+
+        Args:
+            records (Iterable[Record]): The records to add.
+
+        Returns:
+            None
+        """
+        self.entries.extend(
+            (getattr(record, self.field_name), record.personal_phone)
+            for record in records
+        )
+        self.entries.sort()
+
+    def remove(self, record: Record) -> None:
+        """
+        Remove a record from the index.
+
+        Args:
+            record (Record): The record to remove.
+
+        Returns:
+            None
+        """
+        entry = (getattr(record, self.field_name), record.personal_phone)
+        index = bisect_left(self.entries, entry)
+        if index < len(self.entries) and self.entries[index] == entry:
+            del self.entries[index]
+
+    def remove_many(self, records) -> None:
+        """
+        Remove a batch of records from the index in one pass.
+
+        Args:
+            records (Iterable[Record]): The records to remove.
+
+        Returns:
+            None
+        """
+        removed = {
+            (getattr(record, self.field_name), record.personal_phone)
+            for record in records
+        }
+        self.entries = [entry for entry in self.entries if entry not in removed]
+
+    def lookup(self, value: str, prefix: bool = False) -> set[str]:
+        """
+        Get the personal phone numbers of records with a matching field value.
+
+        Args:
+            value (str): The value to look up.
+            prefix (bool): Match every field value starting with the value.
+
+        Returns:
+            set[str]: The keys of the matching records.
+        """
+        # Bound once, as a batch removal in another thread replaces the list.
+        entries = self.entries
+        start = bisect_left(entries, (value,))
+        end = bisect_left(
+            entries,
+            (value + self.MAX_CHARACTER,) if prefix else (value, self.MAX_CHARACTER),
+        )
+        return {personal_phone for _, personal_phone in entries[start:end]}
+
+
+class PhoneDigitIndex:
+    """
+    A suffix array over the digits of the personal and work phone numbers.
+
+    Every suffix of a record's normalized phone digits is stored as one integer:
+    the suffix is read as a base-11 number (digits shifted by one and padded with
+    zeros, which keeps lexicographic order) and combined with a numeric record id.
+    The integers are kept in a sorted array, so any contiguous run of digits,
+    e.g. '5558889' for '(555) 888-9999', is found with two binary searches
+    whose cost depends on the length of the run, not on the size of the directory.
+    """
+
+    PHONE_FIELDS = ("personal_phone", "work_phone")
+    MAX_DIGITS = 10
+    ID_BITS = 28
+    ID_MASK = (1 << ID_BITS) - 1
+    CODE_SPACE = 11**MAX_DIGITS
+    BUCKETS = 11**2
+    BUCKET_SPAN = 11 ** (MAX_DIGITS - 2) << ID_BITS
+    NON_DIGITS = re.compile(r"\D")
+    SHIFTED_DIGITS = str.maketrans("0123456789", "123456789a")
+
+    def __init__(self, records=()) -> None:
+        """
+        Initialize the PhoneDigitIndex instance.
+
+        Args:
+            records (Iterable[Record]): The records to populate the index with.
+
+        Returns:
+            None
+        """
+        self.ids: dict[str, int] = {}
+        self.keys: list[str | None] = []
+        # The codes are collected in compact arrays by their two leading digits
+        # and sorted a bucket at a time, as sorting them all as a list of ints
+        # would take several times the memory of the index.
+        buckets = [array("q") for _ in range(self.BUCKETS)]
+        for record in records:
+            for code in self.__get_codes(record, self.__assign_id(record)):
+                buckets[code // self.BUCKET_SPAN].append(code)
+
+        self.codes: array = array("q")
+        buckets.reverse()
+        while buckets:
+            self.codes.extend(sorted(buckets.pop()))
+
+    @staticmethod
+    def normalize(phone: str) -> str:
+        """
+        Strip everything but the digits from a phone number.
+
+        Args:
+            phone (str): The phone number.
+
+        Returns:
+            str: The digits of the phone number.
+        """
+        return PhoneDigitIndex.NON_DIGITS.sub("", phone)
+
+    def add(self, record: Record) -> None:
+        """
+        Add the phone numbers of a record to the index.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        for code in self.__get_codes(record, self.__assign_id(record)):
+            self.codes.insert(bisect_left(self.codes, code), code)
+
+    def update(self, records) -> None:
+        """
+        Add the phone numbers of a batch of records to the index.
+
+        The sorted codes of the batch are merged into the array in one pass,
+        instead of shifting the array once for every inserted code.
+
+        Args:
+            records (Iterable[Record]): The records to add.
+
+        Returns:
+            None
+        """
+        codes = []
+        for record in records:
+            codes.extend(self.__get_codes(record, self.__assign_id(record)))
+        codes.sort()
+
+        merged = array("q")
+        start = 0
+        for code in codes:
+            end = bisect_left(self.codes, code, start)
+            merged.extend(self.codes[start:end])
+            merged.append(code)
+            start = end
+        merged.extend(self.codes[start:])
+        self.codes = merged
+
+    def remove(self, record: Record) -> None:
+        """
+        Remove the phone numbers of a record from the index.
+
+        Args:
+            record (Record): The record to remove.
+
+        Returns:
+            None
+        """
+        record_id = self.ids.pop(record.personal_phone, None)
+        if record_id is None:
+            return
+        self.keys[record_id] = None
+
+        for code in self.__get_codes(record, record_id):
+            index = bisect_left(self.codes, code)
+            if index < len(self.codes) and self.codes[index] == code:
+                del self.codes[index]
+
+    def remove_many(self, records) -> None:
+        """
+        Remove the phone numbers of a batch of records from the index.
+
+        The array is rebuilt from the runs of codes between the removed ones,
+        instead of being shifted once for every removed code.
+
+        Args:
+            records (Iterable[Record]): The records to remove.
+
+        Returns:
+            None
+        """
+        codes = []
+        for record in records:
+            record_id = self.ids.pop(record.personal_phone, None)
+            if record_id is not None:
+                self.keys[record_id] = None
+                codes.extend(self.__get_codes(record, record_id))
+        codes.sort()
+
+        kept = array("q")
+        start = 0
+        for code in codes:
+            index = bisect_left(self.codes, code, start)
+            if index < len(self.codes) and self.codes[index] == code:
+                kept.extend(self.codes[start:index])
+                start = index + 1
+        kept.extend(self.codes[start:])
+        self.codes = kept
+
+    def lookup(self, digits: str) -> set[str]:
+        """
+        Get the personal phone numbers of records with a phone containing the digits.
+
+        Args:
+            digits (str): A run of digits, punctuation is ignored.
+
+        Returns:
+            set[str]: The keys of the matching records.
+        """
+        shifted = self.normalize(digits).translate(self.SHIFTED_DIGITS)
+        if len(shifted) > self.MAX_DIGITS:
+            return set()
+
+        lowest = int(shifted.ljust(self.MAX_DIGITS, "0"), 11) << self.ID_BITS
+        highest = int(shifted.ljust(self.MAX_DIGITS, "a"), 11) << self.ID_BITS
+        # Bound once, as a batch update in another thread replaces the array.
+        codes = self.codes
+        start = bisect_left(codes, lowest)
+        end = bisect_right(codes, highest | self.ID_MASK, start)
+        matched_keys = {self.keys[code & self.ID_MASK] for code in codes[start:end]}
+        matched_keys.discard(None)
+        return matched_keys
+
+    def __assign_id(self, record: Record) -> int:
+        """
+        Give a record a new numeric id.
+
+        Args:
+            record (Record): The record.
+
+        Returns:
+            int: The id of the record.
+        """
+        record_id = len(self.keys)
+        self.ids[record.personal_phone] = record_id
+        self.keys.append(record.personal_phone)
+        return record_id
+
+    def __get_codes(self, record: Record, record_id: int) -> list[int]:
+        """
+        Encode the phone digit suffixes of a record.
+
+        Args:
+            record (Record): The record.
+            record_id (int): The id of the record.
+
+        Returns:
+            list[int]: The encoded suffixes of the record's phone numbers.
+        """
+        codes = []
+        for field_name in self.PHONE_FIELDS:
+            shifted = self.normalize(getattr(record, field_name))[
+                -self.MAX_DIGITS :
+            ].translate(self.SHIFTED_DIGITS)
+            if not shifted:
+                continue
+
+            # Dropping the leading digit of a padded suffix is a shift by one base-11 digit
+            code = int(shifted.ljust(self.MAX_DIGITS, "0"), 11)
+            for _ in range(len(shifted)):
+                codes.append(code << self.ID_BITS | record_id)
+                code = code * 11 % self.CODE_SPACE
+        return codes
+
+
+def levenshtein_distance(first: str, second: str) -> int:
+    """
+    Compute the edit distance between two strings.
+
+    Args:
+        first (str): The first string.
+        second (str): The second string.
+
+    Returns:
+        int: The minimum number of insertions, deletions and substitutions
+        turning one string into the other.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+
+    previous_row = list(range(len(second) + 1))
+    for i, first_character in enumerate(first, 1):
+        current_row = [i]
+        for j, second_character in enumerate(second, 1):
+            current_row.append(
+                min(
+                    previous_row[j] + 1,
+                    current_row[j - 1] + 1,
+                    previous_row[j - 1] + (first_character != second_character),
+                )
+            )
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class BKTree:
+    """
+    A Burkhard-Keller tree of words under the edit distance.
+
+    Every child of a node is stored under its distance to the node's word, so
+    by the triangle inequality a search within distance k only descends into
+    children whose distance differs from the query's by at most k.
+    """
+
+    def __init__(self, words=()) -> None:
+        """
+        Initialize the BKTree instance.
+
+        Args:
+            words (Iterable[str]): The words to populate the tree with.
+
+        Returns:
+            None
+        """
+        self.root: tuple[str, dict] | None = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        """
+        Add a word to the tree, ignoring words already in it.
+
+        Args:
+            word (str): The word to add.
+
+        Returns:
+            None
+        """
+        if self.root is None:
+            self.root = (word, {})
+            return
+
+        node_word, children = self.root
+        while True:
+            distance = levenshtein_distance(word, node_word)
+            if distance == 0:
+                return
+            if distance not in children:
+                children[distance] = (word, {})
+                return
+            node_word, children = children[distance]
+
+    def search(self, word: str, max_distance: int) -> list[tuple[int, str]]:
+        """
+        Find the words within an edit distance of a word.
+
+        Args:
+            word (str): The word to search for.
+            max_distance (int): The maximum edit distance.
+
+        Returns:
+            list[tuple[int, str]]: The found words with their distances, nearest first.
+        """
+        if self.root is None:
+            return []
+
+        found = []
+        stack = [self.root]
+        while stack:
+            node_word, children = stack.pop()
+            distance = levenshtein_distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            # Copied, as a name added by another thread may grow the children.
+            for child_distance, child in list(children.items()):
+                if abs(child_distance - distance) <= max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+
+class NameIndex:
+    """
+    A fuzzy index over the last and first names of the records.
+
+    The distinct names are kept in a BKTree and mapped to the personal phone
+    numbers of the records using them in each field. Names are never removed
+    from the tree; a name no record uses any more just maps to no records.
+    """
+
+    NAME_FIELDS = ("last_name", "first_name")
+
+    def __init__(self, records=()) -> None:
+        """
+        Initialize the NameIndex instance.
+
+        Args:
+            records (Iterable[Record]): The records to populate the index with.
+
+        Returns:
+            None
+        """
+        self.tree: BKTree = BKTree()
+        self.keys: dict[str, dict[str, set[str]]] = {
+            field_name: {} for field_name in self.NAME_FIELDS
+        }
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Record) -> None:
+        """
+        Add the names of a record to the index.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        for field_name in self.NAME_FIELDS:
+            name = getattr(record, field_name)
+            keys = self.keys[field_name].get(name)
+            if keys is None:
+                keys = self.keys[field_name][name] = set()
+                self.tree.add(name)
+            keys.add(record.personal_phone)
+
+    def remove(self, record: Record) -> None:
+        """
+        Remove the names of a record from the index.
+
+        Args:
+            record (Record): The record to remove.
+
+        Returns:
+            None
+        """
+        for field_name in self.NAME_FIELDS:
+            keys = self.keys[field_name].get(getattr(record, field_name))
+            if keys is not None:
+                keys.discard(record.personal_phone)
+
+    def find_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the names in use within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): The name field to search, or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+        field_names = self.NAME_FIELDS if field_name is None else (field_name,)
+        return [
+            (distance, found_name)
+            for distance, found_name in self.tree.search(name, max_distance)
+            if any(self.keys[field].get(found_name) for field in field_names)
+        ]
+
+    def lookup(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> set[str]:
+        """
+        Get the personal phone numbers of records with a name close to a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): The name field to search, or None for both.
+
+        Returns:
+            set[str]: The keys of the matching records.
+        """
+        field_names = self.NAME_FIELDS if field_name is None else (field_name,)
+        matched_keys = set()
+        for _, found_name in self.tree.search(name, max_distance):
+            for field in field_names:
+                matched_keys |= self.keys[field].get(found_name, set())
+        return matched_keys
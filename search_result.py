@@ -1,17 +1,98 @@
 from record import Record
-from dataclasses import dataclass
+from typing import Iterator
 
 
-@dataclass
 class SearchResult:
     """
     Represents a result of a search operation in the phone directory.
 
+    The result is a lazy cursor: matched records are pulled from the underlying
+    iterator, which yields them in directory order, only as far as the pages
+    that are actually shown require.
+
     Attributes:
         search_string (str): The search string used.
-        matched_records (list[Record]): List of records that match the search string.
+        matched_records (list[Record]): Matched records fetched so far.
+        exhausted (bool): True once all matched records are fetched.
 
     """
 
-    search_string: str
-    matched_records: list[Record]
+    def __init__(self, search_string: str, matches: Iterator[Record]) -> None:
+        """
+        Initialize the SearchResult instance.
+
+        Args:
+            search_string (str): The search string used.
+            matches (Iterator[Record]): An iterator over the matched records in directory order.
+
+        Returns:
+            None
+        """
+        self.search_string: str = search_string
+        self.matched_records: list[Record] = []
+        self.exhausted: bool = False
+        self.__matches: Iterator[Record] = matches
+
+    def fetch(self, count: int) -> None:
+        """
+        Fetch matched records until at least count of them are available.
+
+        Args:
+            count (int): The number of matched records needed.
+
+        Returns:
+            None
+        """
+        while not self.exhausted and len(self.matched_records) < count:
+            try:
+                self.matched_records.append(next(self.__matches))
+            except StopIteration:
+                self.exhausted = True
+
+    def get_records(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a slice of the matched records.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The matched records in the requested range.
+        """
+        self.fetch(end_index)
+        return self.matched_records[start_index:end_index]
+
+    def get_available_pages(self, current_page: int, items_per_page: int) -> int:
+        """
+        Get the number of pages that can be navigated to from the current page.
+
+        Args:
+            current_page (int): The current page number.
+            items_per_page (int): The number of records per page.
+
+        Returns:
+            int: The total number of pages if all matches are fetched, otherwise
+            the current page number plus one if there is a next page.
+        """
+        self.fetch(current_page * items_per_page + 1)
+        if self.exhausted:
+            return max(
+                (len(self.matched_records) + items_per_page - 1) // items_per_page, 1
+            )
+        return current_page + 1
+
+    def __iter__(self) -> Iterator[Record]:
+        """
+        Iterate over all matched records.
+
+        Returns:
+            Iterator[Record]: An iterator over the matched records in directory order.
+        """
+        index = 0
+        while True:
+            self.fetch(index + 1)
+            if index >= len(self.matched_records):
+                return
+            yield self.matched_records[index]
+            index += 1
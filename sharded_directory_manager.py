@@ -0,0 +1,1060 @@
+import os
+import csv
+import json
+import errno
+import shutil
+import tempfile
+from collections import deque
+from itertools import groupby, islice
+from typing import Any, Callable, Iterable, Iterator, TextIO
+from record import Record
+from file_lock import FileLock
+from validator import RecordValidator
+from search_result import SearchResult
+from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage, ImportSummary
+from config import VALIDATION_BATCH_SIZE, HISTORY_STEPS
+from errors import NotUniquePersonalNumber, RecordDoesNotExist, RecordValidationError
+from query import Term, Not, And, Or, is_structured_query, parse_query
+
+MANIFEST_FILENAME = "manifest.json"
+PHONES_EXTENSION = ".phones"
+
+
+class ShardedDirectoryManager(DirectoryStorage):
+    """
+    A class to manage a directory stored in a folder of CSV files, one per
+    initial of the last names.
+
+    The manifest of the folder holds the header, regexes and example of the
+    directory and the file and records count of every shard, and the phones file
+    next to every shard the personal phone numbers stored in it. Records
+    are ordered by last name first, so the directory order is the shards in the
+    order of their initials, one after the other, and a page is read from the
+    shards its positions fall into.
+
+    A shard is loaded into its own headerless DirectoryManager the first time a
+    page, a lookup, a change or a search needs it, and keeps its journal,
+    snapshot and history as a single CSV file does. A save only writes the
+    changed shards and the phones files of the shards whose numbers changed,
+    then the manifest.
+
+    Attributes:
+        show_progress (bool): Show a progress bar while a shard file is rewritten.
+        use_search_index (bool): Answer substring searches from trigram indexes.
+        shards (dict[str, DirectoryManager]): The loaded shards by initial.
+        shard_files (dict[str, str]): The file names of all shards in the folder by initial.
+        shard_counts (dict[str, int]): The records counts in the manifest by initial.
+        phone_shards (dict[str, str]): The initial of the shard of every personal phone number.
+        phone_changes (dict[str, str | None]): The shards of the personal phone
+            numbers added, moved or deleted since the last save, None if deleted.
+        changed_phone_files (set[str]): The initials of the shards whose numbers
+            changed since the last save.
+        phone_file_states (dict[str, tuple[int, int, int] | None]): The inode, size
+            and modification time of the phones file of every shard by initial,
+            when it was last read or written.
+        undo_steps (deque[list[str]]): The shards changed by every step that can be
+            undone, one initial per shard history step, the latest step last.
+        redo_steps (list[list[str]]): The shards changed by every undone step.
+        file_lock (FileLock): The lock of the manifest, held while it is read or saved.
+        manifest_state (tuple[int, int, int] | None): The inode, size and modification
+            time of the manifest when it was last read or written.
+    """
+
+    def __init__(
+        self, filename: str, show_progress: bool = True, use_search_index: bool = True
+    ) -> None:
+        """
+        Initialize the ShardedDirectoryManager instance.
+
+        Args:
+            filename (str): The name of the folder of the directory.
+            show_progress (bool): Show a progress bar while a shard file is rewritten.
+            use_search_index (bool): Answer substring searches from trigram indexes.
+
+        Returns:
+            None
+        """
+        super().__init__(filename)
+        self.show_progress: bool = show_progress
+        self.use_search_index: bool = use_search_index
+        self.shards: dict[str, DirectoryManager] = {}
+        self.shard_files: dict[str, str] = {}
+        self.shard_counts: dict[str, int] = {}
+        self.phone_shards: dict[str, str] = {}
+        self.phone_changes: dict[str, str | None] = {}
+        self.changed_phone_files: set[str] = set()
+        self.phone_file_states: dict[str, tuple[int, int, int] | None] = {}
+        self.undo_steps: deque[list[str]] = deque(maxlen=HISTORY_STEPS)
+        self.redo_steps: list[list[str]] = []
+        self.file_lock: FileLock = FileLock(
+            os.path.join(filename, f"{MANIFEST_FILENAME}.lock")
+        )
+        self.manifest_state: tuple[int, int, int] | None = None
+        self.__parallel: bool = False
+        self.__workers: int | None = None
+        self.__known_counts: dict[str, int] = {}
+
+    def deserialize_directory(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> None:
+        """
+        Read the manifest and the phones files of the directory.
+
+        No shard is loaded here, each is loaded when it is first needed.
+
+        Args:
+            parallel (bool): Validate the records of a shard in a pool of worker
+                processes when it is loaded.
+            workers (int | None): The number of worker processes.
+
+        Returns:
+            None
+        """
+        if not os.path.isdir(self.filename):
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), self.filename
+            )
+
+        self.__parallel = parallel
+        self.__workers = workers
+        self.shards = {}
+        self.phone_shards = {}
+        self.phone_changes = {}
+        self.changed_phone_files = set()
+        self.phone_file_states = {}
+        self.undo_steps.clear()
+        self.redo_steps = []
+        with self.file_lock.acquire(shared=True):
+            self.__read_manifest()
+        self.__known_counts = dict(self.shard_counts)
+
+    def __read_manifest(self) -> None:
+        """
+        Read the fields and shards from the manifest, and the phones files
+        replaced since they were last read.
+
+        The shards created since the last save are not in the manifest yet, so
+        the loaded ones keep their files.
+
+        Returns:
+            None
+        """
+        try:
+            with open(
+                os.path.join(self.filename, MANIFEST_FILENAME), encoding="utf-8"
+            ) as file:
+                manifest = json.load(file)
+            self.header = manifest["header"]
+            self.regexes = manifest["regexes"]
+            self.example = manifest["example"]
+            shards = manifest["shards"]
+        except (ValueError, KeyError):
+            raise RecordValidationError(
+                f"{self.filename} has no valid {MANIFEST_FILENAME}. Migrate a CSV directory into it and restart the application."
+            )
+
+        self.validator = RecordValidator(self.header, self.regexes)
+        self.shard_files = {shard["initial"]: shard["file"] for shard in shards}
+        self.shard_files.update(
+            (initial, os.path.basename(shard.filename))
+            for initial, shard in self.shards.items()
+        )
+        self.shard_counts = {shard["initial"]: shard["count"] for shard in shards}
+
+        # Only the phones files replaced by a save since they were read last.
+        read_phones: dict[str, list[str]] = {}
+        for initial in self.shard_counts:
+            state = self.__get_phone_file_state(initial)
+            if initial in self.phone_file_states:
+                if state == self.phone_file_states[initial]:
+                    continue
+            try:
+                with open(self.__get_phone_filename(initial), encoding="utf-8") as file:
+                    read_phones[initial] = file.read().splitlines()
+            except FileNotFoundError:
+                read_phones[initial] = []
+            self.phone_file_states[initial] = state
+
+        if read_phones:
+            if self.phone_shards:
+                self.phone_shards = {
+                    personal_phone: initial
+                    for personal_phone, initial in self.phone_shards.items()
+                    if initial not in read_phones
+                }
+            for initial, personal_phones in read_phones.items():
+                self.phone_shards.update(dict.fromkeys(personal_phones, initial))
+        self.manifest_state = self.__get_manifest_state()
+
+    def __get_phone_filename(self, initial: str) -> str:
+        """
+        Get the path of the phones file of a shard.
+
+        Args:
+            initial (str): The initial of the shard.
+
+        Returns:
+            str: The path of the file listing the personal phone numbers of the shard.
+        """
+        return os.path.join(
+            self.filename, get_phones_filename(self.shard_files[initial])
+        )
+
+    def __get_phone_file_state(self, initial: str) -> tuple[int, int, int] | None:
+        """
+        Get the identity, size and modification time of the phones file of a shard.
+
+        Args:
+            initial (str): The initial of the shard.
+
+        Returns:
+            tuple[int, int, int] | None: The inode, size and modification time in
+            nanoseconds, or None if the shard has no phones file.
+        """
+        try:
+            stat = os.stat(self.__get_phone_filename(initial))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def __get_shard(self, initial: str) -> DirectoryManager:
+        """
+        Get the shard of an initial, loading it on first use.
+
+        A shard without a file yet is created empty, to hold the first record
+        added with its initial.
+
+        Args:
+            initial (str): The first character of the last names in the shard.
+
+        Returns:
+            DirectoryManager: The loaded shard.
+        """
+        if initial in self.shards:
+            return self.shards[initial]
+
+        if initial not in self.shard_files:
+            self.shard_files[initial] = (
+                f"shard-{ord(initial):04x}.csv" if initial else "shard.csv"
+            )
+        filename = os.path.join(self.filename, self.shard_files[initial])
+        if not os.path.exists(filename):
+            open(filename, "a").close()
+
+        shard = DirectoryManager(
+            filename,
+            self.show_progress,
+            self.use_search_index,
+            headerless=True,
+            file_lock=FileLock(None),
+        )
+        shard.header = self.header
+        shard.regexes = self.regexes
+        shard.example = self.example
+        shard.validator = self.validator
+        with self.file_lock.acquire(shared=True):
+            shard.deserialize_directory(self.__parallel, self.__workers)
+        self.shards[initial] = shard
+        return shard
+
+    def __get_initials(self) -> list[str]:
+        """
+        Get the initials of all shards in directory order.
+
+        Returns:
+            list[str]: The sorted initials.
+        """
+        return sorted(self.shard_files)
+
+    def __get_count(self, initial: str) -> int:
+        """
+        Get the number of records in a shard without loading it.
+
+        Args:
+            initial (str): The initial of the shard.
+
+        Returns:
+            int: The number of records.
+        """
+        if initial in self.shards:
+            return self.shards[initial].get_records_count()
+        return self.shard_counts.get(initial, 0)
+
+    def __change_shard(
+        self,
+        step: list[str],
+        initial: str,
+        change: Callable[[DirectoryManager], Any],
+    ) -> Any:
+        """
+        Change a shard and add it to a step if the change was recorded in its history.
+
+        Args:
+            step (list[str]): The shards changed by the step so far.
+            initial (str): The initial of the shard to change.
+            change (Callable[[DirectoryManager], Any]): Changes the shard.
+
+        Returns:
+            Any: The result of the change.
+        """
+        shard = self.__get_shard(initial)
+        undo_steps = shard.history.undo_steps
+        latest_step = undo_steps[-1] if undo_steps else None
+        result = change(shard)
+        if undo_steps and undo_steps[-1] is not latest_step:
+            step.append(initial)
+        return result
+
+    def __record_step(self, step: list[str]) -> None:
+        """
+        Add the shards changed by an operation as a new undo step.
+
+        Args:
+            step (list[str]): The changed shards, one initial per shard history step.
+
+        Returns:
+            None
+        """
+        if not step:
+            return
+        self.undo_steps.append(step)
+        self.redo_steps.clear()
+
+    def __set_phone_shard(self, personal_phone: str, initial: str | None) -> None:
+        """
+        Remember the shard a personal phone number is stored in.
+
+        Args:
+            personal_phone (str): The personal phone number.
+            initial (str | None): The initial of the shard, None if the number was deleted.
+
+        Returns:
+            None
+        """
+        previous_initial = self.phone_shards.get(personal_phone)
+        if previous_initial is not None:
+            self.changed_phone_files.add(previous_initial)
+        if initial is None:
+            self.phone_shards.pop(personal_phone, None)
+        else:
+            self.phone_shards[personal_phone] = initial
+            self.changed_phone_files.add(initial)
+        self.phone_changes[personal_phone] = initial
+
+    def serialize_directory(self) -> bool:
+        """
+        Save the directory changes made since the last save.
+
+        Every changed shard is saved to its own journal, or rewritten once its
+        journal is long, while the other shards are not touched. The phones files
+        of the shards whose numbers were added, moved or deleted are rewritten
+        from their loaded records, then the manifest with the new records counts.
+        Changes saved by other processes in the meantime are merged first, under
+        the manifest lock.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+        """
+        with self.file_lock.acquire():
+            if self.__get_manifest_state() != self.manifest_state:
+                self.__merge_manifest()
+
+            saved = False
+            for shard in self.shards.values():
+                if shard.serialize_directory():
+                    saved = True
+            if not saved and not self.phone_changes:
+                return False
+
+            # A shard whose numbers changed was loaded to change it, so its
+            # numbers are the keys of its records.
+            for initial in sorted(self.changed_phone_files):
+                shard = self.__get_shard(initial)
+                replace_file(
+                    self.__get_phone_filename(initial),
+                    lambda file: write_phones(file, shard.data),
+                )
+                self.phone_file_states[initial] = self.__get_phone_file_state(initial)
+            self.changed_phone_files = set()
+            self.phone_changes = {}
+            self.shard_counts = {
+                initial: self.__get_count(initial) for initial in self.shard_files
+            }
+            write_manifest(
+                self.filename,
+                self.header,
+                self.regexes,
+                self.example,
+                [
+                    (initial, self.shard_files[initial], self.shard_counts[initial])
+                    for initial in self.__get_initials()
+                ],
+            )
+            self.manifest_state = self.__get_manifest_state()
+        return True
+
+    def reload_directory(self) -> bool:
+        """
+        Merge the changes other processes saved to the directory.
+
+        Only a changed manifest is read again: the loaded shards merge the
+        changes saved to them, and the other shards only take their new counts.
+
+        Returns:
+            bool: True if the manifest changed, False otherwise.
+        """
+        if self.__get_manifest_state() == self.manifest_state:
+            return False
+
+        with self.file_lock.acquire(shared=True):
+            self.__merge_manifest()
+        return True
+
+    def __merge_manifest(self) -> None:
+        """
+        Read the manifest and the phones files saved by another process, keeping
+        the unsaved changes, and merge the changes saved to the loaded shards.
+
+        Returns:
+            None
+        """
+        self.__read_manifest()
+        for personal_phone, initial in self.phone_changes.items():
+            if initial is None:
+                self.phone_shards.pop(personal_phone, None)
+            else:
+                self.phone_shards[personal_phone] = initial
+        for shard in self.shards.values():
+            shard.reload_directory()
+
+    def __get_manifest_state(self) -> tuple[int, int, int] | None:
+        """
+        Get the identity, size and modification time of the manifest.
+
+        Returns:
+            tuple[int, int, int] | None: The inode, size and modification time in
+            nanoseconds, or None if there is no manifest.
+        """
+        try:
+            stat = os.stat(os.path.join(self.filename, MANIFEST_FILENAME))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def has_unsaved_changes(self) -> bool:
+        """
+        Check if the directory was changed since the last save.
+
+        Returns:
+            bool: True if a loaded shard has unsaved changes, False otherwise.
+        """
+        return any(shard.has_unsaved_changes() for shard in self.shards.values())
+
+    def get_records(self) -> list[Record]:
+        """
+        Get a sorted list of all records in the directory, loading every shard.
+
+        Returns:
+            list[Record]: A list of all records.
+        """
+        return [
+            record
+            for initial in self.__get_initials()
+            for record in self.__get_shard(initial).get_records()
+        ]
+
+    def get_records_page(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a sorted slice of the records, loading only the shards it falls into.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+        records = []
+        offset = 0
+        for initial in self.__get_initials():
+            if offset >= end_index:
+                break
+            if offset + self.__get_count(initial) > start_index:
+                records.extend(
+                    self.__get_shard(initial).get_records_page(
+                        start_index - offset, end_index - offset
+                    )
+                )
+            offset += self.__get_count(initial)
+        return records
+
+    def get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+        return sum(self.__get_count(initial) for initial in self.shard_files)
+
+    def get_record(self, records_personal_number: str) -> Record:
+        """
+        Get a record by its personal phone number, loading only its shard.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The record with that personal phone number.
+        """
+        records_personal_number = self.format_personal_phone(records_personal_number)
+        if records_personal_number not in self.phone_shards:
+            raise RecordDoesNotExist(
+                f"Record with that personal number does not exist."
+            )
+
+        initial = self.phone_shards[records_personal_number]
+        return self.__get_shard(initial).get_record(records_personal_number)
+
+    def add_record(self, record: Record) -> None:
+        """
+        Add a new record to the shard of its last name.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        if self.is_number_already_in_directory(record.personal_phone):
+            raise NotUniquePersonalNumber(
+                f"Record with that personal number already exist in the directory."
+            )
+
+        initial = record.last_name[:1]
+        step = []
+        self.__change_shard(step, initial, lambda shard: shard.add_record(record))
+        self.__set_phone_shard(record.personal_phone, initial)
+        self.__record_step(step)
+
+    def add_numbered_rows(
+        self,
+        numbered_rows: Iterable[tuple[int, Iterable[str]]],
+        on_conflict: str,
+        row_label: str,
+        validated: bool = False,
+    ) -> ImportSummary:
+        """
+        Add rows of field values to the directory, all of them or none.
+
+        The rows are validated and their conflicts resolved against the phones
+        files first, so only the shards of the added rows, and of the records
+        they move out of another shard, are loaded. Each of those shards then
+        adds its rows in one step, and the shards changed before a failing one
+        are reverted, leaving their histories as they were before the import.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            on_conflict (str): One of CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+            validated (bool): The rows were already checked by validate_numbered_rows.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        if on_conflict not in self.CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {on_conflict!r}.")
+
+        summary = ImportSummary()
+        imported_records: dict[str, tuple[int, Record]] = {}
+        rows_iterator = iter(numbered_rows)
+        while batch := list(islice(rows_iterator, VALIDATION_BATCH_SIZE)):
+            rows = [list(row) for _, row in batch]
+            invalid_row_index = (
+                None if validated else self.validator.validate_many(rows)
+            )
+            if invalid_row_index is not None:
+                raise RecordValidationError(
+                    f"{row_label} {batch[invalid_row_index][0]} does not match the regexes of the directory."
+                )
+
+            for (row_number, _), row in zip(batch, rows):
+                record = Record(*row)
+                key = record.personal_phone
+                if key in imported_records or key in self.phone_shards:
+                    if on_conflict == self.FAIL:
+                        raise NotUniquePersonalNumber(
+                            f"{row_label} {row_number}: record with that personal number already exist in the directory."
+                        )
+                    if on_conflict == self.SKIP:
+                        summary.skipped += 1
+                        continue
+                    summary.overwritten += 1
+                else:
+                    summary.added += 1
+                imported_records[key] = (row_number, record)
+
+        shard_rows: dict[str, list[tuple[int, Record]]] = {}
+        moved_keys: list[tuple[str, str]] = []
+        for key, (row_number, record) in imported_records.items():
+            initial = record.last_name[:1]
+            shard_rows.setdefault(initial, []).append((row_number, record))
+            if self.phone_shards.get(key, initial) != initial:
+                moved_keys.append((self.phone_shards[key], key))
+
+        # A step recorded by a shard clears its redo stack, which a rollback
+        # puts back, so the changes undone before the import can still be redone.
+        redo_stacks = {
+            initial: list(self.__get_shard(initial).history.redo_steps)
+            for initial in [initial for initial, _ in moved_keys] + list(shard_rows)
+        }
+        step = []
+        try:
+            for initial, key in moved_keys:
+                self.__change_shard(
+                    step, initial, lambda shard: shard.delete_record(key)
+                )
+            for initial, rows in shard_rows.items():
+                self.__change_shard(
+                    step,
+                    initial,
+                    lambda shard: shard.add_numbered_rows(
+                        rows, self.OVERWRITE, row_label, validated=True
+                    ),
+                )
+        except Exception:
+            for initial in reversed(step):
+                self.shards[initial].revert()
+            for initial, redo_steps in redo_stacks.items():
+                self.shards[initial].history.redo_steps = redo_steps
+            raise
+
+        for key, (_, record) in imported_records.items():
+            self.__set_phone_shard(key, record.last_name[:1])
+        self.__record_step(step)
+        return summary
+
+    def delete_record(self, records_personal_number: str) -> Record:
+        """
+        Delete a record from the directory.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to delete,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The deleted record.
+        """
+        deleted_record = self.get_record(records_personal_number)
+        key = deleted_record.personal_phone
+        step = []
+        self.__change_shard(
+            step, self.phone_shards[key], lambda shard: shard.delete_record(key)
+        )
+        self.__set_phone_shard(key, None)
+        self.__record_step(step)
+        return deleted_record
+
+    def replace_record(self, records_personal_number: str, record: Record) -> Record:
+        """
+        Replace a record with an edited one in a single step.
+
+        An edited record whose last name starts with another character moves to
+        the shard of that character.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace,
+                either formatted or as ten digits with any punctuation.
+            record (Record): The edited record, possibly with another personal phone number.
+
+        Returns:
+            Record: The replaced record.
+
+        Raises:
+            RecordDoesNotExist: If no record has that personal phone number.
+            NotUniquePersonalNumber: If another record has the edited personal
+                phone number. The directory is then left unchanged.
+        """
+        replaced_record = self.get_record(records_personal_number)
+        if (
+            record.personal_phone != replaced_record.personal_phone
+            and self.is_number_already_in_directory(record.personal_phone)
+        ):
+            raise NotUniquePersonalNumber(
+                f"Record with that personal number already exist in the directory."
+            )
+
+        key = replaced_record.personal_phone
+        old_initial = self.phone_shards[key]
+        new_initial = record.last_name[:1]
+        step = []
+        if old_initial == new_initial:
+            self.__change_shard(
+                step, old_initial, lambda shard: shard.replace_record(key, record)
+            )
+        else:
+            self.__change_shard(
+                step, old_initial, lambda shard: shard.delete_record(key)
+            )
+            self.__change_shard(
+                step, new_initial, lambda shard: shard.add_record(record)
+            )
+        self.__set_phone_shard(key, None)
+        self.__set_phone_shard(record.personal_phone, new_initial)
+        self.__record_step(step)
+        return replaced_record
+
+    def undo(self) -> bool:
+        """
+        Revert the latest add, delete, edit or import not undone yet.
+
+        The shards it changed undo their own steps, the last changed first.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+        if not self.undo_steps:
+            return False
+
+        step = self.undo_steps.pop()
+        for initial in reversed(step):
+            shard = self.shards[initial]
+            shard.undo()
+            for change in shard.history.redo_steps[-1]:
+                self.__set_phone_shard(
+                    change.personal_phone,
+                    None if change.before is None else initial,
+                )
+        self.redo_steps.append(step)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Apply the latest undone change again, unless something was changed since.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+        if not self.redo_steps:
+            return False
+
+        step = self.redo_steps.pop()
+        for initial in step:
+            shard = self.shards[initial]
+            shard.redo()
+            for change in shard.history.undo_steps[-1]:
+                self.__set_phone_shard(
+                    change.personal_phone,
+                    None if change.after is None else initial,
+                )
+        self.undo_steps.append(step)
+        return True
+
+    def search_records(self, search_string: str) -> SearchResult:
+        """
+        Search for records based on a search string.
+
+        The shards are searched one after the other in directory order, each
+        loaded only once the matches of the shards before it are all shown. A
+        query requiring a last name or last name prefix only searches the shards
+        of its initials.
+
+        Args:
+            search_string (str): A plain search string or a query in the syntax
+                of query.parse_query.
+
+        Returns:
+            SearchResult: The search result cursor over the matched records.
+
+        Raises:
+            QuerySyntaxError: If the search string is an invalid query.
+        """
+        initials = self.__get_initials()
+        if is_structured_query(search_string):
+            query_initials = self.__get_query_initials(parse_query(search_string))
+            if query_initials is not None:
+                initials = [
+                    initial for initial in initials if initial in query_initials
+                ]
+
+        return SearchResult(search_string, self.__iter_matches(search_string, initials))
+
+    def __iter_matches(
+        self, search_string: str, initials: list[str]
+    ) -> Iterator[Record]:
+        """
+        Iterate over the records of some shards matching a search string.
+
+        Args:
+            search_string (str): The search string.
+            initials (list[str]): The initials of the shards to search, in directory order.
+
+        Returns:
+            Iterator[Record]: An iterator over the matched records in directory order.
+        """
+        for initial in initials:
+            yield from self.__get_shard(initial).search_records(search_string)
+
+    def __get_query_initials(self, node: Term | Not | And | Or) -> set[str] | None:
+        """
+        Get the initials of the last names a query can match.
+
+        Args:
+            node (Term | Not | And | Or): The query node.
+
+        Returns:
+            set[str] | None: The initials, or None if the query can match any last name.
+        """
+        if isinstance(node, Term):
+            if node.field == "last_name" and node.fuzzy is None and node.value:
+                return {node.value[0]}
+            return None
+
+        if isinstance(node, And):
+            initials = None
+            for operand in node.operands:
+                operand_initials = self.__get_query_initials(operand)
+                if operand_initials is not None:
+                    initials = (
+                        operand_initials
+                        if initials is None
+                        else initials & operand_initials
+                    )
+            return initials
+
+        if isinstance(node, Or):
+            initials = set()
+            for operand in node.operands:
+                operand_initials = self.__get_query_initials(operand)
+                if operand_initials is None:
+                    return None
+                initials |= operand_initials
+            return initials
+
+        return None
+
+    def find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the last or first names in the directory within an edit distance
+        of a name, loading every shard.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+        found = set()
+        for initial in self.__get_initials():
+            found.update(
+                self.__get_shard(initial).find_similar_names(
+                    name, max_distance, field_name
+                )
+            )
+        return sorted(found)
+
+    def is_number_already_in_directory(self, personal_phone_number: str) -> bool:
+        """
+        Check if a personal phone number already exists in the directory.
+
+        Args:
+            personal_phone_number (str): The personal phone number to check.
+
+        Returns:
+            bool: True if the number already exists, False otherwise.
+        """
+        return personal_phone_number in self.phone_shards
+
+    def pop_first_changed_position(self) -> int | None:
+        """
+        Get and reset the lowest sorted position changed since the last call.
+
+        The positions changed in a shard are offset by the records of the shards
+        before it. A shard whose count changed while it was not sorted yet
+        shifts every position from its first one on.
+
+        Returns:
+            int | None: The lowest changed position, or None if nothing changed.
+        """
+        positions = []
+        first_changed_position = super().pop_first_changed_position()
+        if first_changed_position is not None:
+            positions.append(first_changed_position)
+
+        offset = 0
+        for initial in self.__get_initials():
+            count = self.__get_count(initial)
+            position = (
+                self.shards[initial].pop_first_changed_position()
+                if initial in self.shards
+                else None
+            )
+            if position is not None:
+                positions.append(offset + position)
+            elif count != self.__known_counts.get(initial, 0):
+                positions.append(offset)
+            self.__known_counts[initial] = count
+            offset += count
+        return min(positions, default=None)
+
+
+def replace_file(filename: str, write: Callable[[TextIO], None]) -> None:
+    """
+    Write a text file to a temporary file next to it, which then replaces it,
+    so a crash in the middle of a write leaves the old file intact.
+
+    Args:
+        filename (str): The name of the file.
+        write (Callable[[TextIO], None]): Writes the contents to the open file.
+
+    Returns:
+        None
+    """
+    with tempfile.NamedTemporaryFile(
+        mode="w",
+        newline="",
+        encoding="utf-8",
+        dir=os.path.dirname(os.path.abspath(filename)),
+        prefix=f".{os.path.basename(filename)}.",
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        try:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        except BaseException:
+            file.close()
+            os.remove(file.name)
+            raise
+    os.replace(file.name, filename)
+
+
+def get_phones_filename(shard_filename: str) -> str:
+    """
+    Get the name of the phones file of a shard file.
+
+    Args:
+        shard_filename (str): The file name of the shard.
+
+    Returns:
+        str: The file name listing the personal phone numbers of the shard.
+    """
+    return os.path.splitext(shard_filename)[0] + PHONES_EXTENSION
+
+
+def write_phones(file: TextIO, personal_phones: Iterable[str]) -> None:
+    """
+    Write the personal phone numbers of a shard, one per line.
+
+    Args:
+        file (TextIO): The open phones file.
+        personal_phones (Iterable[str]): The personal phone numbers.
+
+    Returns:
+        None
+    """
+    file.writelines(f"{personal_phone}\n" for personal_phone in personal_phones)
+
+
+def write_manifest(
+    folder: str,
+    header: list[str],
+    regexes: dict[str, str],
+    example: dict[str, str],
+    shards: list[tuple[str, str, int]],
+) -> None:
+    """
+    Write the manifest of a sharded directory.
+
+    Args:
+        folder (str): The folder of the directory.
+        header (list[str]): The field names.
+        regexes (dict[str, str]): The regexes by field name.
+        example (dict[str, str]): The example values by field name.
+        shards (list[tuple[str, str, int]]): The initial, file name and records
+            count of every shard, in directory order.
+
+    Returns:
+        None
+    """
+    manifest = {
+        "header": header,
+        "regexes": regexes,
+        "example": example,
+        "shards": [
+            {"initial": initial, "file": filename, "count": count}
+            for initial, filename, count in shards
+        ],
+    }
+    replace_file(
+        os.path.join(folder, MANIFEST_FILENAME),
+        lambda file: json.dump(manifest, file, ensure_ascii=False, indent=2),
+    )
+
+
+def migrate_to_shards(directory: DirectoryStorage, filename: str) -> int:
+    """
+    Write a loaded directory into a new sharded directory.
+
+    The directory is written to a temporary folder next to it, which then takes
+    its name, so an interrupted migration leaves no partial directory behind.
+
+    Args:
+        directory (DirectoryStorage): The deserialized directory to migrate.
+        filename (str): The name of the folder, which must not exist yet.
+
+    Returns:
+        int: The number of migrated records.
+    """
+    if os.path.exists(filename):
+        raise FileExistsError(f"{filename} already exists.")
+
+    records = directory.get_records()
+    folder = tempfile.mkdtemp(
+        dir=os.path.dirname(os.path.abspath(filename)),
+        prefix=f".{os.path.basename(filename)}.",
+        suffix=".tmp",
+    )
+    try:
+        shards = []
+        for initial, shard_records in groupby(
+            records, key=lambda record: record.last_name[:1]
+        ):
+            shard_records = list(shard_records)
+            shard_filename = f"shard-{ord(initial):04x}.csv" if initial else "shard.csv"
+            replace_file(
+                os.path.join(folder, shard_filename),
+                lambda file: csv.writer(file).writerows(shard_records),
+            )
+            replace_file(
+                os.path.join(folder, get_phones_filename(shard_filename)),
+                lambda file: write_phones(
+                    file, (record.personal_phone for record in shard_records)
+                ),
+            )
+            shards.append((initial, shard_filename, len(shard_records)))
+
+        write_manifest(
+            folder,
+            directory.get_directory_field_names(),
+            directory.regexes,
+            {
+                field_name: directory.get_field_example(field_name)
+                for field_name in directory.get_directory_field_names()
+            },
+            shards,
+        )
+        os.rename(folder, filename)
+    except BaseException:
+        shutil.rmtree(folder)
+        raise
+
+    return len(records)
@@ -0,0 +1,284 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+from array import array
+from record import Record
+from typing import BinaryIO
+from operator import attrgetter
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class SnapshotContents:
+    """
+    Represents the validated contents of a directory file loaded from a snapshot.
+
+    Attributes:
+        header (list[str]): The field names of the directory.
+        regexes (dict[str, str]): The regex pattern of every field.
+        example (dict[str, str]): The example value of every field.
+        records (dict[str, Record]): The records of the directory by personal phone number.
+    """
+
+    header: list[str]
+    regexes: dict[str, str]
+    example: dict[str, str]
+    records: dict[str, Record]
+
+
+class DirectorySnapshot:
+    """
+    A binary sidecar cache of an already validated directory file.
+
+    The snapshot stores the records column by column: for every field a UTF-8
+    blob of all values concatenated together and an array of the value offsets
+    in the decoded text. It is keyed by the size, modification time and hash of
+    the directory file, and is only used while the directory file is unchanged.
+    """
+
+    MAGIC = b"PDSNAP01"
+    PREFIX = struct.Struct("<8sQ")
+    ALIGNMENT = 8
+    OFFSET_SIZE = array("Q").itemsize
+    WRITE_CHUNK_SIZE = 4096
+
+    def __init__(self, filename: str) -> None:
+        """
+        Initialize the DirectorySnapshot instance.
+
+        Args:
+            filename (str): The name of the snapshot file.
+
+        Returns:
+            None
+        """
+        self.filename: str = filename
+
+    @staticmethod
+    def get_fingerprint(directory_filename: str) -> dict:
+        """
+        Get the key identifying the current contents of a directory file.
+
+        Args:
+            directory_filename (str): The name of the directory file.
+
+        Returns:
+            dict: The size, modification time and hash of the file.
+        """
+        stat = os.stat(directory_filename)
+        digest = hashlib.blake2b()
+        with open(directory_filename, "rb") as file:
+            while chunk := file.read(1 << 20):
+                digest.update(chunk)
+
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": digest.hexdigest(),
+        }
+
+    def load(self, fingerprint: dict) -> SnapshotContents | None:
+        """
+        Load the directory contents from the snapshot if it matches the directory file.
+
+        Args:
+            fingerprint (dict): The fingerprint of the current directory file.
+
+        Returns:
+            SnapshotContents | None: The directory contents, or None if the snapshot
+            is missing, unreadable or stale.
+        """
+        try:
+            with open(self.filename, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped_file:
+                return self.__read(mapped_file, fingerprint)
+        except (OSError, ValueError, KeyError, struct.error):
+            return None
+
+    def write(
+        self,
+        fingerprint: dict,
+        header: list[str],
+        regexes: dict[str, str],
+        example: dict[str, str],
+        records: list[Record],
+    ) -> None:
+        """
+        Write a snapshot of validated directory contents.
+
+        The columns are streamed to a temporary file a chunk at a time, so writing
+        the snapshot takes little memory beyond the records themselves, and the
+        file then replaces the old snapshot. Failing to write it is not an error,
+        the directory file is simply parsed again on the next load.
+
+        Args:
+            fingerprint (dict): The fingerprint of the directory file the contents were loaded from.
+            header (list[str]): The field names of the directory.
+            regexes (dict[str, str]): The regex pattern of every field.
+            example (dict[str, str]): The example value of every field.
+            records (list[Record]): The records of the directory.
+
+        Returns:
+            None
+        """
+        getters = [attrgetter(field.name) for field in fields(Record)]
+        columns = []
+        position = 0
+        for get_value in getters:
+            offsets_length = (len(records) + 1) * self.OFFSET_SIZE
+            values_length = sum(
+                len(value) if value.isascii() else len(value.encode("utf-8"))
+                for value in map(get_value, records)
+            )
+            columns.append({"offsets": [position, offsets_length]})
+            position = self.__align(position + offsets_length)
+            columns[-1]["values"] = [position, values_length]
+            position = self.__align(position + values_length)
+
+        metadata = json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "header": header,
+                "regexes": regexes,
+                "example": example,
+                "count": len(records),
+                "columns": columns,
+            }
+        ).encode("utf-8")
+        data_start = self.__align(self.PREFIX.size + len(metadata))
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            descriptor, temporary_filename = tempfile.mkstemp(
+                dir=directory,
+                prefix=f".{os.path.basename(self.filename)}.",
+                suffix=".tmp",
+            )
+        except OSError:
+            return
+
+        try:
+            with open(descriptor, "wb") as file:
+                file.write(self.PREFIX.pack(self.MAGIC, len(metadata)))
+                file.write(metadata)
+                for get_value, column in zip(getters, columns):
+                    file.seek(data_start + column["offsets"][0])
+                    self.__write_offsets(file, records, get_value)
+                    file.seek(data_start + column["values"][0])
+                    self.__write_values(file, records, get_value)
+            os.replace(temporary_filename, self.filename)
+        except OSError:
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
+
+    def __write_offsets(
+        self, file: BinaryIO, records: list[Record], get_value: attrgetter
+    ) -> None:
+        """
+        Write the offsets of the values of a column in its decoded text,
+        WRITE_CHUNK_SIZE records at a time.
+
+        Args:
+            file (BinaryIO): The snapshot file.
+            records (list[Record]): The records of the directory.
+            get_value (attrgetter): Gets the value of the column from a record.
+
+        Returns:
+            None
+        """
+        position = 0
+        file.write(array("Q", [position]).tobytes())
+        for start in range(0, len(records), self.WRITE_CHUNK_SIZE):
+            offsets = array("Q")
+            for value in map(get_value, records[start : start + self.WRITE_CHUNK_SIZE]):
+                position += len(value)
+                offsets.append(position)
+            file.write(offsets.tobytes())
+
+    def __write_values(
+        self, file: BinaryIO, records: list[Record], get_value: attrgetter
+    ) -> None:
+        """
+        Write the UTF-8 encoded values of a column one after the other,
+        WRITE_CHUNK_SIZE records at a time.
+
+        Args:
+            file (BinaryIO): The snapshot file.
+            records (list[Record]): The records of the directory.
+            get_value (attrgetter): Gets the value of the column from a record.
+
+        Returns:
+            None
+        """
+        for start in range(0, len(records), self.WRITE_CHUNK_SIZE):
+            file.write(
+                "".join(
+                    map(get_value, records[start : start + self.WRITE_CHUNK_SIZE])
+                ).encode("utf-8")
+            )
+
+    def __read(
+        self, mapped_file: mmap.mmap, fingerprint: dict
+    ) -> SnapshotContents | None:
+        """
+        Read the directory contents from a memory-mapped snapshot.
+
+        Args:
+            mapped_file (mmap.mmap): The memory-mapped snapshot file.
+            fingerprint (dict): The fingerprint of the current directory file.
+
+        Returns:
+            SnapshotContents | None: The directory contents, or None if the snapshot is stale.
+        """
+        magic, metadata_length = self.PREFIX.unpack_from(mapped_file)
+        if magic != self.MAGIC:
+            return None
+
+        metadata_end = self.PREFIX.size + metadata_length
+        metadata = json.loads(mapped_file[self.PREFIX.size : metadata_end])
+        if metadata["fingerprint"] != fingerprint:
+            return None
+
+        data_start = self.__align(metadata_end)
+        view = memoryview(mapped_file)
+        columns = []
+        try:
+            for column in metadata["columns"]:
+                offsets_start, offsets_length = column["offsets"]
+                values_start, values_length = column["values"]
+                offsets = array("Q")
+                offsets.frombytes(view[data_start + offsets_start :][:offsets_length])
+                values = str(view[data_start + values_start :][:values_length], "utf-8")
+                columns.append(
+                    [values[start:end] for start, end in zip(offsets, offsets[1:])]
+                )
+        finally:
+            view.release()
+
+        records = {}
+        for row in zip(*columns):
+            record = Record(*row)
+            records[record.personal_phone] = record
+
+        if len(records) != metadata["count"]:
+            return None
+
+        return SnapshotContents(
+            metadata["header"], metadata["regexes"], metadata["example"], records
+        )
+
+    def __align(self, position: int) -> int:
+        """
+        Round a position up to the snapshot alignment.
+
+        Args:
+            position (int): The position to align.
+
+        Returns:
+            int: The aligned position.
+        """
+        return (position + self.ALIGNMENT - 1) // self.ALIGNMENT * self.ALIGNMENT
@@ -0,0 +1,305 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterator
+from record import Record
+
+
+class SortedRecords:
+    """
+    A sorted container of records kept in directory order.
+
+    Records are stored in a list of small sorted sublists, so inserting or
+    removing a record only touches one sublist instead of shifting or
+    re-sorting the whole directory. Positional slices are served by walking
+    the sublist lengths, which avoids copying the full list of records.
+
+    Attributes:
+        version (int): The number of changes made to the container, which lets
+            iter_stable tell when its position has to be looked up again.
+    """
+
+    LOAD = 1000
+
+    def __init__(self, records=()) -> None:
+        """
+        Initialize the SortedRecords container.
+
+        Args:
+            records (Iterable[Record]): Records to populate the container with.
+
+        Returns:
+            None
+        """
+        self.keys: list[list[tuple]] = []
+        self.records: list[list[Record]] = []
+        self.maxes: list[tuple] = []
+        self.length: int = 0
+        self.version: int = 0
+        self.update(records)
+
+    def update(self, records) -> int | None:
+        """
+        Bulk insert records into the container with a single sort.
+
+        Args:
+            records (Iterable[Record]): Records to insert.
+
+        Returns:
+            int | None: The lowest position a record was inserted at, or None if
+            there were no records to insert.
+        """
+        pairs = [(record.sort_key(), record) for record in records]
+        if not pairs:
+            return None
+        first_key = min(key for key, _ in pairs)
+        pairs.extend(zip(self.iter_keys(), self))
+        pairs.sort(key=lambda pair: pair[0])
+        self.__rebuild(pairs)
+        return bisect_left(pairs, first_key, key=lambda pair: pair[0])
+
+    def remove_many(self, records) -> int | None:
+        """
+        Bulk remove records from the container in one pass.
+
+        Records that are not in the container are ignored.
+
+        Args:
+            records (Iterable[Record]): Records to remove.
+
+        Returns:
+            int | None: The lowest position a record was removed from, or None if
+            no record was removed.
+        """
+        removed_keys = {record.sort_key() for record in records}
+        pairs = []
+        first_position = None
+        for key, record in zip(self.iter_keys(), self):
+            if key not in removed_keys:
+                pairs.append((key, record))
+            elif first_position is None:
+                first_position = len(pairs)
+
+        if first_position is not None:
+            self.__rebuild(pairs)
+        return first_position
+
+    def add(self, record: Record) -> int:
+        """
+        Insert a record at its sorted position.
+
+        Args:
+            record (Record): The record to insert.
+
+        Returns:
+            int: The position the record was inserted at.
+        """
+        key = record.sort_key()
+        if not self.maxes:
+            self.keys.append([key])
+            self.records.append([record])
+            self.maxes.append(key)
+            self.length = 1
+            self.version += 1
+            return 0
+
+        position = bisect_right(self.maxes, key)
+        if position == len(self.maxes):
+            position -= 1
+            self.maxes[position] = key
+
+        keys = self.keys[position]
+        index = bisect_right(keys, key)
+        keys.insert(index, key)
+        self.records[position].insert(index, record)
+        self.length += 1
+        inserted_at = self.__get_offset(position) + index
+
+        if len(keys) > 2 * self.LOAD:
+            self.__split(position)
+
+        self.version += 1
+        return inserted_at
+
+    def remove(self, record: Record) -> int:
+        """
+        Remove a record from the container.
+
+        Args:
+            record (Record): The record to remove.
+
+        Returns:
+            int: The position the record was removed from.
+
+        Raises:
+            ValueError: If the record is not in the container.
+        """
+        key = record.sort_key()
+        position = bisect_left(self.maxes, key)
+        if position == len(self.maxes):
+            raise ValueError("Record is not in the container.")
+
+        keys = self.keys[position]
+        index = bisect_left(keys, key)
+        if index == len(keys) or keys[index] != key:
+            raise ValueError("Record is not in the container.")
+
+        removed_from = self.__get_offset(position) + index
+        del keys[index]
+        del self.records[position][index]
+        self.length -= 1
+
+        if not keys:
+            del self.keys[position]
+            del self.records[position]
+            del self.maxes[position]
+        else:
+            self.maxes[position] = keys[-1]
+
+        self.version += 1
+        return removed_from
+
+    def get_slice(self, start: int, end: int) -> list[Record]:
+        """
+        Get the records between two positions in sorted order.
+
+        Args:
+            start (int): The start position (inclusive).
+            end (int): The end position (exclusive).
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+        start, end = max(start, 0), min(end, self.length)
+        page: list[Record] = []
+        offset = 0
+        for records in self.records:
+            if offset + len(records) <= start:
+                offset += len(records)
+                continue
+            if offset >= end:
+                break
+            page.extend(records[max(start - offset, 0) : end - offset])
+            offset += len(records)
+        return page
+
+    def iter_keys(self) -> Iterator[tuple]:
+        """
+        Iterate over the sort keys in sorted order.
+
+        Returns:
+            Iterator[tuple]: An iterator over the sort keys.
+        """
+        for keys in self.keys:
+            yield from keys
+
+    def iter_stable(self) -> Iterator[Record]:
+        """
+        Iterate over the records in sorted order, lazily and unbroken by changes
+        made to the container meanwhile.
+
+        The sublists are walked directly while the container is unchanged. After
+        a change, also one made by another thread, the walk continues after the
+        last yielded record, so records added or removed behind that point are
+        skipped and the ones ahead of it are seen.
+
+        Returns:
+            Iterator[Record]: An iterator over the records in sorted order.
+        """
+        version = self.version
+        position, index = 0, 0
+        last_record = None
+        while True:
+            if version != self.version:
+                version = self.version
+                position, index = self.__locate_after(last_record)
+            sublists = self.records
+            if position >= len(sublists):
+                return
+            records = sublists[position]
+            if index >= len(records):
+                position, index = position + 1, 0
+                continue
+            last_record = records[index]
+            yield last_record
+            index += 1
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Record]:
+        for records in self.records:
+            yield from records
+
+    def __locate_after(self, record: Record | None) -> tuple[int, int]:
+        """
+        Find the sublist and index of the first record sorted after a record.
+
+        Args:
+            record (Record | None): The record, or None for the first record.
+
+        Returns:
+            tuple[int, int]: The position of the sublist and the index in it.
+        """
+        if record is None:
+            return 0, 0
+        key = record.sort_key()
+        keys, maxes = self.keys, self.maxes
+        position = bisect_right(maxes, key)
+        if position >= len(keys):
+            return len(keys), 0
+        return position, bisect_right(keys[position], key)
+
+    def __get_offset(self, position: int) -> int:
+        """
+        Get the number of records stored in the sublists before a sublist.
+
+        Args:
+            position (int): The position of the sublist.
+
+        Returns:
+            int: The position of the first record of the sublist.
+        """
+        return sum(len(records) for records in self.records[:position])
+
+    def __rebuild(self, pairs: list[tuple[tuple, Record]]) -> None:
+        """
+        Replace the contents of the container with sorted (key, record) pairs.
+
+        Args:
+            pairs (list[tuple[tuple, Record]]): The pairs in sorted order.
+
+        Returns:
+            None
+        """
+        keys, records, maxes = [], [], []
+        for start in range(0, len(pairs), self.LOAD):
+            chunk = pairs[start : start + self.LOAD]
+            keys.append([key for key, _ in chunk])
+            records.append([record for _, record in chunk])
+            maxes.append(chunk[-1][0])
+        # Replaced in one statement, so a reader in another thread sees either
+        # the old or the new contents.
+        self.keys, self.records, self.maxes, self.length, self.version = (
+            keys,
+            records,
+            maxes,
+            len(pairs),
+            self.version + 1,
+        )
+
+    def __split(self, position: int) -> None:
+        """
+        Split an oversized sublist in two halves.
+
+        Args:
+            position (int): The position of the sublist to split.
+
+        Returns:
+            None
+        """
+        keys, records = self.keys[position], self.records[position]
+        self.keys[position : position + 1] = [keys[: self.LOAD], keys[self.LOAD :]]
+        self.records[position : position + 1] = [
+            records[: self.LOAD],
+            records[self.LOAD :],
+        ]
+        self.maxes[position : position + 1] = [keys[self.LOAD - 1], keys[-1]]
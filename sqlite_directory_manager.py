@@ -0,0 +1,986 @@
+import os
+import json
+import errno
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable, Iterator
+from record import Record
+from validator import RecordValidator
+from history import Change, History
+from directory_storage import DirectoryStorage, ImportSummary
+from config import VALIDATION_BATCH_SIZE, HISTORY_STEPS
+from errors import (
+    DirectoryLockedError,
+    NotUniquePersonalNumber,
+    RecordDoesNotExist,
+    RecordValidationError,
+)
+from search_index import FieldIndex, PhoneDigitIndex, BKTree
+from query import (
+    PHONE_DIGITS_FIELD,
+    FUZZY_FIELDS,
+    Term,
+    Not,
+    And,
+    Or,
+    is_structured_query,
+    parse_query,
+)
+from search_result import SearchResult
+
+RECORD_COLUMNS = (
+    "last_name",
+    "first_name",
+    "middle_name",
+    "organization",
+    "work_phone",
+    "personal_phone",
+)
+SORT_COLUMNS = "last_name, first_name, middle_name, organization, personal_phone"
+SELECT_RECORDS = f"SELECT {', '.join(RECORD_COLUMNS)} FROM records"
+SELECT_PENDING_RECORDS = f"SELECT {', '.join(RECORD_COLUMNS)} FROM temp.pending_records"
+NOT_PENDING = "personal_phone NOT IN (SELECT personal_phone FROM temp.pending_keys)"
+SEARCH_CHUNK_SIZE = 256
+
+
+def get_record_text(table: str) -> str:
+    """
+    Build the SQL expression of the searchable text of a record.
+
+    Args:
+        table (str): The table or trigger row the record columns are read from.
+
+    Returns:
+        str: The expression joining all record columns with spaces, the same
+        text as TrigramIndex.get_record_text.
+    """
+    return " || ' ' || ".join(f"{table}.{column}" for column in RECORD_COLUMNS)
+
+
+TABLES_SCHEMA = f"""
+CREATE TABLE fields (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    regex TEXT NOT NULL,
+    example TEXT NOT NULL
+);
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    {", ".join(f"{column} TEXT NOT NULL" for column in RECORD_COLUMNS)}
+);
+CREATE VIRTUAL TABLE records_text USING fts5 (
+    text, tokenize = 'trigram case_sensitive 1'
+);
+"""
+
+# Created once the records of a migrated directory are inserted, as building an
+# index in one go is faster than updating it for every inserted record.
+INDEXES_SCHEMA = f"""
+CREATE UNIQUE INDEX records_personal_phone ON records (personal_phone);
+CREATE INDEX records_sort_key ON records ({SORT_COLUMNS});
+CREATE INDEX records_first_name ON records (first_name);
+CREATE INDEX records_organization ON records (organization);
+CREATE TRIGGER records_text_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_text (rowid, text) VALUES (new.id, {get_record_text("new")});
+END;
+CREATE TRIGGER records_text_update AFTER UPDATE ON records BEGIN
+    UPDATE records_text SET text = {get_record_text("new")} WHERE rowid = new.id;
+END;
+CREATE TRIGGER records_text_delete AFTER DELETE ON records BEGIN
+    DELETE FROM records_text WHERE rowid = old.id;
+END;
+"""
+
+# The unsaved changes of a connection: the personal phone numbers of all added,
+# edited and deleted records, and the added and edited records.
+PENDING_SCHEMA = f"""
+CREATE TEMP TABLE pending_keys (personal_phone TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TEMP TABLE pending_records (
+    {", ".join(f"{column} TEXT NOT NULL" for column in RECORD_COLUMNS)}
+);
+CREATE UNIQUE INDEX temp.pending_records_personal_phone ON pending_records (personal_phone);
+CREATE INDEX temp.pending_records_sort_key ON pending_records ({SORT_COLUMNS});
+"""
+
+
+class SqliteDirectoryManager(DirectoryStorage):
+    """
+    A class to manage a directory of records stored in a SQLite database.
+
+    Records stay on disk and are only read as far as a page or a search needs.
+    The personal phone numbers are kept unique by a unique index, the directory
+    order is read from an index on the sort key, and substring searches are
+    answered by an FTS5 table with a trigram tokenizer.
+
+    Changes are kept in temporary tables of the connection, which reads merge
+    over the saved records, until a save writes them in one short transaction.
+    Quitting without saving discards them, and other processes can change and
+    save the database in the meantime without waiting for this one.
+
+    Attributes:
+        connection (sqlite3.Connection | None): The database connection, or None
+            before the directory is deserialized.
+        records_count (int): The number of records in the directory.
+        page_boundaries (dict[int, tuple[str, ...]]): The sort keys of the records
+            before the page starts read so far, by page start, so the next page
+            is read from the sort index instead of skipping all records before it.
+        name_tree (BKTree | None): The last and first names used so far, built on
+            the first fuzzy search. Names are never removed from it.
+        data_version (int): The data version of the database when the records
+            count was last read, which other connections' commits change.
+        pending_changes (bool): Whether the temporary tables hold unsaved changes.
+        history (History): The changes that can be undone and redone.
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Initialize the SqliteDirectoryManager instance.
+
+        Args:
+            filename (str): The name of the database file to manage.
+
+        Returns:
+            None
+        """
+        super().__init__(filename)
+        self.connection: sqlite3.Connection | None = None
+        self.records_count: int = 0
+        self.page_boundaries: dict[int, tuple[str, ...]] = {}
+        self.name_tree: BKTree | None = None
+        self.data_version: int = 0
+        self.pending_changes: bool = False
+        self.history: History = History(HISTORY_STEPS)
+
+    def deserialize_directory(
+        self, parallel: bool = False, workers: int | None = None
+    ) -> None:
+        """
+        Open the database and read the fields of the directory.
+
+        The records were validated when they were stored, so none is read here.
+
+        Args:
+            parallel (bool): Unused, there is nothing to validate on load.
+            workers (int | None): Unused.
+
+        Returns:
+            None
+        """
+        # Connecting would create a missing file as an empty database.
+        if not os.path.exists(self.filename):
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), self.filename
+            )
+
+        # In autocommit mode a read holds no lock on the database once it is
+        # done, so only a save can make other processes wait.
+        self.connection = sqlite3.connect(self.filename, isolation_level=None)
+        self.connection.create_function(
+            "phone_digits", 1, PhoneDigitIndex.normalize, deterministic=True
+        )
+
+        try:
+            fields = self.connection.execute(
+                "SELECT name, regex, example FROM fields ORDER BY position"
+            ).fetchall()
+            self.connection.executescript(PENDING_SCHEMA)
+            self.pending_changes = False
+            self.records_count = self.__count_records()
+        except sqlite3.DatabaseError:
+            raise RecordValidationError(
+                f"{self.filename} is not a phone directory database. Migrate a CSV directory into it and restart the application."
+            )
+
+        self.header = [name for name, _, _ in fields]
+        self.regexes = {name: regex for name, regex, _ in fields}
+        self.example = {name: example for name, _, example in fields}
+        self.validator = RecordValidator(self.header, self.regexes)
+        self.page_boundaries = {}
+        self.name_tree = None
+        self.data_version = self.__get_data_version()
+
+    def serialize_directory(self) -> bool:
+        """
+        Save the directory changes made since the last save.
+
+        The unsaved records replace the saved ones under their personal phone
+        numbers in a single transaction. Records another process saved under
+        the same numbers in the meantime are overwritten.
+
+        Returns:
+            bool: True if there were changes to save, False otherwise.
+
+        Raises:
+            DirectoryLockedError: If another process kept the database locked
+                for longer than the busy timeout. The changes stay unsaved.
+        """
+        if not self.pending_changes:
+            return False
+
+        try:
+            with self.__transaction("BEGIN IMMEDIATE"):
+                self.connection.execute(
+                    "DELETE FROM records WHERE personal_phone IN "
+                    "(SELECT personal_phone FROM temp.pending_keys)"
+                )
+                self.connection.execute(
+                    f"INSERT INTO records ({', '.join(RECORD_COLUMNS)}) "
+                    f"{SELECT_PENDING_RECORDS} ORDER BY {SORT_COLUMNS}"
+                )
+                self.connection.execute("DELETE FROM temp.pending_keys")
+                self.connection.execute("DELETE FROM temp.pending_records")
+        except sqlite3.OperationalError as e:
+            if e.sqlite_errorcode & 0xFF not in (
+                sqlite3.SQLITE_BUSY,
+                sqlite3.SQLITE_LOCKED,
+            ):
+                raise
+            raise DirectoryLockedError(
+                f"{self.filename} is locked by another process. The changes are not saved yet, try saving again."
+            ) from e
+
+        self.pending_changes = False
+        return True
+
+    def reload_directory(self) -> bool:
+        """
+        Pick up the changes other processes committed to the database.
+
+        The records are read from the database anyway, so only the cached
+        records count and page boundaries are refreshed.
+
+        Returns:
+            bool: True if another connection committed changes, False otherwise.
+        """
+        data_version = self.__get_data_version()
+        if data_version == self.data_version:
+            return False
+
+        self.data_version = data_version
+        self.records_count = self.__count_records()
+        self.page_boundaries = {}
+        self.mark_changed_position(0)
+        return True
+
+    def has_unsaved_changes(self) -> bool:
+        """
+        Check if the directory was changed since the last save.
+
+        Returns:
+            bool: True if some records were added, edited or deleted, False otherwise.
+        """
+        return self.pending_changes
+
+    def get_records(self) -> list[Record]:
+        """
+        Get a sorted list of all records in the directory.
+
+        Returns:
+            list[Record]: A list of all records.
+        """
+        return self.__select_records(self.__build_conditions(None))
+
+    def get_records_page(self, start_index: int, end_index: int) -> list[Record]:
+        """
+        Get a sorted slice of the records in the directory without reading all of them.
+
+        A slice starting where an earlier one ended is read from the sort index
+        after the last record of that slice. Other slices skip the records before
+        them with OFFSET.
+
+        Args:
+            start_index (int): The index of the first record of the slice.
+            end_index (int): The index after the last record of the slice.
+
+        Returns:
+            list[Record]: The records in the requested range.
+        """
+        limit = max(end_index - start_index, 0)
+        conditions = self.__build_conditions(None)
+        boundary = self.page_boundaries.get(start_index)
+        if boundary is None:
+            records = self.__select_records(conditions, limit=limit, offset=start_index)
+        else:
+            records = self.__select_records(conditions, after_key=boundary, limit=limit)
+
+        if records:
+            self.page_boundaries[start_index + len(records)] = records[-1].sort_key()
+        return records
+
+    def get_records_count(self) -> int:
+        """
+        Get the number of records in the directory.
+
+        Returns:
+            int: The number of records.
+        """
+        return self.records_count
+
+    def get_record(self, records_personal_number: str) -> Record:
+        """
+        Get a record by its personal phone number.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The record with that personal phone number.
+        """
+        records_personal_number = self.format_personal_phone(records_personal_number)
+        record = self.__find_existing_records([records_personal_number]).get(
+            records_personal_number
+        )
+        if record is None:
+            raise RecordDoesNotExist(
+                f"Record with that personal number does not exist."
+            )
+
+        return record
+
+    def add_record(self, record: Record) -> None:
+        """
+        Add a new record to the directory.
+
+        Args:
+            record (Record): The record to add.
+
+        Returns:
+            None
+        """
+        if self.is_number_already_in_directory(record.personal_phone):
+            raise NotUniquePersonalNumber(
+                f"Record with that personal number already exist in the directory."
+            )
+
+        self.__restore_records({record.personal_phone: record})
+        self.history.record([Change(record.personal_phone, None, record)])
+
+    def add_numbered_rows(
+        self,
+        numbered_rows: Iterable[tuple[int, Iterable[str]]],
+        on_conflict: str,
+        row_label: str,
+        validated: bool = False,
+    ) -> ImportSummary:
+        """
+        Add rows of field values to the directory, all of them or none.
+
+        Every batch is validated and its conflicts resolved against the records
+        of the directory and of the earlier batches. Nothing is stored before
+        all rows are, so a failing row leaves the directory unchanged.
+
+        Args:
+            numbered_rows (Iterable[tuple[int, Iterable[str]]]): The rows with the
+                numbers they are reported by in error messages.
+            on_conflict (str): One of CONFLICT_POLICIES.
+            row_label (str): What the row numbers count in error messages.
+            validated (bool): The rows were already checked by validate_numbered_rows.
+
+        Returns:
+            ImportSummary: The number of added, overwritten and skipped records.
+        """
+        if on_conflict not in self.CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {on_conflict!r}.")
+
+        summary = ImportSummary()
+        imported_records: dict[str, Record] = {}
+        original_records: dict[str, Record | None] = {}
+        rows_iterator = iter(numbered_rows)
+        while batch := list(islice(rows_iterator, VALIDATION_BATCH_SIZE)):
+            rows = [list(row) for _, row in batch]
+            invalid_row_index = (
+                None if validated else self.validator.validate_many(rows)
+            )
+            if invalid_row_index is not None:
+                raise RecordValidationError(
+                    f"{row_label} {batch[invalid_row_index][0]} does not match the regexes of the directory."
+                )
+
+            existing_records = self.__find_existing_records([row[-1] for row in rows])
+            for (row_number, _), row in zip(batch, rows):
+                record = Record(*row)
+                key = record.personal_phone
+                if key in imported_records or key in existing_records:
+                    if on_conflict == self.FAIL:
+                        raise NotUniquePersonalNumber(
+                            f"{row_label} {row_number}: record with that personal number already exist in the directory."
+                        )
+                    if on_conflict == self.SKIP:
+                        summary.skipped += 1
+                        continue
+                    summary.overwritten += 1
+                else:
+                    summary.added += 1
+                original_records.setdefault(key, existing_records.get(key))
+                imported_records[key] = record
+
+        self.__restore_records(dict(imported_records))
+        self.history.record(
+            [
+                Change(key, original_records[key], record)
+                for key, record in imported_records.items()
+            ]
+        )
+        return summary
+
+    def delete_record(self, records_personal_number: str) -> Record:
+        """
+        Delete a record from the directory.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to delete,
+                either formatted or as ten digits with any punctuation.
+
+        Returns:
+            Record: The deleted record.
+        """
+        deleted_record = self.get_record(records_personal_number)
+        self.__restore_records({deleted_record.personal_phone: None})
+        self.history.record(
+            [Change(deleted_record.personal_phone, deleted_record, None)]
+        )
+        return deleted_record
+
+    def replace_record(self, records_personal_number: str, record: Record) -> Record:
+        """
+        Replace a record with an edited one in a single step.
+
+        Args:
+            records_personal_number (str): The personal phone number of the record to replace,
+                either formatted or as ten digits with any punctuation.
+            record (Record): The edited record, possibly with another personal phone number.
+
+        Returns:
+            Record: The replaced record.
+
+        Raises:
+            RecordDoesNotExist: If no record has that personal phone number.
+            NotUniquePersonalNumber: If another record has the edited personal
+                phone number. The directory is then left unchanged.
+        """
+        replaced_record = self.get_record(records_personal_number)
+        if (
+            record.personal_phone != replaced_record.personal_phone
+            and self.is_number_already_in_directory(record.personal_phone)
+        ):
+            raise NotUniquePersonalNumber(
+                f"Record with that personal number already exist in the directory."
+            )
+
+        changes = {replaced_record.personal_phone: None, record.personal_phone: record}
+        before = {replaced_record.personal_phone: replaced_record}
+        self.history.record(
+            [
+                Change(key, before.get(key), after)
+                for key, after in changes.items()
+                if before.get(key) != after
+            ]
+        )
+        self.__restore_records(changes)
+        return replaced_record
+
+    def undo(self) -> bool:
+        """
+        Revert the latest add, delete, edit or import not undone yet.
+
+        The records the change replaced are restored as unsaved changes, so they
+        are saved like any other change.
+
+        Returns:
+            bool: True if a change was undone, False if there is nothing to undo.
+        """
+        changes = self.history.undo()
+        if changes is None:
+            return False
+        self.__restore_records(changes)
+        return True
+
+    def redo(self) -> bool:
+        """
+        Apply the latest undone change again, unless something was changed since.
+
+        Returns:
+            bool: True if a change was redone, False if there is nothing to redo.
+        """
+        changes = self.history.redo()
+        if changes is None:
+            return False
+        self.__restore_records(changes)
+        return True
+
+    def __restore_records(self, changes: dict[str, Record | None]) -> None:
+        """
+        Store records under their personal phone numbers as unsaved changes,
+        replacing the stored ones.
+
+        Args:
+            changes (dict[str, Record | None]): The records to store by personal
+                phone number, None for the ones to delete.
+
+        Returns:
+            None
+        """
+        existing_records = self.__find_existing_records(list(changes))
+        changes = {
+            key: record
+            for key, record in changes.items()
+            if existing_records.get(key) != record
+        }
+        if not changes:
+            return
+
+        stored_records = [record for record in changes.values() if record is not None]
+        keys = json.dumps(list(changes))
+        with self.__transaction():
+            self.connection.execute(
+                "INSERT OR IGNORE INTO temp.pending_keys (personal_phone) "
+                "SELECT value FROM json_each(?)",
+                (keys,),
+            )
+            self.connection.execute(
+                "DELETE FROM temp.pending_records WHERE personal_phone IN "
+                "(SELECT value FROM json_each(?))",
+                (keys,),
+            )
+            self.connection.executemany(
+                f"INSERT INTO temp.pending_records ({', '.join(RECORD_COLUMNS)}) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(record) for record in stored_records],
+            )
+        self.pending_changes = True
+
+        removed_count = sum(key in existing_records for key in changes)
+        self.records_count += len(stored_records) - removed_count
+        self.__add_names(stored_records)
+        self.__mark_changed_key(
+            min(
+                record.sort_key()
+                for record in [*stored_records, *existing_records.values()]
+                if record.personal_phone in changes
+            )
+        )
+
+    def search_records(self, search_string: str) -> SearchResult:
+        """
+        Search for records based on a search string.
+
+        A plain search string matches records containing it as a substring, and a
+        string of digits also matches phone numbers containing those digits. Search
+        strings using the query syntax of query.parse_query are translated into a
+        single SQL condition. Matches are read from the database in directory
+        order SEARCH_CHUNK_SIZE at a time, as far as the shown pages require,
+        so no statement stays open between the chunks.
+
+        The digits of the phone numbers are not indexed, so phone digit terms
+        scan all records, in time linear in the size of the directory.
+
+        Args:
+            search_string (str): The search string.
+
+        Returns:
+            SearchResult: The search result cursor over the matched records.
+
+        Raises:
+            QuerySyntaxError: If the search string is an invalid query.
+        """
+        if is_structured_query(search_string):
+            query = parse_query(search_string)
+        elif search_string.isdigit():
+            query = Or(
+                [Term(None, search_string), Term(PHONE_DIGITS_FIELD, search_string)]
+            )
+        else:
+            query = Term(None, search_string)
+
+        conditions = self.__build_conditions(query)
+        return SearchResult(search_string, self.__iter_matches(conditions))
+
+    def __iter_matches(
+        self, conditions: tuple[tuple[str, list], tuple[str, list]]
+    ) -> Iterator[Record]:
+        """
+        Iterate over the records matching a condition, reading them in chunks
+        that each continue after the last record of the chunk before.
+
+        Args:
+            conditions (tuple[tuple[str, list], tuple[str, list]]): The conditions
+                on the saved and the unsaved records, see __build_conditions.
+
+        Returns:
+            Iterator[Record]: An iterator over the matched records in directory order.
+        """
+        after_key = None
+        while True:
+            records = self.__select_records(
+                conditions, after_key=after_key, limit=SEARCH_CHUNK_SIZE
+            )
+            yield from records
+            if len(records) < SEARCH_CHUNK_SIZE:
+                return
+            after_key = records[-1].sort_key()
+
+    def find_similar_names(
+        self, name: str, max_distance: int, field_name: str | None = None
+    ) -> list[tuple[int, str]]:
+        """
+        Find the last or first names in the directory within an edit distance of a name.
+
+        Args:
+            name (str): The name to search for.
+            max_distance (int): The maximum edit distance.
+            field_name (str | None): 'last_name' or 'first_name', or None for both.
+
+        Returns:
+            list[tuple[int, str]]: The found names with their distances, nearest first.
+        """
+        if self.name_tree is None:
+            self.name_tree = BKTree()
+            self.__add_names(
+                Record(last_name, first_name, "", "", "", "")
+                for last_name, first_name in self.connection.execute(
+                    "SELECT last_name, first_name FROM records UNION ALL "
+                    "SELECT last_name, first_name FROM temp.pending_records"
+                )
+            )
+
+        field_names = FUZZY_FIELDS if field_name is None else (field_name,)
+        condition = " OR ".join(f"{field} = ?1" for field in field_names)
+        return [
+            (distance, found_name)
+            for distance, found_name in self.name_tree.search(name, max_distance)
+            if self.connection.execute(
+                f"SELECT EXISTS (SELECT 1 FROM records WHERE ({condition}) AND {NOT_PENDING}) "
+                f"OR EXISTS (SELECT 1 FROM temp.pending_records WHERE {condition})",
+                (found_name,),
+            ).fetchone()[0]
+        ]
+
+    def is_number_already_in_directory(self, personal_phone_number: str) -> bool:
+        """
+        Check if a personal phone number already exists in the directory.
+
+        Args:
+            personal_phone_number (str): The personal phone number to check.
+
+        Returns:
+            bool: True if the number already exists, False otherwise.
+        """
+        return personal_phone_number in self.__find_existing_records(
+            [personal_phone_number]
+        )
+
+    def __select_records(
+        self,
+        conditions: tuple[tuple[str, list], tuple[str, list]],
+        after_key: tuple[str, ...] | None = None,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[Record]:
+        """
+        Read the records matching a condition in directory order, the unsaved
+        records merged over the saved ones.
+
+        Args:
+            conditions (tuple[tuple[str, list], tuple[str, list]]): The conditions
+                on the saved and the unsaved records, see __build_conditions.
+            after_key (tuple[str, ...] | None): Only read records sorted after this key.
+            limit (int | None): The maximum number of records to read, or None for all.
+            offset (int): The number of matching records to skip.
+
+        Returns:
+            list[Record]: The read records.
+        """
+        (records_condition, records_parameters), (
+            pending_condition,
+            pending_parameters,
+        ) = conditions
+        after_condition = ""
+        after_parameters = []
+        if after_key is not None:
+            after_condition = f" AND ({SORT_COLUMNS}) > (?, ?, ?, ?, ?)"
+            after_parameters = list(after_key)
+
+        if self.pending_changes:
+            sql = (
+                f"{SELECT_RECORDS} WHERE {records_condition} AND {NOT_PENDING}{after_condition} "
+                f"UNION ALL {SELECT_PENDING_RECORDS} WHERE {pending_condition}{after_condition}"
+            )
+            parameters = [
+                *records_parameters,
+                *after_parameters,
+                *pending_parameters,
+                *after_parameters,
+            ]
+        else:
+            sql = f"{SELECT_RECORDS} WHERE {records_condition}{after_condition}"
+            parameters = [*records_parameters, *after_parameters]
+
+        sql += f" ORDER BY {SORT_COLUMNS}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            parameters += [limit, offset]
+        return [Record(*row) for row in self.connection.execute(sql, parameters)]
+
+    def __build_conditions(
+        self, query: Term | Not | And | Or | None
+    ) -> tuple[tuple[str, list], tuple[str, list]]:
+        """
+        Translate a query into SQL conditions on the saved and on the unsaved records.
+
+        Args:
+            query (Term | Not | And | Or | None): The query, or None for all records.
+
+        Returns:
+            tuple[tuple[str, list], tuple[str, list]]: The condition on the records
+            table and the one on the unsaved records table, each with its parameters.
+        """
+        if query is None:
+            return ("1", []), ("1", [])
+        return (
+            self.__build_condition(query, "records"),
+            self.__build_condition(query, "pending_records"),
+        )
+
+    def __build_condition(
+        self, node: Term | Not | And | Or, table: str
+    ) -> tuple[str, list]:
+        """
+        Translate a query node into an SQL condition on a records table.
+
+        Args:
+            node (Term | Not | And | Or): The query node to translate.
+            table (str): 'records', whose substrings are indexed in the FTS5
+                table, or 'pending_records'.
+
+        Returns:
+            tuple[str, list]: The condition and its parameters.
+        """
+        if isinstance(node, Term) and node.fuzzy is not None:
+            field_names = FUZZY_FIELDS if node.field is None else (node.field,)
+            names = [
+                name
+                for _, name in self.find_similar_names(
+                    node.value, node.fuzzy, node.field
+                )
+            ]
+            conditions = [
+                f"{field} IN (SELECT value FROM json_each(?))" for field in field_names
+            ]
+            return f"({' OR '.join(conditions)})", [json.dumps(names)] * len(
+                field_names
+            )
+
+        if isinstance(node, Term) and node.field == PHONE_DIGITS_FIELD:
+            digits = PhoneDigitIndex.normalize(node.value)
+            return (
+                "(instr(phone_digits(personal_phone), ?) > 0 "
+                "OR instr(phone_digits(work_phone), ?) > 0)",
+                [digits, digits],
+            )
+
+        if isinstance(node, Term) and node.field is not None:
+            # The field comes from query.FIELD_ALIASES, never from the user.
+            if node.prefix:
+                return f"({node.field} >= ? AND {node.field} < ?)", [
+                    node.value,
+                    node.value + FieldIndex.MAX_CHARACTER,
+                ]
+            return f"{node.field} = ?", [node.value]
+
+        if isinstance(node, Term):
+            # Trigrams only index substrings of three or more characters.
+            if table == "records" and len(node.value) >= 3:
+                phrase = '"' + node.value.replace('"', '""') + '"'
+                return (
+                    "id IN (SELECT rowid FROM records_text WHERE records_text MATCH ?)",
+                    [phrase],
+                )
+            return f"instr({get_record_text(table)}, ?) > 0", [node.value]
+
+        if isinstance(node, Not):
+            condition, parameters = self.__build_condition(node.operand, table)
+            return f"NOT {condition}", parameters
+
+        conditions = []
+        parameters = []
+        for operand in node.operands:
+            operand_condition, operand_parameters = self.__build_condition(
+                operand, table
+            )
+            conditions.append(operand_condition)
+            parameters.extend(operand_parameters)
+        operator = " AND " if isinstance(node, And) else " OR "
+        return f"({operator.join(conditions)})", parameters
+
+    @contextmanager
+    def __transaction(self, begin: str = "BEGIN") -> Iterator[None]:
+        """
+        Run statements in a transaction, rolled back if one of them fails.
+
+        Args:
+            begin (str): The statement beginning the transaction.
+
+        Returns:
+            Iterator[None]: The context of the transaction.
+        """
+        self.connection.execute(begin)
+        try:
+            yield
+            self.connection.execute("COMMIT")
+        except BaseException:
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            raise
+
+    def __count_records(self) -> int:
+        """
+        Count the saved records not changed since the last save and the unsaved ones.
+
+        Returns:
+            int: The number of records.
+        """
+        if not self.pending_changes:
+            return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        return self.connection.execute(
+            f"SELECT (SELECT COUNT(*) FROM records WHERE {NOT_PENDING}) "
+            "+ (SELECT COUNT(*) FROM temp.pending_records)"
+        ).fetchone()[0]
+
+    def __get_data_version(self) -> int:
+        """
+        Get the data version of the database, which changes whenever another
+        connection commits.
+
+        Returns:
+            int: The data version.
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def __find_existing_records(
+        self, personal_phone_numbers: list[str]
+    ) -> dict[str, Record]:
+        """
+        Find the records of some personal phone numbers already in the directory,
+        saved or not.
+
+        Args:
+            personal_phone_numbers (list[str]): The personal phone numbers to look up.
+
+        Returns:
+            dict[str, Record]: The records found, by personal phone number.
+        """
+        sql = f"{SELECT_RECORDS} WHERE personal_phone IN (SELECT value FROM json_each(?1))"
+        if self.pending_changes:
+            sql = (
+                f"{SELECT_PENDING_RECORDS} WHERE personal_phone IN "
+                f"(SELECT value FROM json_each(?1)) UNION ALL {sql} AND {NOT_PENDING}"
+            )
+        cursor = self.connection.execute(sql, (json.dumps(personal_phone_numbers),))
+        return {row[-1]: Record(*row) for row in cursor}
+
+    def __add_names(self, records: Iterable[Record]) -> None:
+        """
+        Add the last and first names of records to the name tree, if it is built.
+
+        Args:
+            records (Iterable[Record]): The added records.
+
+        Returns:
+            None
+        """
+        if self.name_tree is None:
+            return
+        names = set()
+        for record in records:
+            names.add(record.last_name)
+            names.add(record.first_name)
+        for name in names:
+            self.name_tree.add(name)
+
+    def __mark_changed_key(self, sort_key: tuple[str, ...]) -> None:
+        """
+        Remember the sorted position of an added, edited or deleted record.
+
+        Counting the records before it would read all of them, so the start of
+        the latest page read so far that begins before the record stands in for
+        its position. Page boundaries after that start may have moved, so they
+        are dropped.
+
+        Args:
+            sort_key (tuple[str, ...]): The sort key of the changed record.
+
+        Returns:
+            None
+        """
+        self.page_boundaries = {
+            start: boundary
+            for start, boundary in self.page_boundaries.items()
+            if tuple(boundary) < sort_key
+        }
+        self.mark_changed_position(max(self.page_boundaries, default=0))
+
+
+def migrate_directory(directory: DirectoryStorage, filename: str) -> int:
+    """
+    Write a loaded directory into a new SQLite database.
+
+    The database is written to a temporary file next to it, which then takes
+    its name, so an interrupted migration leaves no partial database behind.
+
+    Args:
+        directory (DirectoryStorage): The deserialized directory to migrate.
+        filename (str): The name of the database file, which must not exist yet.
+
+    Returns:
+        int: The number of migrated records.
+    """
+    if os.path.exists(filename):
+        raise FileExistsError(f"{filename} already exists.")
+
+    records = directory.get_records()
+    file_descriptor, temporary_filename = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filename)),
+        prefix=f".{os.path.basename(filename)}.",
+        suffix=".tmp",
+    )
+    os.close(file_descriptor)
+    try:
+        connection = sqlite3.connect(temporary_filename)
+        try:
+            connection.executescript(TABLES_SCHEMA)
+            with connection:
+                connection.executemany(
+                    "INSERT INTO fields (position, name, regex, example) VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            position,
+                            field_name,
+                            directory.regexes[field_name],
+                            directory.get_field_example(field_name),
+                        )
+                        for position, field_name in enumerate(
+                            directory.get_directory_field_names()
+                        )
+                    ],
+                )
+                # Inserted in directory order, so reading a page touches few database pages.
+                connection.executemany(
+                    f"INSERT INTO records ({', '.join(RECORD_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    [tuple(record) for record in records],
+                )
+                connection.execute(
+                    "INSERT INTO records_text (rowid, text) "
+                    f"SELECT id, {get_record_text('records')} FROM records"
+                )
+            connection.executescript(INDEXES_SCHEMA)
+        finally:
+            connection.close()
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        os.remove(temporary_filename)
+        raise
+
+    return len(records)
@@ -4,18 +4,18 @@ from rich.prompt import Prompt
 from rich.console import Console
 from config import RECORDS_PER_PAGE
 from search_result import SearchResult
-from directory_manager import DirectoryManager
+from directory_storage import DirectoryStorage
 
 
 def get_record_from_keyboard(
-    console: Console, directory_manager: DirectoryManager
+    console: Console, directory_manager: DirectoryStorage
 ) -> Record:
     """
     Collects user input for creating a new Record.
 
     Args:
         console (Console): The Rich console for interaction.
-        directory_manager (DirectoryManager): The directory manager instance.
+        directory_manager (DirectoryStorage): The directory manager instance.
 
     Returns:
         Record: The new Record created from user input.
@@ -40,14 +40,14 @@ def get_record_from_keyboard(
 
 
 def edit_record_from_keyboard(
-    console: Console, directory_manager: DirectoryManager, record_to_edit: Record
+    console: Console, directory_manager: DirectoryStorage, record_to_edit: Record
 ) -> Record:
     """
     Collects user input for editing a Record.
 
     Args:
         console (Console): The Rich console for interaction.
-        directory_manager (DirectoryManager): The directory manager instance.
+        directory_manager (DirectoryStorage): The directory manager instance.
         record_to_edit (Record): The Record to be edited.
 
     Returns:
@@ -95,33 +95,40 @@ def calculate_index_range(current_page: int, items_per_page: int) -> tuple[int,
 
 def render_search_result_table(
     console: Console,
-    directory_manager: DirectoryManager,
+    directory_manager: DirectoryStorage,
     search_result: SearchResult,
-) -> None:
+    current_page_number: int = 1,
+) -> int:
     """
-    Renders the search result table.
+    Renders a page of the search result table.
 
     Args:
         console (Console): The Rich console for rendering.
-        directory_manager (DirectoryManager): The directory manager instance.
+        directory_manager (DirectoryStorage): The directory manager instance.
         search_result (SearchResult): The search result to display.
+        current_page_number (int): The page of the search result to display.
+
+    Returns:
+        int: The number of pages that can be navigated to from the displayed page.
     """
-    current_page_number = 1
-    total_pages = (
-        1
-        if len(search_result.matched_records) == 0
-        else (len(search_result.matched_records) + RECORDS_PER_PAGE - 1)
-        // RECORDS_PER_PAGE
+    total_pages = search_result.get_available_pages(
+        current_page_number, RECORDS_PER_PAGE
     )
 
     start_index, end_index = calculate_index_range(
         current_page_number, RECORDS_PER_PAGE
     )
 
-    current_page_records = search_result.matched_records[start_index:end_index]
+    current_page_records = search_result.get_records(start_index, end_index)
 
     table = Table(title=f"Results for '{search_result.search_string}' search string")
     table.add_columns(directory_manager.get_directory_field_names())
     table.add_rows(current_page_records)
     console.print(table)
-    console.print(f"Page {current_page_number} of {total_pages}")
+
+    if search_result.exhausted:
+        console.print(f"Page {current_page_number} of {total_pages}")
+    else:
+        console.print(f"Page {current_page_number} of at least {total_pages}")
+
+    return total_pages
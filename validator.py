@@ -0,0 +1,82 @@
+import re
+from typing import Iterable, Sequence
+
+
+class RecordValidator:
+    """
+    Validates directory rows against the regexes of a directory schema.
+
+    The regexes are compiled once when the validator is created, so checking
+    a field does not go through the re module's pattern cache on every call.
+    """
+
+    def __init__(self, header: list[str], regexes: dict[str, str]) -> None:
+        """
+        Initialize the RecordValidator instance.
+
+        Args:
+            header (list[str]): The field names of the directory, in column order.
+            regexes (dict[str, str]): The regex pattern of every field.
+
+        Returns:
+            None
+        """
+        self.header: list[str] = header
+        self.patterns: dict[str, re.Pattern] = {
+            field_name: re.compile(regex) for field_name, regex in regexes.items()
+        }
+        self.matchers = [self.patterns[field_name].match for field_name in header]
+
+    def is_field_valid(self, field_name: str, field_value: str) -> bool:
+        """
+        Check if a given field value is valid according to its regex pattern.
+
+        Args:
+            field_name (str): The name of the field.
+            field_value (str): The value of the field.
+
+        Returns:
+            bool: True if the field value is valid, False otherwise.
+        """
+        return self.patterns[field_name].match(field_value) is not None
+
+    def is_row_valid(self, row: Iterable[str]) -> bool:
+        """
+        Check if all field values of a row are valid.
+
+        Args:
+            row (Iterable[str]): The field values in column order.
+
+        Returns:
+            bool: True if the row is valid, False otherwise.
+        """
+        values = list(row)
+        if len(values) != len(self.matchers):
+            return False
+        return all(match(value) for match, value in zip(self.matchers, values))
+
+    def validate_many(self, rows: Sequence[Sequence[str]]) -> int | None:
+        """
+        Validate a batch of rows column by column.
+
+        Every column is checked with a single pass of its compiled pattern, and
+        rows are only inspected one by one when some column fails.
+
+        Args:
+            rows (Sequence[Sequence[str]]): The rows to validate.
+
+        Returns:
+            int | None: The index of the first invalid row, or None if all rows are valid.
+        """
+        width = len(self.matchers)
+        if all(len(row) == width for row in rows):
+            columns = zip(*rows) if rows else ()
+            if all(
+                all(map(match, column)) for match, column in zip(self.matchers, columns)
+            ):
+                return None
+
+        for index, row in enumerate(rows):
+            if not self.is_row_valid(row):
+                return index
+        return None